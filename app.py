@@ -1,55 +1,110 @@
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, jsonify, request, render_template, Response, abort
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough, RunnableLambda, RunnableParallel
 from typing import List, Dict
-import whisper
 import opencc
 import os
 import warnings
-import soundfile as sf  # For reading and writing audio files
-from pydub import AudioSegment
+import numpy as np
+from audio_decoder import decode_audio
+from streaming_asr import StreamingTranscriber, StreamingSession
+from transcription_worker import TranscriptionWorker, TranscriptionBusy
 from ollama_api import initialize_llm
-from utils import extract_json  # 确保 utils.py 中的 extract_json 是普通函数
-from gateway import get_topology, discover_gateway, connect_to_gateway, control_device, nt_type_mapping
+from utils import StreamingJSONExtractor
+from gateway import get_topology, discover_gateway, connect_to_gateway, control_device, nt_type_mapping, NodeType, device_states, db_manager, get_name_index, resolve_command_nodes, gateway_pool, command_coalescer
 from pydantic import BaseModel, model_validator
 from logger import init_logger, get_logger  # 在需要时获取 Logger 实例  # 导入初始化函数
 from prompts import template  # Import the prompt variable from prompts.py
 from config import *  # 导入配置文件中的环境变量
-from piper import PiperVoice
-import uuid
-import wave
-from database_manager import DatabaseManager, NodeInfo
+from tts_cache import SpeechCache
+from model_warmup import ModelWarmup, ComponentNotReady
+from intent_parser import RuleIntentParser
+from intent_cache import IntentCache
+from node_retriever import NodeRetriever
+from command_schema import build_command_schema, validate_command
+from database_manager import NodeInfo
+from device_state import StateChangeBuffer
 from collections import defaultdict
 import json
+import time
+import functools
+import tracing
+import metrics
+from tracing import start_trace, current_trace, finish_trace, span
 
 app = Flask(__name__)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# 使用 threading 模式：Whisper 推理、LLM 流式请求和网关请求都是阻塞调用，
+# 每个连接和后台任务运行在真实线程中才能并发处理多条语音；gevent / eventlet 未打猴子补丁时会被这些调用卡住
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
 
 # 定义模型和配置文件的路径
 model_path = "tts/zh_CN-huayan-medium.onnx"
 config_path = "tts/zh_CN-huayan-medium.onnx.json"
 
-db_manager = DatabaseManager()
-# 检查文件是否存在
-if not os.path.exists(model_path) or not os.path.exists(config_path):
-    raise FileNotFoundError("模型或配置文件未找到，请确保它们已下载并存储在 tts 目录中。")
+def load_piper_voice():
+    # 检查文件是否存在
+    if not os.path.exists(model_path) or not os.path.exists(config_path):
+        raise FileNotFoundError("模型或配置文件未找到，请确保它们已下载并存储在 tts 目录中。")
+    from piper import PiperVoice  # 延迟导入，不拖慢服务启动
+    return PiperVoice.load(model_path, config_path=config_path)
+
+# Piper 模型只加载一次，合成结果按内容缓存
+speech_cache = SpeechCache(
+    voice_loader=load_piper_voice,
+    model_id=os.path.basename(model_path),
+    cache_dir=os.getenv('TTS_CACHE_DIR', 'tts/cache'),
+    max_memory_items=int(os.getenv('TTS_CACHE_MEMORY_ITEMS', '64')),
+    max_disk_bytes=int(os.getenv('TTS_CACHE_DISK_MB', '50')) * 1024 * 1024
+)
 
 # Suppress specific warnings
 warnings.filterwarnings("ignore", category=UserWarning, module='whisper')
 
 # Load the Whisper model based on the environment variable
 model_size = os.getenv('WHISPER_MODEL_SIZE', 'base')  # 默认模型大小为 'base'
-model = whisper.load_model(model_size)  # 加载指定大小的模型
 
-# 初始化 Ollama 的模型
-llm = initialize_llm()
+def load_whisper_model():
+    import whisper  # 延迟导入（会加载 PyTorch），不拖慢服务启动
+    return whisper.load_model(model_size)  # 加载指定大小的模型
+
+# Whisper 转录在独立的工作线程中执行，不阻塞 Web 服务的事件循环
+transcription_worker = TranscriptionWorker(
+    model_loader=load_whisper_model,
+    converter=opencc.OpenCC('t2s'),  # t2s.json: 繁体转简体的配置文件，全局复用一个实例
+    workers=int(os.getenv('WHISPER_WORKERS', '0')) or None,
+    max_queue=int(os.getenv('WHISPER_MAX_QUEUE', '8'))
+)
 
-if llm is None:
-    raise RuntimeError("未能初始化 Ollama 模型，请确保有可用模型。")
+def load_whisper():
+    transcription_worker.start()
+    transcription_worker.wait_ready()
+    return transcription_worker
+
+def load_llm():
+    # 初始化 Ollama 的模型
+    llm = initialize_llm()
+    if llm is None:
+        raise RuntimeError("未能初始化 Ollama 模型，请确保有可用模型。")
+    try:
+        # 生成一个 token 预热，使模型加载到 Ollama 内存中
+        llm.invoke("你好", num_predict=1)
+    except Exception as e:
+        print(f"[ERROR] Ollama 模型预热失败: {str(e)}")
+    return llm
+
+# 模型在后台并行加载，服务启动后立即可以接受连接；请求会等待所依赖的模型就绪
+model_warmup = ModelWarmup(
+    retry_delay=float(os.getenv('WARMUP_RETRY_DELAY', '1')),
+    max_retry_delay=float(os.getenv('WARMUP_MAX_RETRY_DELAY', '60'))
+) \
+    .register('whisper', load_whisper) \
+    .register('ollama', load_llm) \
+    .register('piper', lambda: speech_cache.voice)
+# MODEL_WARMUP_AUTOSTART=0 时由调用方（如压测脚本替换后端后）自行调用 start()
+if os.getenv('MODEL_WARMUP_AUTOSTART', '1') == '1':
+    model_warmup.start()
 
 # 在文件顶部添加自定义异常
 class OutputValidationError(Exception):
@@ -60,15 +115,23 @@ class OutputValidationError(Exception):
 
 
 
-# 将普通函数包装成 Runnable
-json_parser = RunnableLambda(extract_json)
+# 使用 Ollama 结构化输出（format 传入 JSON Schema）约束命令格式，无需重试解析
+structured_output = os.getenv('OLLAMA_STRUCTURED_OUTPUT', '1') == '1'
 
-# 带重试的解析器
-_retry_parser = json_parser.with_retry(
-    stop_after_attempt=3,
-    wait_exponential_jitter=False
-)
+# 规则意图解析器，命中时跳过 LLM
+intent_parser = RuleIntentParser()
 
+def is_cacheable_command(command) -> bool:
+    """只缓存符合当前 Schema 且能匹配到节点的命令，解析错误的结果下次仍交给 LLM"""
+    return validate_command(command, get_command_schema()) and bool(resolve_command_nodes(get_name_index(), command))
+
+# LLM 解析结果缓存，按拓扑版本失效；INTENT_CACHE_PERSIST=1 时同时写入 local.db
+intent_cache = IntentCache(
+    max_items=int(os.getenv('INTENT_CACHE_SIZE', '256')),
+    db_name=db_manager.db_name if os.getenv('INTENT_CACHE_PERSIST', '1') == '1' else None,
+    validate=is_cacheable_command
+)
+db_manager.add_change_listener(lambda: intent_cache.invalidate(db_manager.snapshot().fingerprint))
 
 # Define the prompt variable before using it
 # prompt is now imported from prompts.py
@@ -77,15 +140,6 @@ prompt_template = PromptTemplate(
     input_variables=["user_input", "node_info"]  # 确保变量名匹配
 )
 
-# 修改处理链结构
-chain = (
-     RunnableParallel({
-                "user_input": RunnablePassthrough(),
-                "node_info": RunnablePassthrough()
-            })
-    | prompt_template 
-    | llm 
-)
 
 # Global variables to hold the gateway_socket and gateway address
 gateway_sock = None
@@ -97,110 +151,311 @@ init_logger(socketio)
 
 logger = get_logger()  # 在需要时获取 Logger 实例
 
+# 合并写命令时的等待让出事件循环
+command_coalescer.sleep = socketio.sleep
+
+# 设备状态变化时推送给前端：回调运行在网关读线程中，变化先合并，由后台任务定期推送
+state_changes = StateChangeBuffer()
+device_states.add_listener(state_changes.put)
+
+def _push_device_states():
+    interval = float(os.getenv('DEVICE_STATE_PUSH_INTERVAL', '0.1'))
+    while True:
+        socketio.sleep(interval)
+        changes = state_changes.drain()
+        if changes:
+            socketio.emit('device_state', {'nodes': changes})
+
+socketio.start_background_task(_push_device_states)  # 在主线程中启动一次
+
+
+def traced(name):
+    """
+    为请求创建 Trace 并统计正在处理的请求数，结束时计入 /metrics 和 /traces
+    METRICS_ENABLED=0 时直接返回原函数，不创建 Trace（span 和 current_trace 在没有 Trace 时不做任何事）
+    """
+    def decorator(func):
+        if not metrics.ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start_trace(name)
+            with metrics.REQUESTS_IN_FLIGHT.track_inprogress(endpoint=name):
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    finish_trace()
+        return wrapper
+    return decorator
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/transcribe', methods=['POST'])
+@traced('transcribe')
 def transcribe():
     logger.log_message("Audio file processing.")  # Log success message
     logger.log_message("Processing with the Whisper local model.")  # Log success message
 
-    audio_path = None  # Initialize audio_path
-    wav_path = None    # Initialize wav_path
     try:
-        # 处理音频文件
+        # 在内存中解码为 16kHz 单声道 float32，不写临时文件
         audio_file = request.files['audio']
-        audio_path = os.path.join('uploads', audio_file.filename)
-        audio_file.save(audio_path)
-
-        # Convert to WAV format if necessary and ensure mono and 16kHz sample rate
-        audio_segment = AudioSegment.from_file(audio_path)  # Read the webm file
-
-        # Convert to mono and 16kHz sample rate
-        audio_segment = audio_segment.set_channels(1).set_frame_rate(16000)
-
-        # Export as WAV
-        wav_path = audio_path.replace('.webm', '.wav')
-        audio_segment.export(wav_path, format='wav')
-
-        # Read the WAV file
-        audio, sample_rate = sf.read(wav_path)
-
-        # Ensure audio is in float32 format
-        if audio.dtype != 'float32':
-            audio = audio.astype('float32')
+        with span('audio_decode'):
+            audio = decode_audio(audio_file.read())
 
         logger.log_message("Audio file processed successfully.")  # Log success message
     except Exception as e:
         logger.log_message(f"Error processing audio file: {str(e)}", level="ERROR")
         return jsonify({'status': 'error', 'message': 'Audio processing failed.'}), 500
-    finally:
-        # Clean up the uploaded and converted files
-        if audio_path and os.path.exists(audio_path):
-            os.remove(audio_path)  # Clean up the uploaded file
-        if wav_path and os.path.exists(wav_path):
-            os.remove(wav_path)  # Clean up the converted WAV file
     logger.log_message("Processing with the Whisper local model.")  # Log success message
 
-    # 转录音频为文本（繁体字输出）
-    result = model.transcribe(audio, language="zh")
+    try:
+        return jsonify(with_timings({'text': transcribe_audio(audio)}))
+    except TranscriptionBusy as e:
+        logger.log_message(str(e), level="ERROR")
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+    except ComponentNotReady as e:
+        logger.log_message(str(e), level="ERROR")
+        return jsonify({'status': 'error', 'message': str(e)}), 503
+
+def transcribe_audio(audio) -> str:
+    """使用 Whisper 转录 16kHz float32 音频，返回简体中文文本"""
+    model_warmup.wait('whisper', sleep=socketio.sleep)  # 模型仍在加载时排队等待
+    # 转录音频为文本（繁体字输出），并使用 OpenCC 将繁体字转换为简体字
+    original_text, simplified_text = transcription_worker.transcribe(audio, sleep=socketio.sleep, trace=current_trace())
 
     # 输出转录文本（可能是繁体字）
-    logger.log_message("Original Transcription (Traditional):", result['text'])
-
-    # 使用 OpenCC 将繁体字转换为简体字
-    converter = opencc.OpenCC('t2s')  # t2s.json: 繁体转简体的配置文件
-    simplified_text = converter.convert(result['text'])
-
-    return jsonify({'text': simplified_text})
+    logger.log_message(f"Original Transcription (Traditional): {original_text}")
+    return simplified_text
+
+# 流式语音识别会话，按 Socket.IO 连接 sid 区分
+streaming_sessions = {}
+
+@socketio.on('audio_start')
+def handle_audio_start():
+    sid = request.sid
+    previous = streaming_sessions.pop(sid, None)
+    if previous:
+        previous.close()
+
+    def on_error(e):
+        if not isinstance(e, (TranscriptionBusy, ComponentNotReady)):
+            logger.log_message(f"流式语音识别出错: {str(e)}", level="ERROR")
+        socketio.emit('transcription_error', {'message': str(e)}, to=sid)
+
+    # 同一会话的音频块按顺序在一个后台任务中处理，事件处理函数只负责入队
+    streaming_sessions[sid] = StreamingSession(
+        StreamingTranscriber(transcribe_audio),
+        start_task=socketio.start_background_task,
+        on_events=lambda events: _emit_transcription_events(events, sid),
+        on_error=on_error,
+        on_done=lambda: socketio.emit('transcription_done', {}, to=sid)
+    )
+
+@socketio.on('audio_chunk')
+def handle_audio_chunk(data):
+    session = streaming_sessions.get(request.sid)
+    if session is None:
+        return
+    # 客户端发送 16kHz 单声道 16 位 PCM
+    session.feed(np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0)
+
+@socketio.on('audio_end')
+def handle_audio_end():
+    session = streaming_sessions.pop(request.sid, None)
+    if session is None:
+        return
+    session.end()
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    session = streaming_sessions.pop(request.sid, None)
+    if session:
+        session.close()
+
+def _emit_transcription_events(events, sid):
+    for kind, text in events:
+        socketio.emit(f'transcription_{kind}', {'text': text}, to=sid)
 
 @app.route('/submit', methods=['POST'])
+@traced('submit')
 def submit():
     data = request.get_json()
     user_input = data.get('user_input')  # Get user input
-    
 
     try:
-        logger.log_message(f"使用的 ollama 本地模型为: {llm.base_url}/{llm.model}")
-
-        node_info_response = db_manager.query_nodes()
-        # 执行处理链
-        full_response = []
-        input_variables = {"user_input": user_input, "node_info": format_node_info_for_llm(node_info_response)}
-        prompt = prompt_template.format(**input_variables)
-        # 执行处理链
-        full_response = []
-        for chunk in chain.stream(prompt):  
-            # 直接处理字符串块
-            logger.log_message_stream(chunk)
-            full_response.append(chunk)
-        
-        # 合并为完整 JSON 字符串
-        response = ''.join(full_response)
-        command_data = extract_json(response)
-        
-        result_message = control_device(command_data, socketio) if command_data else "Invalid command data"
-        
-        # Use Piper for speech synthesis, convert result message to audio file
-        voice = PiperVoice.load(model_path, config_path=config_path)
-        unique_filename = f'static/result_audio_{uuid.uuid4()}.wav'  # Generate unique filename
-        
-        # Synthesize speech and write to WAV file
-        try:
-            # Call synthesize method to generate audio data
-            with wave.open(unique_filename, 'wb') as wav_file:  # Open WAV file to write
-                voice.synthesize(result_message, wav_file)  # Generate audio data
-        except Exception as e:
-            logger.log_message(f"Error during speech synthesis: {str(e)}", level="ERROR")
-            return jsonify({'status': 'error', 'message': 'Speech synthesis failed.'}), 500
-        
-        return jsonify({'status': 'success', 'audio_path': unique_filename, 'result_message': result_message})
+        return jsonify(with_timings(process_utterance(user_input)))
+    except SpeechSynthesisError:
+        return jsonify({'status': 'error', 'message': 'Speech synthesis failed.'}), 500
     except Exception as e:
         logger.log_message(f"Error in Ollama model response: {str(e)}", level="ERROR")  # Log the error
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+class SpeechSynthesisError(Exception):
+    """语音合成失败"""
+
+def process_utterance(user_input, on_stage=None):
+    """
+    处理一条用户指令：意图解析 -> 设备控制 -> 语音合成
+    on_stage: 可选回调 on_stage(阶段, 数据)，每个阶段完成后立即调用
+    """
+    on_stage = on_stage or (lambda stage, data: None)
+
+    # 明确的设备/情景指令直接由规则解析，不经过 LLM
+    with span('intent_rule'):
+        command_data = intent_parser.parse(user_input, get_name_index())
+    metrics.CACHE_REQUESTS.inc(cache='rule_parser', result='hit' if command_data else 'miss')
+    if command_data:
+        logger.log_message(f"规则解析命中: {command_data}，命中率: {intent_parser.stats()['hit_rate']:.0%}")
+    else:
+        command_data = parse_with_llm(user_input)
+    on_stage('intent_parsed', command_data)
+
+    result_message = control_device(command_data, socketio, on_stage=on_stage) if command_data else "Invalid command data"
+    on_stage('result', result_message)
+
+    # Use Piper for speech synthesis, cached by result message
+    try:
+        model_warmup.wait('piper', sleep=socketio.sleep)  # 模型仍在加载时排队等待
+        with span('tts'):
+            audio_key = speech_cache.synthesize(result_message)
+    except Exception as e:
+        logger.log_message(f"Error during speech synthesis: {str(e)}", level="ERROR")
+        raise SpeechSynthesisError(str(e))
+    audio_path = f'/tts/{audio_key}.wav'
+    on_stage('audio_ready', audio_path)
+
+    return {'status': 'success', 'audio_path': audio_path, 'result_message': result_message}
+
+@socketio.on('submit_utterance')
+def handle_submit_utterance(data):
+    """客户端发送指令后立即返回，各阶段结果以 submit_stage 事件推送"""
+    sid = request.sid
+    request_id = data.get('request_id')
+    user_input = data.get('user_input')
+
+    def emit_stage(stage, payload):
+        socketio.emit('submit_stage', {'request_id': request_id, 'stage': stage, 'data': payload}, to=sid)
+
+    @traced('submit_utterance')
+    def run():
+        try:
+            result = process_utterance(user_input, on_stage=emit_stage)
+            emit_stage('done', result)
+        except SpeechSynthesisError:
+            emit_stage('error', 'Speech synthesis failed.')
+        except Exception as e:
+            logger.log_message(f"Error in Ollama model response: {str(e)}", level="ERROR")  # Log the error
+            emit_stage('error', str(e))
+
+    # 以 Socket.IO 后台任务（线程）处理，其中可以安全地 emit 和 socketio.sleep
+    socketio.start_background_task(run)
+    return {'status': 'accepted', 'request_id': request_id}
+
+def parse_with_llm(user_input):
+    """先查意图缓存，未命中时调用 LLM 并缓存结果"""
+    topology = db_manager.snapshot().fingerprint
+    with span('intent_cache'):
+        command_data = intent_cache.get(user_input, topology)
+    metrics.CACHE_REQUESTS.inc(cache='intent', result='hit' if command_data else 'miss')
+    if command_data:
+        logger.log_message(f"意图缓存命中: {command_data}，命中率: {intent_cache.stats()['hit_rate']:.0%}")
+        return command_data
+
+    command_data = run_llm_chain(user_input)
+    if isinstance(command_data, dict) and not intent_cache.put(user_input, topology, command_data):
+        logger.log_message(f"解析结果无效或未匹配到设备，不缓存: {command_data}", level="WARNING")
+    return command_data
+
+def run_llm_chain(user_input):
+    """使用 LLM 处理链解析用户指令"""
+    llm = model_warmup.wait('ollama', sleep=socketio.sleep)  # 模型仍在加载时排队等待
+    logger.log_message(f"使用的 ollama 本地模型为: {llm.base_url}/{llm.model}")
+
+    with span('prompt_format'):
+        input_variables = {"user_input": user_input, "node_info": get_node_info_context(user_input)}
+        schema = get_command_schema()
+    # 处理链直接以模板变量作为输入，静态指令与设备列表构成稳定前缀，
+    # 用户指令位于末尾，Ollama 可复用相同前缀的 KV 缓存
+    if structured_output:
+        # 输出被约束为符合 Schema 的命令，domain / action / location 只能取有效值
+        llm_chain = prompt_template | llm.bind(format=schema)
+    else:
+        llm_chain = prompt_template | llm
+    # 流式提取和流结束后的回退解析都按 Schema 校验，不完整的命令不会交给 control_device
+    extractor = StreamingJSONExtractor(validate=lambda obj: validate_command(obj, schema))
+
+    trace = current_trace()
+    start = time.perf_counter()
+    first_chunk = True
+    # 执行处理链，边生成边提取 JSON
+    stream = llm_chain.stream(input_variables)
+    try:
+        for chunk in stream:
+            if first_chunk and trace:
+                trace.record('llm_ttft', time.perf_counter() - start)
+            first_chunk = False
+            # 直接处理字符串块
+            logger.log_message_stream(chunk)
+            with span('extract_json'):
+                command_data = extractor.feed(chunk)
+            if command_data:
+                # 已得到完整命令，之后的输出只会增加延迟
+                logger.log_message_stream("\n")
+                logger.log_message("已提取到完整命令，停止生成")
+                return command_data
+    finally:
+        stream.close()  # 关闭流式响应，Ollama 随之取消本次生成
+        if trace:
+            trace.record('llm_total', time.perf_counter() - start)
+
+    # 未能提前提取时按完整输出解析
+    with span('extract_json'):
+        return extractor.finish()
+
+def with_timings(result: dict) -> dict:
+    """请求带 ?timings=1 时在响应中附带各阶段耗时（毫秒），供压测脚本统计"""
+    trace = current_trace()
+    if trace and request.args.get('timings') == '1':
+        result = dict(result, timings=trace.timings_ms())
+    return result
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 文本格式的指标"""
+    metrics.GATEWAY_CONNECTED.set(len(gateway_pool.connected_gateways()))
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/traces', methods=['GET'])
+def get_traces():
+    """最近完成的请求及其各阶段耗时"""
+    return jsonify({'status': 'success', 'traces': tracing.recent_traces()})
+
+@app.route('/ready', methods=['GET'])
+def get_readiness():
+    """各模型的加载状态，全部就绪时返回 200，否则返回 503"""
+    readiness = model_warmup.readiness()
+    return jsonify(readiness), 200 if readiness['status'] == 'ready' else 503
+
+@app.route('/intent_stats', methods=['GET'])
+def get_intent_stats():
+    return jsonify({
+        'status': 'success',
+        'rule_parser': intent_parser.stats(),
+        'intent_cache': intent_cache.stats()
+    })
+
+@app.route('/tts/<key>.wav', methods=['GET'])
+def get_speech(key):
+    data = speech_cache.get(key)
+    if data is None:
+        abort(404)
+    response = Response(data, mimetype='audio/wav')
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'  # 内容寻址，可长期缓存
+    return response
+
 class MyModel(BaseModel):
     field: str
 
@@ -209,14 +464,31 @@ class MyModel(BaseModel):
         # Your validation logic here
         return values
 
+def _connect_discovered(refresh):
+    """连接所有发现的网关，已在连接池中的网关直接复用，返回连接成功的网关地址"""
+    gateways = discover_gateway(socketio, scan_only=True, refresh=refresh)  # 同步调用
+    connected = []
+    for gateway in gateways:
+        try:
+            connected.append(connect_to_gateway(gateway, socketio))  # 同步调用
+        except OSError as e:
+            logger.log_message(f"连接到网关 {gateway['ip']} 失败: {str(e)}", level="ERROR")
+    return connected
+
 @app.route('/scan_and_connect', methods=['GET'])
 def scan_and_connect():
     try:
-        gateways = discover_gateway(socketio, scan_only=True)  # 同步调用
-        connected_gateway = connect_to_gateway({'ip': gateways[0]['ip']}, socketio)  # 同步调用
+        refresh = request.args.get('refresh') == '1'  # 默认使用缓存的扫描结果
+        connected = _connect_discovered(refresh)
+        if not connected and not refresh:
+            # 缓存的地址都连接失败（缓存已被丢弃），重新扫描一次
+            connected = _connect_discovered(refresh=True)
+        if not connected:
+            raise Exception("所有网关连接均失败")
         return jsonify({
             'status': 'success',
-            'connected_gateway': connected_gateway
+            'connected_gateway': ', '.join(connected),
+            'gateways': connected
         })
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -234,6 +506,61 @@ def get_topologys():
         logger.log_message(f"Error in get_topology: {str(e)}", level="ERROR")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/device_states', methods=['GET'])
+def get_device_states():
+    return jsonify({
+        'status': 'success',
+        'nodes': device_states.snapshot()
+    })
+
+@socketio.on('get_device_states')
+def handle_get_device_states():
+    emit('device_state', {'nodes': device_states.snapshot()})
+
+# 按拓扑版本缓存格式化后的设备列表
+_node_info_context = (None, "")
+
+# 节点数超过阈值时只把检索出的前 k 个节点放入提示词
+NODE_RETRIEVAL_THRESHOLD = int(os.getenv('NODE_RETRIEVAL_THRESHOLD', '80'))
+NODE_RETRIEVAL_TOP_K = int(os.getenv('NODE_RETRIEVAL_TOP_K', '30'))
+_node_retriever = (None, None)
+
+def get_node_info_context(user_input: str = "") -> str:
+    """
+    返回提示词中的设备列表文本
+    节点较少时使用完整列表（按拓扑版本缓存），节点较多时按指令检索相关节点
+    """
+    global _node_info_context, _node_retriever
+    snapshot = db_manager.snapshot()
+    if len(snapshot.nodes) > NODE_RETRIEVAL_THRESHOLD and user_input:
+        generation, retriever = _node_retriever
+        if generation != snapshot.generation:
+            retriever = NodeRetriever(snapshot.nodes, pinned=lambda node: node.type == NodeType.ROOM.value)
+            _node_retriever = (snapshot.generation, retriever)
+        nodes = retriever.top_k(user_input, NODE_RETRIEVAL_TOP_K)
+        logger.log_message(f"从 {len(snapshot.nodes)} 个节点中检索出 {len(nodes)} 个相关节点")
+        return format_node_info_for_llm(nodes)
+
+    generation, context = _node_info_context
+    if generation != snapshot.generation:
+        context = format_node_info_for_llm(snapshot.nodes)
+        _node_info_context = (snapshot.generation, context)
+    return context
+
+_command_schema = (None, None)
+
+def get_command_schema() -> dict:
+    """返回当前拓扑对应的命令 JSON Schema，拓扑未变化时直接复用"""
+    global _command_schema
+    snapshot = db_manager.snapshot()
+    generation, schema = _command_schema
+    if generation != snapshot.generation:
+        schema = build_command_schema(
+            locations=(node.name for node in snapshot.nodes if node.type == NodeType.ROOM.value)
+        )
+        _command_schema = (snapshot.generation, schema)
+    return schema
+
 def format_node_info_for_llm(node_info_response: List[NodeInfo]) -> str:
     """
     将节点信息格式化为指定结构的文本
@@ -261,4 +588,5 @@ def format_node_info_for_llm(node_info_response: List[NodeInfo]) -> str:
     return '\n'.join(result_strings).strip()
 
 if __name__ == '__main__':
-    socketio.run(app, host='0.0.0.0', port=8888) 
\ No newline at end of file
+    # threading 模式使用 Werkzeug 服务器，Flask-SocketIO 要求显式允许
+    socketio.run(app, host='0.0.0.0', port=8888, allow_unsafe_werkzeug=True) 
\ No newline at end of file
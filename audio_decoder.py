@@ -0,0 +1,33 @@
+import subprocess
+import numpy as np
+
+SAMPLE_RATE = 16000  # Whisper 需要的采样率
+
+
+def decode_audio(data: bytes, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    在内存中将上传的音频（webm/opus 等 ffmpeg 支持的格式）解码为单声道 float32 数组
+    通过 ffmpeg 的 stdin/stdout 管道完成，不落盘
+    """
+    if not data:
+        raise ValueError("音频数据为空")
+
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel", "error",
+        "-i", "pipe:0",
+        "-f", "f32le",
+        "-acodec", "pcm_f32le",
+        "-ac", "1",
+        "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    try:
+        process = subprocess.run(cmd, input=data, capture_output=True, check=True)
+    except FileNotFoundError:
+        raise RuntimeError("未找到 ffmpeg，请先安装 ffmpeg")
+    except subprocess.CalledProcessError as e:
+        raise ValueError(f"音频解码失败: {e.stderr.decode('utf-8', errors='replace').strip()}")
+
+    return np.frombuffer(process.stdout, dtype=np.float32)
@@ -0,0 +1,277 @@
+"""
+端到端延迟压测：驱动 Flask 应用的 /submit 和 /transcribe，统计各阶段耗时的 p50/p95/p99 和吞吐量
+
+    python benchmark.py --backend stub --concurrency 1,4,8 --requests 200 --output results.json
+    python benchmark.py --backend real --compare results.json
+
+- --backend stub 使用 stub_backends 中的桩 LLM / Whisper / Piper，可完全离线运行；real 使用本地模型
+- 默认在进程内启动 mock_gateway 模拟网关，数据库和语音缓存放在临时目录，不影响 local.db
+- 各阶段耗时来自请求的 ?timings=1 响应（见 tracing.py）
+"""
+import argparse
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(REPO_DIR, "benchmarks", "utterances.json")
+
+
+def percentile(values: List[float], p: float) -> float:
+    """线性插值的百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values), 3) if values else 0.0,
+    }
+
+
+def synthetic_wav(seconds: float = 1.5, sample_rate: int = 16000) -> bytes:
+    """生成一段带低幅噪声的 WAV，用于没有录音文件时压测 /transcribe"""
+    import random
+    rng = random.Random(0)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        frames = bytearray()
+        for _ in range(int(seconds * sample_rate)):
+            frames += int(rng.gauss(0, 300)).to_bytes(2, "little", signed=True)
+        wav_file.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+class _NoRuleParser:
+    """禁用规则解析，所有指令都经过 LLM"""
+
+    def parse(self, user_input, name_index):
+        return None
+
+    def stats(self):
+        return {"hits": 0, "misses": 0, "hit_rate": 0.0}
+
+
+def load_app(args, corpus: List[dict]):
+    """导入 app.py，按参数替换后端并启动模型预热"""
+    os.environ["MODEL_WARMUP_AUTOSTART"] = "0"  # 替换后端后再启动
+    sys.path.insert(0, REPO_DIR)
+    import app as server
+    from model_warmup import ModelWarmup
+    from intent_cache import IntentCache
+
+    # 工作目录可能是临时目录，模型文件按仓库路径查找
+    server.model_path = os.path.join(REPO_DIR, server.model_path)
+    server.config_path = os.path.join(REPO_DIR, server.config_path)
+
+    if args.backend == "stub":
+        from stub_backends import StubLLM, StubWhisper, StubVoice
+        stub_llm = StubLLM(
+            responses={item["text"]: item["command"] for item in corpus},
+            prefill_delay=args.llm_prefill_ms / 1000,
+            token_delay=args.llm_token_ms / 1000,
+            think=args.llm_think
+        )
+        server.transcription_worker.model_loader = lambda: StubWhisper(delay=args.asr_ms / 1000)
+        server.speech_cache._voice_loader = lambda: StubVoice(delay=args.tts_ms / 1000)
+        load_llm = lambda: stub_llm
+    else:
+        load_llm = server.load_llm
+
+    server.model_warmup = ModelWarmup() \
+        .register("whisper", server.load_whisper) \
+        .register("ollama", load_llm) \
+        .register("piper", lambda: server.speech_cache.voice) \
+        .start()
+    for name in ("whisper", "ollama", "piper"):
+        server.model_warmup.wait(name)
+    print(f"模型就绪: {json.dumps(server.model_warmup.status(), ensure_ascii=False)}")
+
+    if args.no_intent_cache or args.llm_only:
+        server.intent_cache = IntentCache(max_items=0)
+    if args.llm_only:
+        server.intent_parser = _NoRuleParser()
+    return server
+
+
+def start_gateway(args, server):
+    """启动模拟网关（或使用已发现的网关）并同步拓扑"""
+    mock = None
+    client = server.app.test_client()
+    if args.gateway == "mock":
+        from mock_gateway import MockGateway, SyntheticTopology
+        mock = MockGateway(
+            tcp_port=0, udp_port=None,
+            topology=SyntheticTopology(devices=args.devices, seed=0),
+            latency=args.gateway_latency_ms / 1000, jitter=args.gateway_jitter_ms / 1000, seed=0
+        ).start()
+        server.connect_to_gateway(mock.info, server.socketio)
+    else:
+        response = client.get("/scan_and_connect").get_json()
+        if response.get("status") != "success":
+            raise RuntimeError(f"连接网关失败: {response}")
+
+    response = client.get("/get_topology").get_json()
+    if response.get("status") != "success":
+        raise RuntimeError(f"获取拓扑失败: {response}")
+    print(f"拓扑节点数: {len(response['nodes'])}")
+    return mock
+
+
+def run_level(server, endpoint: str, concurrency: int, total: int, corpus: List[dict], audio: bytes) -> dict:
+    """以指定并发数发送 total 个请求，返回该并发下的统计"""
+    local = threading.local()
+
+    def one(i: int):
+        if not hasattr(local, "client"):
+            local.client = server.app.test_client()
+        start = time.perf_counter()
+        if endpoint == "submit":
+            response = local.client.post("/submit?timings=1", json={"user_input": corpus[i % len(corpus)]["text"]})
+        else:
+            response = local.client.post("/transcribe?timings=1",
+                                         data={"audio": (io.BytesIO(audio), "audio.wav")},
+                                         content_type="multipart/form-data")
+        latency = (time.perf_counter() - start) * 1000
+        body = response.get_json(silent=True) or {}
+        return response.status_code, latency, body.get("timings", {})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for status, latency, _ in results if status == 200]
+    stages: Dict[str, List[float]] = {}
+    for status, _, timings in results:
+        if status != 200:
+            continue
+        for stage, value in timings.items():
+            stages.setdefault(stage, []).append(value)
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": sum(1 for status, _, _ in results if status != 200),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": summarize(latencies),
+        "stages_ms": {stage: summarize(values) for stage, values in sorted(stages.items())},
+    }
+
+
+def print_level(endpoint: str, level: dict):
+    latency = level["latency_ms"]
+    print(f"\n[{endpoint}] 并发 {level['concurrency']}: {level['requests']} 个请求，错误 {level['errors']}，"
+          f"吞吐 {level['throughput_rps']} req/s，延迟 p50 {latency['p50']} / p95 {latency['p95']} / p99 {latency['p99']} ms")
+    print(f"  {'阶段':<20}{'次数':>6}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for stage, summary in level["stages_ms"].items():
+        print(f"  {stage:<20}{summary['count']:>6}{summary['p50']:>10}{summary['p95']:>10}{summary['p99']:>10}")
+
+
+def print_comparison(results: dict, baseline: dict):
+    """按端点和并发数对比两次运行的 p50/p95"""
+    print("\n与基线对比（正数表示变慢）:")
+    for endpoint, levels in results["endpoints"].items():
+        base_levels = {level["concurrency"]: level for level in baseline.get("endpoints", {}).get(endpoint, [])}
+        for level in levels:
+            base = base_levels.get(level["concurrency"])
+            if not base:
+                continue
+            rows = [("total", level["latency_ms"], base["latency_ms"])]
+            rows += [(stage, summary, base["stages_ms"][stage])
+                     for stage, summary in level["stages_ms"].items() if stage in base["stages_ms"]]
+            for stage, current, previous in rows:
+                print(f"  [{endpoint} x{level['concurrency']}] {stage:<20}"
+                      f"p50 {current['p50'] - previous['p50']:+.1f} ms  p95 {current['p95'] - previous['p95']:+.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端延迟压测")
+    parser.add_argument("--backend", choices=["stub", "real"], default="stub")
+    parser.add_argument("--endpoint", choices=["submit", "transcribe", "both"], default="submit")
+    parser.add_argument("--concurrency", default="1,4", help="逗号分隔的并发数列表")
+    parser.add_argument("--requests", type=int, default=100, help="每个并发级别的请求数")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--audio", help="压测 /transcribe 用的音频文件，默认生成一段合成音频")
+    parser.add_argument("--gateway", choices=["mock", "scan"], default="mock")
+    parser.add_argument("--gateway-latency-ms", type=float, default=5)
+    parser.add_argument("--gateway-jitter-ms", type=float, default=2)
+    parser.add_argument("--devices", type=int, default=50, help="模拟网关拓扑中的设备数")
+    parser.add_argument("--llm-prefill-ms", type=float, default=150, help="桩 LLM 的首 token 延迟")
+    parser.add_argument("--llm-token-ms", type=float, default=15, help="桩 LLM 每个 token 的生成时间")
+    parser.add_argument("--llm-think", default="", help="桩 LLM 在命令前输出的思考内容")
+    parser.add_argument("--asr-ms", type=float, default=300, help="桩 Whisper 的转录时间")
+    parser.add_argument("--tts-ms", type=float, default=80, help="桩 Piper 的合成时间")
+    parser.add_argument("--no-intent-cache", action="store_true", help="禁用意图缓存")
+    parser.add_argument("--llm-only", action="store_true", help="禁用规则解析和意图缓存，所有指令都经过 LLM")
+    parser.add_argument("--workdir", help="数据库和缓存所在目录，默认使用临时目录（--gateway scan 时默认为当前目录）")
+    parser.add_argument("--output", help="结果 JSON 文件")
+    parser.add_argument("--compare", help="与之前输出的结果 JSON 对比")
+    args = parser.parse_args()
+
+    # 之后会切换工作目录，先把路径参数转为绝对路径
+    for name in ("corpus", "audio", "output", "compare"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus_file = json.load(f)
+    corpus = corpus_file["utterances"]
+    audio = open(args.audio, "rb").read() if args.audio else synthetic_wav()
+
+    workdir = args.workdir or (os.getcwd() if args.gateway == "scan" else tempfile.mkdtemp(prefix="yeelight-bench-"))
+    os.chdir(workdir)
+    print(f"工作目录: {workdir}")
+
+    server = load_app(args, corpus)
+    mock = start_gateway(args, server)
+
+    endpoints = ["submit", "transcribe"] if args.endpoint == "both" else [args.endpoint]
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    results = {
+        "config": dict(vars(args), corpus_version=corpus_file.get("version")),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "endpoints": {}
+    }
+    for endpoint in endpoints:
+        results["endpoints"][endpoint] = []
+        for concurrency in levels:
+            level = run_level(server, endpoint, concurrency, args.requests, corpus, audio)
+            results["endpoints"][endpoint].append(level)
+            print_level(endpoint, level)
+
+    if mock:
+        results["mock_gateway"] = dict(mock.stats)
+        mock.stop()
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Set
+
+# 组节点 nt 类型未知时按 Mesh组（NodeType.MESH_GROUP）写入
+DEFAULT_GROUP_NT = 4
+
+
+def collapse_to_groups(nodes: List[dict], memberships: Dict[int, Set[int]], group_nt: Dict[int, int]) -> List[dict]:
+    """
+    将整组成员的相同写入合并为对组节点（Mesh组 / 自定义分组 / 房间）的一次写入
+    memberships: 组节点 id -> 成员节点 id 集合；group_nt: 组节点 id -> nt 类型
+    只有组内所有成员都以相同的 set 被写入时才会合并，组越大越优先
+    """
+    by_id = {node["id"]: node for node in nodes}
+    remaining = dict(by_id)
+    collapsed = []
+
+    for group_id, members in sorted(memberships.items(), key=lambda item: -len(item[1])):
+        if len(members) < 2 or not members <= remaining.keys():
+            continue
+        settings = [remaining[member]["set"] for member in members]
+        if any(setting != settings[0] for setting in settings):
+            continue
+        group_node = by_id.get(group_id)
+        if group_node is not None and group_node["set"] != settings[0]:
+            continue
+        for member in members:
+            del remaining[member]
+        remaining.pop(group_id, None)
+        nt = group_nt.get(group_id, group_node["nt"] if group_node else DEFAULT_GROUP_NT)
+        collapsed.append({"id": group_id, "nt": nt, "set": settings[0]})
+
+    return collapsed + list(remaining.values())
+
+
+def expand_groups(nodes: Iterable[dict], memberships: Dict[int, Set[int]]) -> List[dict]:
+    """把组节点的写入展开到成员，用于更新成员的状态缓存"""
+    expanded = []
+    for node in nodes:
+        expanded.append(node)
+        for member in memberships.get(node["id"], ()):
+            expanded.append({"id": member, "set": node["set"]})
+    return expanded
+
+
+def chunk_command(command: dict, max_items: int) -> List[dict]:
+    """将过大的 gateway_set.prop 命令按节点数拆成多帧"""
+    items = [("nodes", node) for node in command.get("nodes", [])] + \
+            [("scenes", scene) for scene in command.get("scenes", [])]
+    if len(items) <= max_items:
+        return [command]
+
+    frames = []
+    for start in range(0, len(items), max_items):
+        frame = {key: value for key, value in command.items() if key not in ("id", "nodes", "scenes")}
+        frame.update({"nodes": [], "scenes": []})
+        for field, item in items[start:start + max_items]:
+            frame[field].append(item)
+        frames.append(frame)
+    return frames
+
+
+class _Batch:
+    def __init__(self):
+        self.nodes: Dict[int, dict] = {}
+        self.scenes: Dict[int, dict] = {}
+        self.base = None
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+    def add(self, command: dict):
+        if self.base is None:
+            self.base = {key: value for key, value in command.items() if key not in ("id", "nodes", "scenes")}
+        for node in command.get("nodes", []):
+            if node["id"] in self.nodes:
+                merged = dict(self.nodes[node["id"]])
+                merged["set"] = {**merged.get("set", {}), **node.get("set", {})}  # 同一节点后到的属性覆盖先到的
+                self.nodes[node["id"]] = merged
+            else:
+                self.nodes[node["id"]] = node
+        for scene in command.get("scenes", []):
+            self.scenes.setdefault(scene["id"], scene)
+
+    def command(self) -> dict:
+        command = dict(self.base or {})
+        command.update({"nodes": list(self.nodes.values()), "scenes": list(self.scenes.values())})
+        return command
+
+
+class CommandCoalescer:
+    """
+    合并短时间内发往同一网关的 gateway_set.prop 命令
+    该网关没有正在发送的命令时立即发送，不增加延迟；
+    已有命令在发送时，第一个到达的调用方等待 window 秒收集其他命令，然后用自己的 send 合并、分帧发送，
+    并把结果返回给所有调用方
+    所有等待都通过 sleep 完成，sleep 在 gevent / eventlet 下应传入 socketio.sleep
+    """
+
+    POLL_INTERVAL = 0.002  # 等待合并发送结果时的轮询间隔
+
+    def __init__(self, window: float = 0.02, max_items: int = 50,
+                 sleep: Callable[[float], None] = time.sleep, timeout: float = 10):
+        self.window = window
+        self.max_items = max_items
+        self.sleep = sleep
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._batches: Dict[str, _Batch] = {}
+        self._in_flight: Dict[str, int] = {}  # 各网关正在发送的批次数
+
+    def submit(self, gateway, command: dict, send: Callable) -> dict:
+        """send(gateway, command) -> response，只有负责发送的调用方会用到"""
+        with self._lock:
+            batch = self._batches.get(gateway.key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._batches[gateway.key] = batch
+            batch.add(command)
+
+        if not leader:
+            # 与负责发送的调用方使用同一个 sleep 轮询等待：在未打补丁的 eventlet / gevent 下，
+            # 阻塞在 threading.Event.wait 上会卡住事件循环，负责发送的调用方也就无法醒来
+            deadline = time.monotonic() + self.timeout
+            while not batch.done.is_set():
+                if time.monotonic() >= deadline:
+                    raise TimeoutError("等待合并命令发送超时")
+                self.sleep(self.POLL_INTERVAL)
+        else:
+            with self._lock:
+                busy = self._in_flight.get(gateway.key, 0) > 0
+            if busy and self.window > 0:
+                self.sleep(self.window)
+            with self._lock:
+                del self._batches[gateway.key]
+                self._in_flight[gateway.key] = self._in_flight.get(gateway.key, 0) + 1
+            try:
+                self._flush(gateway, batch, send)
+            finally:
+                with self._lock:
+                    self._in_flight[gateway.key] -= 1
+
+        if batch.error:
+            raise batch.error
+        return batch.response
+
+    def _flush(self, gateway, batch: _Batch, send: Callable):
+        try:
+            responses = [send(gateway, frame) for frame in chunk_command(batch.command(), self.max_items)]
+            # 任一帧出错时返回出错的响应
+            batch.response = next((response for response in responses if "error" in response), responses[-1])
+        except Exception as e:
+            batch.error = e
+        finally:
+            batch.done.set()
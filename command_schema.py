@@ -0,0 +1,47 @@
+from typing import Iterable, Optional
+
+# 与 prompts.template 中的字段说明保持一致
+DOMAINS = ["light", "switch", "curtain", "scene", "room"]
+ACTIONS = ["turn_on", "turn_off", "open", "close", "excute"]
+ANY_LOCATION = ["all", "null"]  # 未指定房间 / 情景模式
+
+
+def build_command_schema(locations: Iterable[str] = ()) -> dict:
+    """
+    生成控制命令的 JSON Schema，作为 Ollama 的 format 参数约束模型输出
+    locations 为当前拓扑中的房间名称
+    name 不限制取值：命令可以使用“灯”“客厅灯”这类泛指名称，由 bulid_command 按子串和 domain 匹配节点
+    """
+    locations = _unique(list(locations) + ANY_LOCATION)
+    return {
+        "type": "object",
+        "properties": {
+            "domain": {"type": "string", "enum": DOMAINS},
+            "name": {"type": "string"},
+            "action": {"type": "string", "enum": ACTIONS},
+            "location": {"type": "string", "enum": locations},
+        },
+        "required": ["domain", "name", "action", "location"],
+        "additionalProperties": False,
+    }
+
+
+def validate_command(obj, schema: Optional[dict] = None) -> bool:
+    """检查对象是否符合命令 Schema（字段齐全且取值在枚举范围内）"""
+    schema = schema or build_command_schema()
+    if not isinstance(obj, dict):
+        return False
+    properties = schema["properties"]
+    for field in schema["required"]:
+        value = obj.get(field)
+        if not isinstance(value, str):
+            return False
+        allowed = properties[field].get("enum")
+        if allowed is not None and value not in allowed:
+            return False
+    return True
+
+
+def _unique(values: Iterable[str]) -> list:
+    # 保持原有顺序去重，并去掉空名称
+    return list(dict.fromkeys(value for value in values if value))
@@ -3,4 +3,6 @@ import os
 # 使用os.getenv获取环境变量，确保Docker传递的变量优先
 os.environ['WHISPER_MODEL_SIZE'] = os.getenv('WHISPER_MODEL_SIZE', 'small')  # 默认值为 'base'
 os.environ['OLLAMA_MODEL_NAME'] = os.getenv('OLLAMA_MODEL_NAME', 'deepseek-r1:7b')  # 默认值
-os.environ['OLLAMA_IP_PORT'] = os.getenv('OLLAMA_IP_PORT', 'http://localhost:11434')  # 默认值 
\ No newline at end of file
+os.environ['OLLAMA_IP_PORT'] = os.getenv('OLLAMA_IP_PORT', 'http://localhost:11434')  # 默认值
+os.environ['OLLAMA_KEEP_ALIVE'] = os.getenv('OLLAMA_KEEP_ALIVE', '30m')  # 模型在 Ollama 中的常驻时间
+os.environ['OLLAMA_STRUCTURED_OUTPUT'] = os.getenv('OLLAMA_STRUCTURED_OUTPUT', '1')  # 使用 JSON Schema 约束模型输出，旧版 Ollama 可设为 0
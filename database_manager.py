@@ -1,80 +1,170 @@
-import sqlite3
-from dataclasses import asdict,dataclass
-from typing import List, Dict
-from pydantic import BaseModel
+import threading
+import hashlib
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Tuple
+from pydantic import BaseModel, ConfigDict
 import json
+import time
+
+import metrics
+from match_name import NameMatcher
+from sqlite_store import open_store
 
 class NodeInfo(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: int
     type: int
     type_description: str
     name: str
     device_type: str
 
+@dataclass(frozen=True)
+class TopologySnapshot:
+    """节点表的只读内存快照，generation 在节点表每次变化后递增"""
+    generation: int
+    nodes: Tuple[NodeInfo, ...]
+    by_id: Mapping[int, NodeInfo]
+    fingerprint: str  # 节点表内容的摘要，重启后仍保持不变，可用于持久化缓存
+
+def _backfill_normalized_names(conn):
+    rows = conn.execute('SELECT id, name FROM node_info').fetchall()
+    conn.executemany('UPDATE node_info SET normalized_name = ? WHERE id = ?',
+                     [(NameMatcher.normalize_name(name or ""), node_id) for node_id, name in rows])
+
+# node_info 表的迁移，版本号为列表下标加一，只能追加
+NODE_INFO_MIGRATIONS = [
+    # 1: 原有表结构（已有数据库中表已存在）
+    '''
+    CREATE TABLE IF NOT EXISTS node_info (
+        id INTEGER PRIMARY KEY,
+        type INTEGER,
+        type_description TEXT,
+        name TEXT,
+        device_type TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    # 2-4: 规范化名称列（回填已有数据），以及按类型、设备类型、名称和更新时间查询用的索引
+    'ALTER TABLE node_info ADD COLUMN normalized_name TEXT',
+    _backfill_normalized_names,
+    '''
+    CREATE INDEX IF NOT EXISTS idx_node_info_type ON node_info (type);
+    CREATE INDEX IF NOT EXISTS idx_node_info_device_type ON node_info (device_type);
+    CREATE INDEX IF NOT EXISTS idx_node_info_normalized_name ON node_info (normalized_name);
+    CREATE INDEX IF NOT EXISTS idx_node_info_timestamp ON node_info (timestamp)
+    ''',
+]
+
+_NODE_COLUMNS = ('id', 'type', 'type_description', 'name', 'device_type')
+
 class DatabaseManager:
     def __init__(self, db_name='local.db'):
         self.db_name = db_name
-        self._initialize_database()
-
-    def _initialize_database(self):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS node_info (
-                    id INTEGER PRIMARY KEY,
-                    type INTEGER,
-                    type_description TEXT,
-                    name TEXT,
-                    device_type TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
+        self.store = open_store(db_name)
+        self._change_listeners = []
+        self._write_lock = threading.Lock()
+        self.store.migrate('node_info', NODE_INFO_MIGRATIONS)
+        self._snapshot = self._load_snapshot(generation=0)
+
+    @property
+    def generation(self) -> int:
+        return self._snapshot.generation
+
+    def snapshot(self) -> TopologySnapshot:
+        """当前拓扑快照，热路径直接读取，不访问 SQLite"""
+        return self._snapshot
+
+    def _load_snapshot(self, generation: int) -> TopologySnapshot:
+        with self.store.read() as conn:
+            rows = conn.execute(
+                'SELECT id, type, type_description, name, device_type FROM node_info ORDER BY timestamp DESC'
+            ).fetchall()
+
+        # 将查询结果转换为 NodeInfo 对象
+        nodes = tuple(NodeInfo(id=row[0], type=row[1], type_description=row[2], name=row[3], device_type=row[4]) for row in rows)
+        digest = hashlib.sha1()
+        for node in sorted(nodes, key=lambda node: node.id):
+            digest.update(f"{node.id}\x1f{node.type}\x1f{node.name}\x1f{node.device_type}\x1e".encode())
+        return TopologySnapshot(
+            generation=generation,
+            nodes=nodes,
+            by_id=MappingProxyType({node.id: node for node in nodes}),
+            fingerprint=digest.hexdigest()
+        )
+
+    def add_change_listener(self, callback):
+        """注册节点表变化回调，save_node_info_bulk 实际修改了数据时调用"""
+        self._change_listeners.append(callback)
+
+    def _notify_change(self):
+        for callback in list(self._change_listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in node info change listener: {e}")
 
     def save_node_info(self, node_info: NodeInfo):
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO node_info (id, type, type_description, name, device_type)
-                VALUES (:id, :type, :type_description, :name, :device_type)
-            ''', asdict(node_info))
-            conn.commit()
+        self.save_node_info_bulk([node_info])
 
     def save_node_info_bulk(self, node_info_list):
+        start = time.perf_counter()
+        with self._write_lock:
+            changed = self._save_node_info_bulk(node_info_list)
+            if changed:
+                # 写入完成后整体替换快照，读方不会看到中间状态
+                self._snapshot = self._load_snapshot(generation=self._snapshot.generation + 1)
+        metrics.DB_WRITE_SECONDS.observe(time.perf_counter() - start, changed=str(changed).lower())
+        metrics.TOPOLOGY_NODES.set(len(self._snapshot.nodes))
+        metrics.TOPOLOGY_GENERATION.set(self._snapshot.generation)
+
+        if changed:
+            self._notify_change()
+
+    def _save_node_info_bulk(self, node_info_list) -> bool:
         # Log the node_info_list to debug
         print("Saving NodeInfo list:", node_info_list)
         
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
         try:
             # Convert dictionaries to NodeInfo objects if necessary
-            node_info_dicts = []
+            node_info_dicts = {}
             for node_info in node_info_list:
                 if isinstance(node_info, dict):
                     node_info['id'] = str(node_info['id'])  # Ensure id is a string
                     node_info['device_type'] = str(node_info['device_type']) if node_info['device_type'] is not None else ""
                     node_info = NodeInfo(**node_info)  # Convert dict to NodeInfo
-                node_info_dicts.append(node_info.dict())  # Use .dict() for Pydantic models
-            
-            cursor.executemany('''
-                INSERT OR REPLACE INTO node_info (id, type, type_description, name, device_type)
-                VALUES (:id, :type, :type_description, :name, :device_type)
-            ''', node_info_dicts)
-            conn.commit()
+                node_info_dicts[node_info.id] = node_info.dict()  # Use .dict() for Pydantic models
+
+            with self.store.write() as conn:
+                # 只写入新增或内容变化的行，未变化的行不改写，timestamp 保持不变
+                existing = {row[0]: row for row in conn.execute(
+                    'SELECT id, type, type_description, name, device_type FROM node_info')}
+                changed_rows = [
+                    dict(d, normalized_name=NameMatcher.normalize_name(d['name'] or ""))
+                    for d in node_info_dicts.values()
+                    if existing.get(d['id']) != tuple(d[column] for column in _NODE_COLUMNS)
+                ]
+                conn.executemany('''
+                    INSERT INTO node_info (id, type, type_description, name, device_type, normalized_name)
+                    VALUES (:id, :type, :type_description, :name, :device_type, :normalized_name)
+                    ON CONFLICT (id) DO UPDATE SET
+                        type = excluded.type,
+                        type_description = excluded.type_description,
+                        name = excluded.name,
+                        device_type = excluded.device_type,
+                        normalized_name = excluded.normalized_name,
+                        timestamp = CURRENT_TIMESTAMP
+                ''', changed_rows)
+            metrics.DB_ROWS_WRITTEN.inc(len(changed_rows))
+            return bool(changed_rows)
         except Exception as e:
             print(f"Error saving node info: {e}")
-            conn.rollback()
-        finally:
-            conn.close()
+            return False
 
     def query_nodes(self) -> List[NodeInfo]:
-        with sqlite3.connect(self.db_name) as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT id, type, type_description, name, device_type FROM node_info ORDER BY timestamp DESC')
-            rows = cursor.fetchall()
-        
-        # 将查询结果转换为 NodeInfo 对象
-        return [NodeInfo(id=row[0], type=row[1], type_description=row[2], name=row[3], device_type=row[4]) for row in rows]
+        # 从内存快照返回，节点对象不可变，可以安全共享
+        return list(self._snapshot.nodes)
 
 def wrap_node_info(node, nt_type_mapping):
     nt_type = node.get("nt")
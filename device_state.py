@@ -0,0 +1,120 @@
+import threading
+from typing import Callable, Dict, Iterable, List
+
+
+class DeviceStateStore:
+    """
+    设备实时状态缓存（按节点 id 存储 p/l/ct 等属性）
+    由网关推送的 gateway_post.prop 和 gateway_set.prop 成功后的确认增量更新；
+    网关确认只说明命令已收到，Mesh 丢包时设备并未变化，
+    因此只有推送上报的属性用于判断命令是否可以跳过（is_noop）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states: Dict[int, dict] = {}
+        self._reported: Dict[int, dict] = {}  # 最近一次（重新）连接后由推送上报、之后未被写入的属性
+        self._listeners: List[Callable[[Dict[int, dict]], None]] = []
+
+    def add_listener(self, callback: Callable[[Dict[int, dict]], None]):
+        """注册状态变化回调，参数为 {节点id: 变化的属性}"""
+        self._listeners.append(callback)
+
+    def get(self, node_id) -> dict:
+        with self._lock:
+            return dict(self._states.get(int(node_id), {}))
+
+    def snapshot(self) -> Dict[int, dict]:
+        with self._lock:
+            return {node_id: dict(props) for node_id, props in self._states.items()}
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self._reported.clear()
+
+    def forget(self, node_ids: Iterable):
+        """丢弃节点的状态（如所属网关断线，期间的推送可能已丢失）"""
+        with self._lock:
+            for node_id in node_ids:
+                self._states.pop(int(node_id), None)
+                self._reported.pop(int(node_id), None)
+
+    def apply_push(self, message: dict):
+        """处理网关推送的 gateway_post.prop 消息"""
+        if message.get("method") != "gateway_post.prop":
+            return
+        self._update({
+            node["id"]: node.get("params") or node.get("prop") or {}
+            for node in message.get("nodes", [])
+            if "id" in node
+        }, reported=True)
+
+    def apply_set(self, command: dict):
+        """
+        gateway_set.prop 得到网关确认后，写入命令中设置的属性
+        这些属性在收到设备的推送前视为未确认，重复同一命令时仍会发送
+        """
+        self._update({
+            node["id"]: node.get("set", {})
+            for node in command.get("nodes", [])
+            if "id" in node
+        }, reported=False)
+
+    def is_noop(self, node_id, props: dict) -> bool:
+        """判断设置的属性是否与设备推送上报的状态完全一致"""
+        if not props:
+            return False
+        with self._lock:
+            current = self._reported.get(int(node_id))
+            if current is None:
+                return False
+            return all(key in current and current[key] == value for key, value in props.items())
+
+    def _update(self, updates: Dict[int, dict], reported: bool):
+        changes = {}
+        with self._lock:
+            for node_id, props in updates.items():
+                if not props:
+                    continue
+                node_id = int(node_id)
+                if reported:
+                    self._reported.setdefault(node_id, {}).update(props)
+                elif node_id in self._reported:
+                    for key in props:
+                        self._reported[node_id].pop(key, None)
+                current = self._states.setdefault(node_id, {})
+                changed = {key: value for key, value in props.items() if current.get(key) != value}
+                if changed:
+                    current.update(changed)
+                    changes[node_id] = changed
+
+        if changes:
+            for callback in list(self._listeners):
+                try:
+                    callback(changes)
+                except Exception as e:
+                    print(f"设备状态回调出错: {str(e)}")
+
+
+class StateChangeBuffer:
+    """
+    合并待推送给前端的状态变化
+    状态回调运行在网关读线程和发送线程中，这些线程里不能直接 emit；
+    变化先合并到这里，由 Socket.IO 后台任务定期取出并推送（与日志管道相同）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[int, dict] = {}
+
+    def put(self, changes: Dict[int, dict]):
+        with self._lock:
+            for node_id, props in changes.items():
+                self._pending.setdefault(node_id, {}).update(props)
+
+    def drain(self) -> Dict[int, dict]:
+        """取出并清空合并后的变化 {节点id: 属性}"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
@@ -1,10 +1,17 @@
 import socket
 import json
+import os
+import threading
 import time
 import atexit  # 导入 atexit 模块
 from logger import Logger  # 导入 Logger 类
-import eventlet.queue as queue  # 使用 eventlet 的队列
-from match_name import NameMatcher
+from gateway_connection import next_request_id
+from gateway_pool import GatewayPool
+from command_coalescer import CommandCoalescer, collapse_to_groups, expand_groups
+from device_state import DeviceStateStore
+from match_name import NameIndex
+from tracing import span
+import metrics
 from dataclasses import dataclass, asdict
 from database_manager import NodeInfo, DatabaseManager
 from enum import Enum  # 导入 Enum 模块
@@ -31,7 +38,32 @@ nt_type_mapping = {
 }
 
 # 全局变量
-tcp_sock = None  # 用于存储 TCP socket
+device_states = DeviceStateStore()  # 设备实时状态缓存，由网关推送更新
+
+def _forget_gateway_states(gateway):
+    """网关断线期间的推送已丢失，丢弃其节点的状态缓存；尚未获取拓扑（节点归属未知）时全部丢弃"""
+    if gateway.node_ids:
+        device_states.forget(gateway.node_ids)
+    else:
+        device_states.clear()
+
+# 网关连接池，每个网关一条长连接，断线自动重连
+gateway_pool = GatewayPool(
+    on_push=device_states.apply_push,
+    on_disconnect=_forget_gateway_states,
+    heartbeat_interval=float(os.getenv('GATEWAY_HEARTBEAT_INTERVAL', '30')),
+    max_backoff=float(os.getenv('GATEWAY_MAX_BACKOFF', '60'))
+)
+# 合并短时间内发往同一网关的写命令，过大的命令分帧发送
+command_coalescer = CommandCoalescer(
+    window=float(os.getenv('GATEWAY_COALESCE_WINDOW_MS', '20')) / 1000,
+    max_items=int(os.getenv('GATEWAY_MAX_NODES_PER_FRAME', '50'))
+)
+# 最近一次获取拓扑时各组节点上报的成员: 组节点 id -> 成员节点 id 集合，每次获取拓扑时整体替换
+_reported_groups = (0, {})  # (版本号, 成员关系)
+# 按拓扑快照过滤后的组成员关系和组节点 nt 类型，快照或上报的成员变化时重建
+_group_maps = ({}, {})
+_group_maps_key = None
 
 class DeviceType(Enum):
     LIGHT_SWITCH = 1  # 可开关灯具
@@ -54,189 +86,210 @@ class DeviceType(Enum):
     MIRAI_HUMAN_SENSOR = 138  # 迈睿人体传感器
 
 def close_socket():
-    """关闭 TCP socket 的函数"""
-    global tcp_sock
-    if tcp_sock:
-        tcp_sock.close()
-        print("TCP socket 已关闭")
+    """关闭网关连接的函数"""
+    gateway_pool.close()
+    print("TCP socket 已关闭")
 
 # 注册关闭函数
 atexit.register(close_socket)
 
-def discover_gateway(websocket, scan_only=False):
+DISCOVERY_PORT = 1982  # 网关 UDP 发现端口
+DISCOVERY_MESSAGE = b"YEELIGHT_GATEWAY_CONTROL_DISCOVER"
+
+# 网关发现结果缓存: (缓存时间, 网关信息列表)
+_discovery_cache = None
+_discovery_lock = threading.Lock()
+
+def _parse_discovery_response(response):
+    """解析网关的发现响应，每行一个 key:value"""
+    gateway_info = {}
+    for line in response.strip().split('\n'):
+        if ':' in line:
+            key, value = line.split(':', 1)  # 最多分割一次
+            gateway_info[key.strip()] = value.strip()
+    return gateway_info
+
+def scan_gateways(logger, window=3.0, expected=None, retransmits=2, broadcast_addr=None, quiet=0.3):
     """
-    通过 UDP 广播发现网关
-    返回: (网关信息字典)
+    广播发现消息，在 window 秒内收集所有网关的响应（按网关 id / ip 去重）
+    期间重发 retransmits 次以应对丢包；收到 expected 个网关，
+    或已收到响应且 quiet 秒内没有新网关响应时提前返回
     """
-    logger = Logger(websocket)  # 使用 websocket
-    logger.log_message("开始扫描发现附近网关")
+    broadcast_addr = broadcast_addr or os.getenv('GATEWAY_BROADCAST_ADDR', '<broadcast>')  # 或使用具体的广播地址如 "192.168.1.255"
 
     # 创建 UDP socket
     udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
     udp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-    udp_sock.settimeout(5)  # 设置超时时间
-    
+
+    gateways = {}
     try:
-        # 发送广播消息
-        broadcast_addr = '<broadcast>'  # 或使用具体的广播地址如 "192.168.1.255"
+        start = time.monotonic()
+        deadline = start + window
+        send_interval = window / (retransmits + 1)
+        next_send = start
         logger.log_message(f"发送广播消息到地址: {broadcast_addr}")
-        udp_sock.sendto(b"YEELIGHT_GATEWAY_CONTROL_DISCOVER", (broadcast_addr, 1982))
-        
-        # 接收响应
-        logger.log_message("等待网关响应...")
-        data, addr = udp_sock.recvfrom(1024)
-        response = data.decode()
-        logger.log_message(f"收到来自 {addr} 的响应: {response}")
-        
-        # 解析响应，处理可能的格式问题
-        gateway_info = {}
-        for line in response.strip().split('\n'):
-            if ':' in line:
-                key, value = line.split(':', 1)  # 最多分割一次
-                gateway_info[key.strip()] = value.strip()
-        
-        if 'ip' not in gateway_info:
-            raise Exception("网关响应中未包含 IP 地址")
-        
-        logger.log_message(f"解析到的网关信息：{gateway_info}")
+
+        while True:
+            now = time.monotonic()
+            if now >= deadline or (expected and len(gateways) >= expected):
+                break
+            if now >= next_send:
+                udp_sock.sendto(DISCOVERY_MESSAGE, (broadcast_addr, DISCOVERY_PORT))
+                next_send += send_interval
+
+            udp_sock.settimeout(max(0.01, min(deadline, next_send) - now))
+            try:
+                data, addr = udp_sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+
+            response = data.decode(errors='replace')
+            gateway_info = _parse_discovery_response(response)
+            gateway_info.setdefault('ip', addr[0])
+            key = gateway_info.get('id') or gateway_info['ip']
+            if key not in gateways:
+                logger.log_message(f"收到来自 {addr} 的响应: {response}")
+                gateways[key] = gateway_info
+                # 其他网关通常紧接着响应，静默 quiet 秒后不再等待
+                deadline = min(start + window, time.monotonic() + quiet)
+    finally:
+        udp_sock.close() 
+        logger.log_message("UDP socket 已关闭")
+
+    return list(gateways.values())
+
+def invalidate_discovery_cache():
+    """丢弃缓存的扫描结果（如连接失败，网关地址可能已变化），下次发现时重新扫描"""
+    global _discovery_cache
+    with _discovery_lock:
+        _discovery_cache = None
+
+def discover_gateway(websocket, scan_only=False, window=None, expected=None, refresh=False):
+    """
+    通过 UDP 广播发现网关
+    扫描结果按 GATEWAY_DISCOVERY_TTL 秒缓存，refresh 为 True 时强制重新扫描
+    返回: 网关信息字典列表；scan_only 为 False 时连接第一个网关并返回 (连接, 网关地址)
+    """
+    global _discovery_cache
+    logger = Logger(websocket)  # 使用 websocket
+    ttl = float(os.getenv('GATEWAY_DISCOVERY_TTL', '300'))
+    if window is None:
+        window = float(os.getenv('GATEWAY_DISCOVERY_WINDOW', '3'))
+    if expected is None:
+        expected = int(os.getenv('GATEWAY_EXPECTED_COUNT', '0')) or None
+    quiet = float(os.getenv('GATEWAY_DISCOVERY_QUIET', '0.3'))
+
+    try:
+        with _discovery_lock:
+            cached = _discovery_cache
+            if not refresh and cached and time.monotonic() - cached[0] < ttl:
+                gateways = cached[1]
+                logger.log_message(f"使用缓存的网关信息：{gateways}")
+            else:
+                logger.log_message("开始扫描发现附近网关")
+                gateways = scan_gateways(logger, window=window, expected=expected, quiet=quiet)
+                if not gateways:
+                    raise Exception("未发现任何网关")
+                _discovery_cache = (time.monotonic(), gateways)
+                logger.log_message(f"解析到的网关信息：{gateways}")
+
         if scan_only:
-            return [gateway_info]  # 返回列表以保持一致性
-        else:
-            # 创建 TCP 连接
-            global tcp_sock  # 声明为全局变量
-            tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            tcp_sock.settimeout(8)  # 设置超时时间为 8 秒
-            tcp_sock.connect((gateway_info['ip'], 65443))
-            logger.log_message(f"成功连接到网关: {gateway_info['ip']}:65443")
-            
-            # 返回套接字和已连接的网关
-            return tcp_sock, gateway_info['ip']
+            return list(gateways)
+
+        # 创建 TCP 连接
+        gateway_ip = gateways[0]['ip']
+        try:
+            gateway = _open_connection(gateways[0], logger)
+        except OSError:
+            invalidate_discovery_cache()
+            raise
+
+        # 返回连接和已连接的网关
+        return gateway.conn, gateway_ip
         
     except Exception as e:
         logger.log_message(f"发现网关失败: {str(e)}", level="ERROR")
         raise
-    finally:
-        udp_sock.close() 
-        logger.log_message("UDP socket 已关闭")
 
 def connect_to_gateway(gateway_info, websocket):
     """
-    连接到指定的网关
-    返回: (socket对象, 网关地址)
+    连接到指定的网关（加入连接池，已连接时复用）
+    返回: 网关地址
     """
     logger = Logger(websocket)  # 使用 websocket
     gateway_ip = gateway_info['ip']
     logger.log_message(f"尝试连接到网关: {gateway_ip}")
 
     # 创建 TCP 连接
-    global tcp_sock  # 声明为全局变量
-    tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    tcp_sock.settimeout(8)  # 设置超时时间为 8 秒
-    tcp_sock.connect((gateway_ip, 65443))
-    
-    logger.log_message(f"成功连接到网关: {gateway_ip}:65443")
+    try:
+        _open_connection(gateway_info, logger)
+    except OSError:
+        invalidate_discovery_cache()  # 网关地址可能已变化
+        raise
     return gateway_ip
 
 
-def send_command(websocket, command):
-    """发送 JSON 命令并接收响应"""
+def _open_connection(gateway_info, logger):
+    """将网关加入连接池并建立长连接"""
+    if gateway_pool.logger is None:
+        gateway_pool.logger = logger
+    return gateway_pool.add(gateway_info)
+
+
+def send_command(websocket, command, timeout=5, gateway=None):
+    """
+    发送 JSON 命令并接收响应
+    响应由 GatewayConnection 的读线程按 id 分发，gateway_post.* 推送不会再触发重发
+    gateway 为空时发往默认网关
+    """
     logger = Logger(websocket)  # 使用 websocket
-    payload = json.dumps(command)
-    logger.log_message(f"发送命令: {payload}")
-    tcp_sock.sendall((payload + "\r\n").encode())
-   
-    # 接收响应
-    buffer = bytearray()
-    tcp_sock.settimeout(2)  # 设置每次recv的超时时间
-    end_time = time.time() + 5  # 总超时5秒
-    
-    try:
-        while time.time() < end_time:
-            try:
-                chunk = tcp_sock.recv(4096)
-                if not chunk:
-                    break
-                buffer.extend(chunk)
-                # 检查结束标记（字节级别检查）
-                if buffer.endswith(b'\r\n'):
-                    break
-            except socket.timeout:
-                continue  # 继续检查总超时
-            
-        if not buffer.endswith(b'\r\n'):
-            raise TimeoutError("接收响应超时")
-            
-        # 解码并解析
-        decoded_data = buffer[:-2].decode('utf-8', errors='replace')
-        logger.log_message(f"接收到的响应: {decoded_data}")
-        
-        # 处理多个JSON对象情况
-        json_objects = []
-        decoder = json.JSONDecoder()
-        offset = 0
-        
-        while offset < len(decoded_data):
-            try:
-                obj, idx = decoder.raw_decode(decoded_data[offset:])
-                json_objects.append(obj)
-                offset += idx
-            except json.JSONDecodeError:
-                break  # 忽略无效尾部数据
-                
-        # 校验返回的 JSON 对象的 id 和 method
-        for obj in json_objects:
-            method = obj.get("method", "")
-            command_method = command["method"]
-
-            if method == "gateway_post.prop":
-                logger.log_message("收到 gateway_post.prop，重新发送命令")
-                return send_command(websocket, command)  # 重新发送命令
-
-            if command_method=="gateway_get.topology" and method.endswith("topology"):
-                return obj
-
-            if command_method =="gateway_get.room" and obj.get("rooms") == None:
-                logger.log_message(f"命令方法不匹配: {command_method} != {method}", level="ERROR")
-                return send_command(websocket, command)  # 重新发送命令
-
-            if command_method =="gateway_get.topology" and method!="gateway_post.topology":
-                logger.log_message(f"命令方法不匹配: {command_method} != {method}", level="ERROR")
-                return send_command(websocket, command)  # 重新发送命令
-
-            if obj.get("id") == command["id"]:
-                return obj
-        
-        raise ValueError("未找到匹配的响应")
-        
-    except json.JSONDecodeError as e:
-        logger.log_message(f"JSON解析失败（位置 {e.pos}）: {str(e)}", level="ERROR")
-        print(f"[DEBUG] 原始响应数据: {decoded_data[:2000]}...")  # 截断长数据
-        raise ValueError(f"JSON解析失败（位置 {e.pos}）: {str(e)}")
+    gateway = gateway or gateway_pool.default_gateway()
+    if gateway is None:
+        raise ConnectionError("Socket 未连接，无法发送命令")
+
+    command.setdefault("id", next_request_id())
+    logger.log_message(f"发送命令: {json.dumps(command)}")
+    response = gateway_pool.request(gateway, command, timeout=timeout)
+    logger.log_message(f"接收到的响应: {json.dumps(response, ensure_ascii=False)}")
+    return response
     
 
 def get_topology(websocket):
     """
     获取设备拓扑信息
+    依次查询连接池中的每个网关，并记录节点所属的网关
     """
+    global _reported_groups
+    wrapped_nodes = []
+    groups = {}
+    for gateway in gateway_pool.connected_gateways():
+        gateway_nodes = _get_gateway_topology(websocket, gateway, groups)
+        gateway_pool.assign_nodes(gateway, [node["id"] for node in gateway_nodes])
+        wrapped_nodes.extend(gateway_nodes)
+    # 已删除或变化的组不再沿用旧的成员关系
+    _reported_groups = (_reported_groups[0] + 1, groups)
+    return wrapped_nodes
+
+def _get_gateway_topology(websocket, gateway, groups):
+    """获取单个网关的设备拓扑和房间信息"""
     logger = Logger(websocket)  # 使用 websocket
 
     request = {
-        "id": int(time.time()),
+        "id": next_request_id(),
         "method": "gateway_get.topology",
     }
     
     # 发送请求
-    logger.log_message("请求设备拓扑信息")
+    logger.log_message(f"请求网关 {gateway.ip} 的设备拓扑信息")
     try:
-        response = send_command(websocket, request)  # 确保不传递 websocket 参数
-        if isinstance(response, tuple):
-            response = response[0]  # Unpack the first element if it's a tuple
+        response = send_command(websocket, request, gateway=gateway)
     except Exception as e:
         logger.log_message(f"发送请求时出错: {str(e)}", level="ERROR")
         return []  # 返回空列表以表示失败
 
     nodes = response.get("nodes", [])
     logger.log_message(f"接收到的拓扑信息: {nodes}")
+    _record_group_members(nodes, groups)
 
     # Convert NodeInfo objects to dictionaries
     wrapped_nodes = []
@@ -245,21 +298,20 @@ def get_topology(websocket):
         wrapped_nodes.append(wrapped_node.dict())  # Use .dict() for Pydantic models
 
     room_request = {
-        "id": int(time.time()),
+        "id": next_request_id(),
         "method": "gateway_get.room",
         "params": {"id": 0}
     }
     logger.log_message(f"请求房间信息: {room_request}")
     try:
-        room_response = send_command(websocket, room_request)
-        if isinstance(room_response, tuple):
-            room_response = room_response[0]  # Unpack the first element if it's a tuple
+        room_response = send_command(websocket, room_request, gateway=gateway)
     except Exception as e:
         logger.log_message(f"请求房间信息时出错: {str(e)}", level="ERROR")
         return wrapped_nodes  # 返回已获取的节点信息
 
     rooms = room_response.get("rooms", [])
     logger.log_message(f"接收到的房间信息: {rooms}")
+    _record_group_members([dict(room, nt=room.get("nt", NodeType.ROOM.value)) for room in rooms], groups)
     
     # 将每个房间对象添加到 wrapped_nodes
     for room in rooms:
@@ -269,6 +321,46 @@ def get_topology(websocket):
 
     return wrapped_nodes
 
+# 组节点在拓扑中列出成员时可能使用的字段
+# 注意：网关协议文档中没有说明组成员字段，以下字段名是推测（mock_gateway 使用 nodes）；
+# 没有上报成员的组不会被合并写入
+_MEMBER_FIELDS = ("members", "nodes", "children", "devices")
+GROUP_NODE_TYPES = (NodeType.ROOM.value, NodeType.CUSTOM_GROUP.value, NodeType.MESH_GROUP.value)
+
+def _record_group_members(nodes, groups):
+    """记录 Mesh组 / 自定义分组 / 房间节点上报的成员，用于把整组写入合并为一次组写入"""
+    for node in nodes:
+        if node.get("nt") not in GROUP_NODE_TYPES:
+            continue
+        for field in _MEMBER_FIELDS:
+            members = node.get(field)
+            if isinstance(members, list) and members:
+                groups[int(node["id"])] = {
+                    int(member["id"]) if isinstance(member, dict) else int(member) for member in members
+                }
+                break
+
+def get_group_maps():
+    """
+    返回 (组节点 id -> 成员 id 集合, 组节点 id -> nt 类型)
+    只保留当前拓扑快照中仍存在的组节点和成员，快照版本或上报的成员变化时重建
+    """
+    global _group_maps, _group_maps_key
+    snapshot = db_manager.snapshot()
+    version, groups = _reported_groups
+    key = (snapshot.generation, version)
+    if key != _group_maps_key:
+        memberships, group_nt = {}, {}
+        for group_id, members in groups.items():
+            group = snapshot.by_id.get(group_id)
+            if group is None or group.type not in GROUP_NODE_TYPES:
+                continue
+            memberships[group_id] = {member for member in members if member in snapshot.by_id}
+            group_nt[group_id] = group.type
+        _group_maps = (memberships, group_nt)
+        _group_maps_key = key
+    return _group_maps
+
 def discover_and_connect_gateway(websocket, scan_only=False):
     """
     扫描并连接到网关
@@ -287,9 +379,9 @@ def discover_and_connect_gateway(websocket, scan_only=False):
         # 尝试连接到每个网关
         for gateway in gateways:
             try:
-                tcp_sock, gateway_ip = connect_to_gateway(gateway, websocket)
+                gateway_ip = connect_to_gateway(gateway, websocket)
                 logger.log_message(f"成功连接到网关: {gateway_ip}")
-                return tcp_sock, gateway_ip
+                return gateway_pool.default_gateway().conn, gateway_ip
             except ConnectionRefusedError:
                 logger.log_message(f"连接到网关 {gateway['ip']} 被拒绝，尝试下一个网关", level="ERROR")
                 continue  # 尝试下一个网关
@@ -300,55 +392,90 @@ def discover_and_connect_gateway(websocket, scan_only=False):
         logger.log_message(f"扫描或连接网关时出错: {str(e)}", level="ERROR")
         raise
 
+def _device_type_in(node, device_types):
+    """device_type 可能以枚举值或枚举名称（wrap_node_info）存储，两种形式都要匹配"""
+    return any(node.device_type in (t.value, str(t.value), t.name) for t in device_types)
+
+LIGHT_DEVICE_TYPES = (DeviceType.LIGHT_SWITCH, DeviceType.DIMMABLE_LIGHT,
+                      DeviceType.COLOR_TEMPERATURE_LIGHT, DeviceType.COLOR_LIGHT)
+SWITCH_DEVICE_TYPES = (DeviceType.SWITCH_CONTROLLER, DeviceType.MULTI_SWITCH_PANEL)
+
+# 命令可用的 domain，以及根据 domain 和 nt 类型过滤设备的条件
+DOMAIN_FILTERS = {
+    "light": lambda d: _device_type_in(d, LIGHT_DEVICE_TYPES) and d.type in [NodeType.MESH_SUBDEVICE.value, 
+                                                                             NodeType.CUSTOM_GROUP.value, 
+                                                                             NodeType.MESH_GROUP.value],
+    "scene": lambda d: d.type == NodeType.SCENE.value,
+    "room": lambda d: d.type == NodeType.ROOM.value,
+    "switch": lambda d: _device_type_in(d, SWITCH_DEVICE_TYPES)
+}
+
+# 名称索引的分区：除各 domain 外，room 类命令指定房间时查找整屋节点（见 domain_partition）
+# house 不是命令可用的 domain
+INDEX_PARTITIONS = dict(DOMAIN_FILTERS, house=lambda d: d.type == NodeType.HOUSE.value)
+
+def domain_partition(domain, location):
+    """room 类命令在 location 为 all 时查找房间，否则查找整屋"""
+    if domain == "room" and location != "all":
+        return "house"
+    return domain
+
+def resolve_command_nodes(name_index: NameIndex, command: dict) -> list:
+    """与 bulid_command 相同的方式按名称查找命令控制的节点"""
+    domain = command.get("domain")
+    if domain not in DOMAIN_FILTERS:
+        return []
+    return name_index.find(command.get("name"), domain_partition(domain, command.get("location")))
+
+# 名称索引，拓扑表变化时重建
+_name_index = None
+_name_index_generation = None
+
+def _rebuild_name_index():
+    global _name_index, _name_index_generation
+    snapshot = db_manager.snapshot()
+    _name_index = NameIndex(snapshot.nodes, INDEX_PARTITIONS)
+    _name_index_generation = snapshot.generation
+
+def get_name_index() -> NameIndex:
+    if _name_index is None or _name_index_generation != db_manager.generation:
+        _rebuild_name_index()
+    return _name_index
+
+db_manager.add_change_listener(_rebuild_name_index)
+
 def bulid_command(command_data, websocket):
     """
     构建控制指令
     """
     logger = Logger(websocket)  # 使用 websocket
 
-    # 获取拓扑信息
-    logger.log_message("获取拓扑信息")
-    nodes = db_manager.query_nodes()
-
     # 获取命令信息
     name = command_data.get('name')
     action = command_data.get('action')
     location = command_data.get('location')
-    
-    # 根据 domain 和 nt 类型过滤设备
-    domain_filters = {
-        "light": lambda d: d.device_type in [DeviceType.LIGHT_SWITCH.value, 
-                                        DeviceType.DIMMABLE_LIGHT.value, 
-                                        DeviceType.COLOR_TEMPERATURE_LIGHT.value, 
-                                        DeviceType.COLOR_LIGHT.value] and d.type in [NodeType.MESH_SUBDEVICE.value, 
-                                                                                        NodeType.CUSTOM_GROUP.value, 
-                                                                                        NodeType.MESH_GROUP.value],
-        "scene": lambda d: d.type == NodeType.SCENE.value,
-        "room": lambda d: d.type == NodeType.ROOM.value if location == "all" else d.type == NodeType.HOUSE.value,
-        "switch": lambda d: d.device_type in [DeviceType.SWITCH_CONTROLLER.value, 
-                                        DeviceType.MULTI_SWITCH_PANEL.value]
-    }
+    domain = command_data.get('domain')
 
-    # 选择合适的 domain 进行过滤
-    if command_data.get('domain') in domain_filters:
-        logger.log_message(f"查找网关下是否有 name 为: {name} 的{command_data.get('domain')}")
-        domain_nodes = [d for d in nodes if domain_filters[command_data.get('domain')](d)]
-        logger.log_message(f"查找网关下是否有 name 为: {name} 的{command_data.get('domain')}，找到的节点信息为: {domain_nodes}")
-        filtered_nodes = NameMatcher.find_devices_by_name(domain_nodes, name)
+    # 选择合适的 domain 分区，在名称索引中查找
+    if domain in DOMAIN_FILTERS:
+        logger.log_message(f"查找网关下是否有 name 为: {name} 的{domain}")
+        filtered_nodes = get_name_index().find(name, domain_partition(domain, location))
+        logger.log_message(f"查找网关下是否有 name 为: {name} 的{domain}，找到的节点信息为: {filtered_nodes}")
         
         if not filtered_nodes:
+            metrics.NAME_MATCH_MISSES.inc(domain=domain)
             logger.log_message(f"未找到符合条件的节点信息: {name}", level="ERROR")
             return f"未找到符合条件的节点信息: {name}"
     else:
-        logger.log_message(f"未知的 domain 类型: {command_data.get('domain')}", level="ERROR")
-        return f"未知的 domain 类型: {command_data.get('domain')}"
+        logger.log_message(f"未知的 domain 类型: {domain}", level="ERROR")
+        return f"未知的 domain 类型: {domain}"
     
     # 构建控制指令
     logger.log_message("构建控制指令")
     nodes = []
     scenes = []
     command = {
-        "id": int(time.time()),
+        "id": next_request_id(),
         "method": "gateway_set.prop",
         "nodes": nodes,
         "scenes": scenes
@@ -378,21 +505,82 @@ def bulid_command(command_data, websocket):
     logger.log_message(f"构建命令为: {command}")
     return command
 
-def control_device(command_data, websocket):
+def _send_part(websocket, gateway, command):
+    """
+    向单个网关发送命令（与同时发往该网关的其他命令合并），成功后更新设备状态缓存
+    异常作为返回值交给调用方汇总
+    """
+    try:
+        send = lambda target, frame: send_command(websocket, frame, gateway=target)  # 确保传递 command 参数
+        response = command_coalescer.submit(gateway, command, send)
+        if "error" not in response:
+            device_states.apply_set({"nodes": expand_groups(command["nodes"], get_group_maps()[0])})
+        return response
+    except Exception as e:
+        return e
+
+def _send_parts(websocket, parts):
+    """
+    发送按网关拆分后的命令，返回各部分的结果
+    多个网关时每个网关一个 Socket.IO 后台任务（gevent / eventlet 下为协程），用 websocket.sleep 轮询等待，
+    发送路径上的 socketio.sleep 和 emit 不会运行在普通线程中
+    """
+    if len(parts) == 1:
+        return [_send_part(websocket, *parts[0])]
+
+    results = [None] * len(parts)
+    finished = []
+
+    def run(index, part):
+        try:
+            results[index] = _send_part(websocket, *part)
+        finally:
+            finished.append(index)
+
+    for index, part in enumerate(parts):
+        websocket.start_background_task(run, index, part)
+    while len(finished) < len(parts):
+        websocket.sleep(0.002)
+    return results
+
+def control_device(command_data, websocket, on_stage=None):
     """
     控制设备
     command_data: 包含控制命令的字典
+    on_stage: 可选回调 on_stage(阶段, 数据)，在命令发出（command_sent）和网关确认（gateway_ack）时调用
     """
-    global tcp_sock
     logger = Logger(websocket)  # 使用 websocket
 
     try:
-        if tcp_sock is None:
+        if not gateway_pool.has_connection():
             logger.log_message("Socket 未连接，无法发送命令", level="ERROR")
             return "Socket 未连接，无法发送命令"
-        # 发送控制命令  
+        with span('bulid_command'):
+            command = bulid_command(command_data, websocket)
+        if not isinstance(command, dict):
+            return command  # 构建失败时返回的是错误信息
+
+        # 跳过与当前已知状态一致的节点
+        command["nodes"] = [node for node in command["nodes"] if not device_states.is_noop(node["id"], node["set"])]
+        if not command["nodes"] and not command["scenes"]:
+            logger.log_message("设备已处于目标状态，无需发送命令")
+            return "设备已处于目标状态"
+
+        # 整组成员都被写入时合并为一次组写入
+        command["nodes"] = collapse_to_groups(command["nodes"], *get_group_maps())
+
+        # 按节点所属网关拆分命令，多个网关并行发送
         logger.log_message("发送控制命令")
-        send_command(websocket, bulid_command(command_data, websocket))  # 确保传递 command 参数
+        parts = gateway_pool.split_by_owner(command)
+        if on_stage:
+            on_stage("command_sent", command)
+        with span('gateway_roundtrip'):
+            results = _send_parts(websocket, parts)
+        errors = [str(result) for result in results if isinstance(result, Exception)]
+        if errors:
+            raise Exception("; ".join(errors))
+        if on_stage:
+            on_stage("gateway_ack", results)
         
         logger.log_message("命令已成功发送")
         return "命令已成功发送"
@@ -0,0 +1,229 @@
+import socket
+import json
+import threading
+import itertools
+import time
+from typing import Callable, Dict, List, Optional
+
+import metrics
+
+GATEWAY_PORT = 65443  # 网关局域网控制端口
+
+# 全局请求 id 生成器，替代 int(time.time())（同一秒内会重复）
+_id_counter = itertools.count(1)
+_id_lock = threading.Lock()
+
+
+def next_request_id() -> int:
+    """生成单调递增的请求 id"""
+    with _id_lock:
+        return next(_id_counter)
+
+
+class _PendingRequest:
+    """等待网关响应的请求"""
+
+    def __init__(self, method: str):
+        self.method = method
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+    def resolve(self, response: dict):
+        self.response = response
+        self.event.set()
+
+    def fail(self, error: Exception):
+        self.error = error
+        self.event.set()
+
+
+class GatewayConnection:
+    """
+    网关 TCP 长连接
+    独立的读线程按 \\r\\n 分帧解析 JSON，按 id 将响应分发给等待中的调用方，
+    gateway_post.* 推送消息转发到事件订阅者，支持多个命令在同一连接上并发发送
+    """
+
+    def __init__(self, ip: str, port: int = GATEWAY_PORT, timeout: float = 8, logger=None):
+        self.ip = ip
+        self.port = port
+        self.timeout = timeout
+        self.logger = logger
+        self._sock = None
+        self._reader = None
+        self._send_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: Dict[int, _PendingRequest] = {}
+        self._listeners: List[Callable[[dict], None]] = []
+        self._closed = threading.Event()
+        self.last_activity = time.monotonic()  # 最近一次收到数据的时间，用于判断是否需要心跳
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None and not self._closed.is_set()
+
+    def connect(self):
+        """建立 TCP 连接并启动读线程"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect((self.ip, self.port))
+        except OSError:
+            sock.close()  # 后台线程会反复重连，失败的 socket 不能泄漏
+            raise
+        sock.settimeout(None)  # 读线程阻塞等待数据，超时由各请求自行控制
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self._sock = sock
+        self.last_activity = time.monotonic()
+        self._closed.clear()
+        self._reader = threading.Thread(target=self._reader_loop, name=f"gateway-reader-{self.ip}", daemon=True)
+        self._reader.start()
+        return self
+
+    def close(self):
+        """关闭连接，并让所有等待中的请求失败"""
+        self._closed.set()
+        if self._sock:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+        self._fail_all(ConnectionError("网关连接已关闭"))
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        """订阅网关主动推送的 gateway_post.* 消息"""
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback: Callable[[dict], None]):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def request(self, command: dict, timeout: float = 5) -> dict:
+        """
+        发送命令并等待对应 id 的响应
+        多个线程可以同时调用，命令会在同一连接上流水线发送
+        """
+        if not self.connected:
+            raise ConnectionError("网关未连接")
+
+        command.setdefault("id", next_request_id())
+        pending = _PendingRequest(command.get("method", ""))
+        with self._pending_lock:
+            self._pending[command["id"]] = pending
+
+        try:
+            payload = (json.dumps(command) + "\r\n").encode()
+            with self._send_lock:
+                self._sock.sendall(payload)
+
+            if not pending.event.wait(timeout):
+                raise TimeoutError("接收响应超时")
+            if pending.error:
+                raise pending.error
+            return pending.response
+        finally:
+            with self._pending_lock:
+                self._pending.pop(command["id"], None)
+
+    def _reader_loop(self):
+        """读线程：按 \\r\\n 分帧，解析后分发"""
+        buffer = bytearray()
+        try:
+            while not self._closed.is_set():
+                chunk = self._sock.recv(4096)
+                if not chunk:
+                    break
+                self.last_activity = time.monotonic()
+                buffer.extend(chunk)
+                while True:
+                    end = buffer.find(b'\r\n')
+                    if end == -1:
+                        break
+                    frame = bytes(buffer[:end])
+                    del buffer[:end + 2]
+                    for obj in self._decode_frame(frame):
+                        self._dispatch(obj)
+        except OSError as e:
+            if not self._closed.is_set():
+                self._log(f"网关连接读取失败: {str(e)}", level="ERROR")
+        finally:
+            self._closed.set()
+            self._fail_all(ConnectionError("网关连接已断开"))
+
+    def _decode_frame(self, frame: bytes) -> List[dict]:
+        """解析一帧数据，一帧中可能包含多个连续的 JSON 对象"""
+        decoded_data = frame.decode('utf-8', errors='replace')
+        json_objects = []
+        decoder = json.JSONDecoder()
+        offset = 0
+        while offset < len(decoded_data):
+            # 跳过对象之间的空白
+            while offset < len(decoded_data) and decoded_data[offset].isspace():
+                offset += 1
+            if offset >= len(decoded_data):
+                break
+            try:
+                obj, idx = decoder.raw_decode(decoded_data, offset)
+                json_objects.append(obj)
+                offset = idx
+            except json.JSONDecodeError as e:
+                metrics.JSON_PARSE_FAILURES.inc(source='gateway')
+                self._log(f"JSON解析失败（位置 {e.pos}）: {decoded_data[:2000]}", level="ERROR")
+                break  # 忽略无效尾部数据
+        return json_objects
+
+    def _dispatch(self, obj: dict):
+        """将响应交给等待方，将推送消息交给订阅者"""
+        method = obj.get("method", "")
+
+        pending = self._take_pending(obj)
+        if pending:
+            pending.resolve(obj)
+            return
+
+        if method.startswith("gateway_post."):
+            metrics.GATEWAY_PUSHES.inc(method=method)
+            for callback in list(self._listeners):
+                try:
+                    callback(obj)
+                except Exception as e:
+                    self._log(f"处理网关推送消息时出错: {str(e)}", level="ERROR")
+            return
+
+        metrics.GATEWAY_REQUESTS.inc(result='unmatched')
+        self._log(f"未找到匹配的请求，丢弃响应: {obj}", level="ERROR")
+
+    def _take_pending(self, obj: dict) -> Optional[_PendingRequest]:
+        """根据 id 查找等待方；拓扑和房间的响应可能不带 id，按方法兜底匹配"""
+        method = obj.get("method", "")
+        with self._pending_lock:
+            pending = self._pending.pop(obj.get("id"), None) if "id" in obj else None
+            if pending:
+                return pending
+
+            if method == "gateway_post.topology":
+                wanted = "gateway_get.topology"
+            elif "rooms" in obj:
+                wanted = "gateway_get.room"
+            else:
+                return None
+
+            for request_id, candidate in self._pending.items():
+                if candidate.method == wanted:
+                    return self._pending.pop(request_id)
+        return None
+
+    def _fail_all(self, error: Exception):
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for request in pending:
+            request.fail(error)
+
+    def _log(self, message: str, level: str = "INFO"):
+        if self.logger:
+            self.logger.log_message(message, level=level)
+        else:
+            print(f"[{level}] {message}")
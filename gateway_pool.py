@@ -0,0 +1,214 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+from gateway_connection import GatewayConnection, GATEWAY_PORT
+
+
+class ManagedGateway:
+    """连接池中的一个网关：长连接、所属节点和重连状态"""
+
+    def __init__(self, key: str, info: dict):
+        self.key = key
+        self.info = info
+        self.ip = info['ip']
+        self.port = int(info.get('port') or GATEWAY_PORT)  # 发现响应通常不带端口，使用默认控制端口
+        self.conn: Optional[GatewayConnection] = None
+        self.node_ids = set()
+        self.backoff = 0.0
+        self.next_attempt = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self.conn is not None and self.conn.connected
+
+    def update_address(self, info: dict) -> bool:
+        """重新发现后网关地址变化时更新地址并立即允许重连，返回地址是否变化"""
+        ip, port = info['ip'], int(info.get('port') or GATEWAY_PORT)
+        if (ip, port) == (self.ip, self.port):
+            return False
+        self.info, self.ip, self.port = info, ip, port
+        self.backoff = 0.0
+        self.next_attempt = 0.0
+        return True
+
+
+class GatewayPool:
+    """
+    网关连接池，每个网关维护一条长连接
+    后台线程负责空闲心跳探测和指数退避重连，命令按节点所属网关路由
+    """
+
+    def __init__(self, logger=None, on_push: Optional[Callable[[dict], None]] = None,
+                 heartbeat_interval: float = 30, min_backoff: float = 1, max_backoff: float = 60,
+                 probe_command: Optional[dict] = None,
+                 on_disconnect: Optional[Callable[[ManagedGateway], None]] = None,
+                 check_interval: float = 1):
+        self.logger = logger
+        self.on_push = on_push
+        self.on_disconnect = on_disconnect  # 连接不可用时调用，断线期间的推送会丢失
+        self.heartbeat_interval = heartbeat_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.check_interval = check_interval  # 后台线程检查连接状态的间隔
+        self.probe_command = probe_command or {"method": "gateway_get.room", "params": {"id": 0}}
+        self._gateways: Dict[str, ManagedGateway] = {}
+        self._node_owner: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._supervisor = None
+
+    @staticmethod
+    def key_for(info: dict) -> str:
+        return str(info.get('id') or info['ip'])
+
+    def add(self, info: dict) -> ManagedGateway:
+        """加入网关并建立连接；已存在且连接正常时直接复用"""
+        key = self.key_for(info)
+        with self._lock:
+            gateway = self._gateways.get(key)
+            if gateway is None:
+                gateway = ManagedGateway(key, info)
+                self._gateways[key] = gateway
+            elif not gateway.connected and gateway.update_address(info):
+                self._log(f"网关 {key} 地址变更为 {gateway.ip}:{gateway.port}")
+        self._ensure_supervisor()  # 先启动后台线程，首次连接失败时由它继续重连
+        if not gateway.connected:
+            self._connect(gateway)  # 失败时抛出异常
+        return gateway
+
+    def gateways(self) -> List[ManagedGateway]:
+        with self._lock:
+            return list(self._gateways.values())
+
+    def connected_gateways(self) -> List[ManagedGateway]:
+        return [gateway for gateway in self.gateways() if gateway.connected]
+
+    def has_connection(self) -> bool:
+        return bool(self.connected_gateways())
+
+    def assign_nodes(self, gateway: ManagedGateway, node_ids):
+        """记录拓扑中的节点属于哪个网关"""
+        with self._lock:
+            for node_id in gateway.node_ids:
+                if self._node_owner.get(node_id) == gateway.key:
+                    del self._node_owner[node_id]
+            gateway.node_ids = {int(node_id) for node_id in node_ids}
+            for node_id in gateway.node_ids:
+                self._node_owner[node_id] = gateway.key
+
+    def owner_of(self, node_id) -> Optional[ManagedGateway]:
+        with self._lock:
+            key = self._node_owner.get(int(node_id))
+            return self._gateways.get(key) if key else None
+
+    def default_gateway(self) -> Optional[ManagedGateway]:
+        connected = self.connected_gateways()
+        return connected[0] if connected else None
+
+    def split_by_owner(self, command: dict) -> List[Tuple[ManagedGateway, dict]]:
+        """
+        将 gateway_set.prop 命令按节点所属网关拆分
+        归属未知的节点发往默认网关
+        """
+        default = self.default_gateway()
+        parts: Dict[str, Tuple[ManagedGateway, dict]] = {}
+        for field in ("nodes", "scenes"):
+            for item in command.get(field, []):
+                gateway = self.owner_of(item["id"]) or default
+                if gateway is None:
+                    raise ConnectionError("Socket 未连接，无法发送命令")
+                if gateway.key not in parts:
+                    sub_command = {key: value for key, value in command.items() if key not in ("id", "nodes", "scenes")}
+                    sub_command.update({"nodes": [], "scenes": []})
+                    parts[gateway.key] = (gateway, sub_command)
+                parts[gateway.key][1][field].append(item)
+        return list(parts.values())
+
+    def request(self, gateway: ManagedGateway, command: dict, timeout: float = 5) -> dict:
+        if not gateway.connected:
+            raise ConnectionError(f"网关 {gateway.ip} 未连接")
+        try:
+            response = gateway.conn.request(command, timeout=timeout)
+        except TimeoutError:
+            metrics.GATEWAY_REQUESTS.inc(result='timeout')
+            raise
+        except OSError:
+            # 发送失败说明连接已失效，交给后台线程重连
+            metrics.GATEWAY_REQUESTS.inc(result='error')
+            gateway.conn.close()
+            self._schedule_reconnect(gateway)
+            raise
+        metrics.GATEWAY_REQUESTS.inc(result='error' if 'error' in response else 'ok')
+        return response
+
+    def close(self):
+        self._stop.set()
+        for gateway in self.gateways():
+            if gateway.conn:
+                gateway.conn.close()
+
+    def _connect(self, gateway: ManagedGateway):
+        conn = GatewayConnection(gateway.ip, gateway.port, timeout=8, logger=self.logger)
+        if self.on_push:
+            conn.subscribe(self.on_push)
+        try:
+            conn.connect()
+        except OSError:
+            self._schedule_reconnect(gateway)
+            raise
+        old_conn, gateway.conn = gateway.conn, conn
+        if old_conn:
+            old_conn.close()
+        gateway.backoff = 0.0
+        self._log(f"成功连接到网关: {gateway.ip}:{gateway.port}")
+
+    def _schedule_reconnect(self, gateway: ManagedGateway):
+        if self.on_disconnect:
+            try:
+                self.on_disconnect(gateway)
+            except Exception as e:
+                self._log(f"处理网关 {gateway.ip} 断线时出错: {str(e)}", level="ERROR")
+        gateway.backoff = min(self.max_backoff, gateway.backoff * 2 if gateway.backoff else self.min_backoff)
+        gateway.next_attempt = time.monotonic() + gateway.backoff
+        self._log(f"网关 {gateway.ip} 连接不可用，{gateway.backoff:.0f} 秒后重连", level="ERROR")
+
+    def _ensure_supervisor(self):
+        with self._lock:
+            if self._supervisor is None or not self._supervisor.is_alive():
+                self._stop.clear()
+                self._supervisor = threading.Thread(target=self._supervise, name="gateway-pool", daemon=True)
+                self._supervisor.start()
+
+    def _supervise(self):
+        """后台线程：断线重连，空闲时发送心跳探测"""
+        while not self._stop.wait(self.check_interval):
+            now = time.monotonic()
+            for gateway in self.gateways():
+                if not gateway.connected:
+                    if gateway.next_attempt == 0.0:
+                        self._schedule_reconnect(gateway)  # 刚发现断开
+                    elif now >= gateway.next_attempt:
+                        try:
+                            self._connect(gateway)
+                            metrics.GATEWAY_RECONNECTS.inc(result='ok')
+                        except OSError as e:
+                            metrics.GATEWAY_RECONNECTS.inc(result='error')
+                            self._log(f"重连网关 {gateway.ip} 失败: {str(e)}", level="ERROR")
+                    continue
+
+                gateway.next_attempt = 0.0
+                if now - gateway.conn.last_activity >= self.heartbeat_interval:
+                    try:
+                        gateway.conn.request(dict(self.probe_command), timeout=5)
+                    except Exception as e:
+                        self._log(f"网关 {gateway.ip} 心跳失败: {str(e)}", level="ERROR")
+                        gateway.conn.close()
+                        self._schedule_reconnect(gateway)
+
+    def _log(self, message: str, level: str = "INFO"):
+        if self.logger:
+            self.logger.log_message(message, level=level)
+        else:
+            print(f"[{level}] {message}")
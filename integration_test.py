@@ -1,9 +1,10 @@
-from langchain_core.runnables import RunnablePassthrough, RunnableLambda, RunnableParallel
 from langchain.prompts import PromptTemplate
 from prompts_test import template  # Import the prompt variable from prompts.py
-from typing import List, Dict
-from utils import extract_json  # 确保 utils.py 中的 extract_json 是普通函数
+from typing import List, Dict, Optional
+from utils import StreamingJSONExtractor
+from command_schema import validate_command
 import os
+import time
 from gateway import bulid_command, NodeType, DeviceType  # 新增导入
 import gc
 
@@ -14,33 +15,93 @@ class LangChainIntegrationTest:
 
     
 
-    def __init__(self):
+    def __init__(self, llm=None, prompt: str = template):
+        """llm 为空时按环境变量初始化 Ollama；评测脚本可以传入指定模型或桩 LLM"""
         # 从 app.py 复制的核心组件
         from ollama_api import initialize_llm
         from database_manager import DatabaseManager
         os.environ['OLLAMA_MODEL_NAME'] = os.getenv('OLLAMA_MODEL_NAME', 'deepseek-r1:7b')  # 默认值
         os.environ['OLLAMA_IP_PORT'] = os.getenv('OLLAMA_IP_PORT', 'http://192.168.3.73:11434')  # 默认值 
         
-        self.llm = initialize_llm()
+        self.llm = llm or initialize_llm()
+        self.prompt = prompt
         self.db_manager = DatabaseManager()
         self._init_chain()
         
     def _init_chain(self):
         """重构处理链结构"""
         self.prompt_template = PromptTemplate(
-            template=template,
+            template=self.prompt,
             input_variables=["user_input", "node_info"]
         )
         
-        # 使用RunnableParallel确保参数正确合并
-        self.chain = (
-            RunnableParallel({
-                "user_input": RunnablePassthrough(),
-                "node_info": RunnablePassthrough()
-            })
-            | self.prompt_template 
-            | self.llm
-        )
+        # 处理链直接以模板变量作为输入
+        # （之前先格式化 prompt 再经 RunnableParallel 传入，模板被格式化两次，prompt 内容重复）
+        self.chain = self.prompt_template | self.llm
+
+    def build_node_info(self, nodes) -> str:
+        """按节点类型分组，构建传给模型的节点信息字符串"""
+        result_strings = []
+        node_groups = {}
+        for node in nodes:
+            node_description = node.type_description
+            if node_description not in node_groups:
+                node_groups[node_description] = []
+            node_groups[node_description].append(node)
+
+        # 处理分组信息
+        for node_description, group in node_groups.items():
+            result_strings.append(f" '{node_description}'数据包含:")
+            for node in group:
+                result_strings.append(f"- {node.name}")
+        return '\n'.join(result_strings)  # 将列表转为字符串
+
+    def run_utterance(self, user_input: str, nodes=None, schema: Optional[dict] = None) -> dict:
+        """
+        解析一条指令，与 app.run_llm_chain 一样边生成边提取 JSON，得到完整命令后停止生成
+        schema 不为空时以结构化输出约束模型
+        返回命令（解析失败时为 None）、完整输出、生成的块数（Ollama 每块约为一个 token）、首块延迟和总延迟（毫秒）
+        """
+        nodes = self.generate_mock_data() if nodes is None else nodes
+        input_variables = {"user_input": user_input, "node_info": self.build_node_info(nodes)}
+        if schema:
+            chain = self.prompt_template | self.llm.bind(format=schema)
+            extractor = StreamingJSONExtractor(validate=lambda obj: validate_command(obj, schema))
+        else:
+            chain = self.chain
+            extractor = StreamingJSONExtractor()
+
+        start = time.perf_counter()
+        ttft = None
+        chunks = 0
+        command = None
+        stream = chain.stream(input_variables)
+        try:
+            for chunk in stream:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                chunks += 1
+                command = extractor.feed(chunk)
+                if command:
+                    break
+        finally:
+            stream.close()  # 关闭流式响应，Ollama 随之取消本次生成
+        latency = time.perf_counter() - start
+
+        error = None
+        if command is None:
+            try:
+                command = extractor.finish()
+            except ValueError as e:
+                error = str(e)
+        return {
+            "command": command,
+            "output": ''.join(extractor.text),
+            "tokens": chunks,
+            "ttft_ms": round((ttft if ttft is not None else latency) * 1000, 3),
+            "latency_ms": round(latency * 1000, 3),
+            "error": error
+        }
 
     def test_scenario(self, user_input: str):
         """修改后的测试方法"""
@@ -49,51 +110,15 @@ class LangChainIntegrationTest:
         print(f"\n=== 测试输入：'{user_input}' ===")
         
         try:
-            # 生成模拟数据
-            mock_nodes = self._generate_mock_data()
-            node_info_response = mock_nodes
-            
-            # 构建节点信息字符串
-            result_strings = []
-            node_groups = {}
-            for node in node_info_response:
-                node_description = node.type_description
-                if node_description not in node_groups:
-                    node_groups[node_description] = []
-                node_groups[node_description].append(node)
-
-            # 处理分组信息
-            for node_description, nodes in node_groups.items():
-                result_strings.append(f" '{node_description}'数据包含:")
-                for node in nodes:
-                    device_type_str = node.device_type
-                    device_type_description = self._get_device_type_description(device_type_str)
-                    
-                    # 优化点1：合并重复的条件判断
-                    # 优化点2：添加设备类型描述信息增强可读性
-                    node_info = (
-                        f"- {node.name}" 
-                        if device_type_description != "未知设备类型"
-                        else f"- {node.name}"
-                    )
-                    result_strings.append(node_info)
-            node_info_str = '\n'.join(result_strings)  # 将列表转为字符串
-            
-            # 执行处理链
-            full_response = []
-            input_variables = {"user_input": user_input, "node_info": node_info_str}
-            prompt = self.prompt_template.format(**input_variables)
-            print(prompt)
-            
-            for chunk in self.chain.stream(prompt):  
-                print(chunk, end='')
-                full_response.append(chunk)
-            # 合并响应为字符串再解析
-            combined_response = ''.join(full_response)
-            command = extract_json(combined_response)
+            result = self.run_utterance(user_input)
+            print(result["output"])
+            if result["error"]:
+                raise ValueError(result["error"])
+            command = result["command"]
             
             # 打印完整处理流程
             print(f"[处理结果]: {json.dumps(command, ensure_ascii=False)}")
+            print(f"[耗时]: 首块 {result['ttft_ms']} ms，总计 {result['latency_ms']} ms，生成 {result['tokens']} 块")
             
             control_result = self._simulate_control(command) 
             print(f"[控制结果]: {control_result}")
@@ -108,7 +133,7 @@ class LangChainIntegrationTest:
         result = bulid_command(command, None)
         return json.dumps(result, ensure_ascii=False) if isinstance(result, dict) else str(result)
 
-    def _generate_mock_data(self):
+    def generate_mock_data(self):
         """生成完整的模拟测试数据"""
         from collections import namedtuple
         Node = namedtuple('Node', ['id', 'type', 'type_description', 'name', 'device_type'])
@@ -0,0 +1,122 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from intent_parser import strip_punctuation
+from sqlite_store import open_store
+
+
+def normalize_utterance(text: str) -> str:
+    """去掉空白和标点并转为小写，使同一句话的不同写法命中同一条缓存"""
+    return strip_punctuation(text).lower()
+
+
+# intent_cache 表的迁移，只能追加
+INTENT_CACHE_MIGRATIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS intent_cache (
+        utterance TEXT,
+        topology TEXT,
+        command TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (utterance, topology)
+    )
+    ''',
+]
+
+
+class IntentCache:
+    """
+    意图解析结果缓存：规范化后的用户指令 + 拓扑版本 -> 命令
+    内存中为 LRU，可选写入 SQLite 表 intent_cache，重启后仍可命中；
+    两者都最多保留 max_items 条，SQLite 中超出时删除最早写入的行；
+    拓扑变化后旧版本的缓存全部失效；
+    validate 检查命令是否值得缓存（如字段有效且能匹配到节点），不通过的结果不写入
+    """
+
+    def __init__(self, max_items: int = 256, db_name: Optional[str] = None,
+                 validate: Optional[Callable[[dict], bool]] = None):
+        self.max_items = max_items
+        self.db_name = db_name
+        self.validate = validate
+        self._store = open_store(db_name) if db_name else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self._store:
+            self._store.migrate('intent_cache', INTENT_CACHE_MIGRATIONS)
+
+    def get(self, utterance: str, topology: str) -> Optional[dict]:
+        key = (normalize_utterance(utterance), topology)
+        with self._lock:
+            command = self._entries.get(key)
+            if command is not None:
+                self._entries.move_to_end(key)
+        if command is None and self.db_name:
+            command = self._load(*key)
+            if command is not None:
+                self._remember(key, command)
+
+        with self._lock:
+            if command is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return dict(command) if command is not None else None
+
+    def put(self, utterance: str, topology: str, command: dict) -> bool:
+        """写入缓存，返回是否写入；无效的解析结果不缓存，避免同一句话一直命中错误的命令"""
+        key = (normalize_utterance(utterance), topology)
+        if not key[0] or (self.validate and not self.validate(command)):
+            return False
+        command = dict(command)
+        self._remember(key, command)
+        if self.db_name:
+            with self._store.write() as conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO intent_cache (utterance, topology, command) VALUES (?, ?, ?)',
+                    (key[0], key[1], json.dumps(command, ensure_ascii=False))
+                )
+                # INSERT OR REPLACE 会分配新的 rowid，rowid 越小写入越早
+                conn.execute(
+                    'DELETE FROM intent_cache WHERE rowid IN '
+                    '(SELECT rowid FROM intent_cache ORDER BY rowid DESC LIMIT -1 OFFSET ?)',
+                    (self.max_items,)
+                )
+        return True
+
+    def invalidate(self, topology: str):
+        """拓扑变化后调用，只保留当前版本的缓存"""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] != topology]:
+                del self._entries[key]
+        if self.db_name:
+            with self._store.write() as conn:
+                conn.execute('DELETE FROM intent_cache WHERE topology != ?', (topology,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+    def _remember(self, key, command: dict):
+        with self._lock:
+            self._entries[key] = command
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def _load(self, utterance: str, topology: str) -> Optional[dict]:
+        with self._store.read() as conn:
+            row = conn.execute(
+                'SELECT command FROM intent_cache WHERE utterance = ? AND topology = ?',
+                (utterance, topology)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
@@ -0,0 +1,208 @@
+"""
+离线意图识别评测：在 integration_test 的模拟住宅上运行带标注的指令语料，
+统计各模型的准确率、生成 token 数和延迟，用于选出满足准确率要求的最快模型
+
+    python intent_eval.py --backend stub
+    python intent_eval.py --models qwen2.5:3b,qwen2.5:7b,deepseek-r1:7b --min-accuracy 0.9 --output eval.json
+
+- --backend stub 使用 stub_backends.StubLLM 直接返回语料中的标准命令，结果确定，可在 CI 中离线运行
+- 模型依次评测，同一模型内的指令按 --parallel 并发；Ollama 会对并发请求排队，延迟以 --parallel 1 最准确
+- 一条指令判为正确的条件：action 与标注一致，且命令按名称匹配到的节点与 expected_node_ids 相同
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmark import summarize
+from command_schema import build_command_schema
+from gateway import INDEX_PARTITIONS, NodeType, resolve_command_nodes
+from integration_test import LangChainIntegrationTest
+from match_name import NameIndex
+from utils import COMMAND_FIELDS, is_command
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(REPO_DIR, "benchmarks", "intent_corpus.json")
+
+
+def resolve_node_ids(name_index: NameIndex, command: dict) -> List[int]:
+    """命令按名称匹配到的节点 id"""
+    return sorted(node.id for node in resolve_command_nodes(name_index, command))
+
+
+def score_case(case: dict, result: dict, name_index: NameIndex) -> dict:
+    expected = case["expected"]
+    command = result.get("command")
+    parsed = is_command(command)
+    fields = {field: parsed and command.get(field) == expected[field] for field in COMMAND_FIELDS}
+    node_ids = resolve_node_ids(name_index, command) if parsed else []
+    node_match = node_ids == sorted(case["expected_node_ids"])
+    return dict(
+        result,
+        id=case["id"],
+        text=case["text"],
+        tags=case.get("tags", []),
+        parsed=parsed,
+        fields=fields,
+        exact=all(fields.values()),
+        node_ids=node_ids,
+        node_match=node_match,
+        correct=node_match and fields["action"]
+    )
+
+
+def evaluate_model(tester: LangChainIntegrationTest, corpus: List[dict], parallel: int, structured: bool) -> dict:
+    """在整个语料上评测一个模型，返回该模型的汇总"""
+    nodes = tester.generate_mock_data()
+    name_index = NameIndex(nodes, INDEX_PARTITIONS)
+    schema = build_command_schema(
+        locations=(node.name for node in nodes if node.type == NodeType.ROOM.value)
+    ) if structured else None
+
+    def one(case: dict) -> dict:
+        try:
+            result = tester.run_utterance(case["text"], nodes=nodes, schema=schema)
+        except Exception as e:  # 连接失败、模型不存在等，不影响其他指令
+            result = {"command": None, "output": "", "tokens": 0, "ttft_ms": 0.0, "latency_ms": 0.0,
+                      "error": f"{type(e).__name__}: {e}", "exception": True}
+        return score_case(case, result, name_index)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        results = list(executor.map(one, corpus))
+    elapsed = time.perf_counter() - started
+
+    total = len(results)
+    answered = [result for result in results if result["parsed"]]
+    tags: Dict[str, List[dict]] = {}
+    for result in results:
+        for tag in result["tags"]:
+            tags.setdefault(tag, []).append(result)
+
+    def rate(items: List[dict], key: str) -> float:
+        return round(sum(1 for item in items if item[key]) / len(items), 4) if items else 0.0
+
+    return {
+        "cases": total,
+        "accuracy": rate(results, "correct"),
+        "exact_match": rate(results, "exact"),
+        "node_accuracy": rate(results, "node_match"),
+        "field_accuracy": {
+            field: round(sum(1 for result in results if result["fields"][field]) / total, 4) if total else 0.0
+            for field in COMMAND_FIELDS
+        },
+        "tag_accuracy": {tag: rate(items, "correct") for tag, items in sorted(tags.items())},
+        "parse_failures": total - len(answered),  # 包括请求出错的指令
+        "errors": sum(1 for result in results if result.get("exception")),
+        "tokens": {
+            "total": sum(result["tokens"] for result in results),
+            "mean": round(sum(result["tokens"] for result in answered) / len(answered), 2) if answered else 0.0,
+        },
+        "latency_ms": summarize([result["latency_ms"] for result in answered]),
+        "ttft_ms": summarize([result["ttft_ms"] for result in answered]),
+        "elapsed_s": round(elapsed, 3),
+        "failures": [
+            {key: result[key] for key in ("id", "text", "command", "node_ids", "error", "output")}
+            for result in results if not result["correct"]
+        ],
+    }
+
+
+def create_backends(args, corpus: List[dict]) -> Dict[str, object]:
+    """按参数创建待评测的 LLM，键为报告中的模型名称"""
+    if args.backend == "stub":
+        from stub_backends import StubLLM
+        return {"stub": StubLLM(
+            responses={case["text"]: case["expected"] for case in corpus},
+            prefill_delay=args.stub_prefill_ms / 1000,
+            token_delay=args.stub_token_ms / 1000
+        )}
+
+    from ollama_api import create_llm
+    models = [model.strip() for model in (args.models or os.getenv('OLLAMA_MODEL_NAME', '')).split(",") if model.strip()]
+    if not models:
+        raise SystemExit("请通过 --models 或 OLLAMA_MODEL_NAME 指定要评测的模型")
+    return {model: create_llm(model, temperature=args.temperature) for model in models}
+
+
+def recommend(report: Dict[str, dict], min_accuracy: float):
+    """满足准确率要求的模型中 p50 延迟最低的一个，没有时返回 None"""
+    qualified = [(summary["latency_ms"]["p50"], model) for model, summary in report.items()
+                 if summary["accuracy"] >= min_accuracy]
+    return min(qualified)[1] if qualified else None
+
+
+def print_summary(model: str, summary: dict):
+    latency, ttft = summary["latency_ms"], summary["ttft_ms"]
+    print(f"\n[{model}] 准确率 {summary['accuracy']:.1%}，完全一致 {summary['exact_match']:.1%}，"
+          f"节点匹配 {summary['node_accuracy']:.1%}，解析失败 {summary['parse_failures']}，错误 {summary['errors']}")
+    print(f"  字段准确率: " + "，".join(f"{field} {value:.1%}" for field, value in summary["field_accuracy"].items()))
+    print(f"  分类准确率: " + "，".join(f"{tag} {value:.1%}" for tag, value in summary["tag_accuracy"].items()))
+    print(f"  生成 token: 共 {summary['tokens']['total']}，平均 {summary['tokens']['mean']}")
+    print(f"  延迟 p50 {latency['p50']} / p95 {latency['p95']} ms，首 token p50 {ttft['p50']} / p95 {ttft['p95']} ms")
+    for failure in summary["failures"]:
+        print(f"  ✗ {failure['id']} {failure['text']} -> "
+              f"{json.dumps(failure['command'], ensure_ascii=False)} {failure['node_ids']} {failure['error'] or ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线意图识别准确率和延迟评测")
+    parser.add_argument("--backend", choices=["ollama", "stub"], default="ollama")
+    parser.add_argument("--models", help="逗号分隔的 Ollama 模型列表，默认使用 OLLAMA_MODEL_NAME")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--parallel", type=int, default=4, help="同一模型内并发评测的指令数")
+    parser.add_argument("--temperature", type=float, default=0.0)
+    parser.add_argument("--prompt", choices=["test", "prod"], default="test",
+                        help="test 使用 prompts_test.template，prod 使用线上的 prompts.template")
+    parser.add_argument("--no-structured", action="store_true", help="不使用结构化输出约束模型")
+    parser.add_argument("--stub-prefill-ms", type=float, default=0, help="桩 LLM 的首 token 延迟")
+    parser.add_argument("--stub-token-ms", type=float, default=0, help="桩 LLM 每个 token 的生成时间")
+    parser.add_argument("--min-accuracy", type=float, help="准确率要求，没有模型达到时以非零状态退出")
+    parser.add_argument("--output", help="结果 JSON 文件")
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding="utf-8") as f:
+        corpus_file = json.load(f)
+    corpus = corpus_file["cases"]
+    if args.prompt == "prod":
+        from prompts import template
+    else:
+        from prompts_test import template
+
+    report = {}
+    for model, llm in create_backends(args, corpus).items():
+        tester = LangChainIntegrationTest(llm=llm, prompt=template)
+        try:
+            llm.invoke("你好", num_predict=1)  # 先加载模型，避免首条指令的延迟包含加载时间
+        except Exception as e:
+            print(f"[{model}] 预热失败: {e}")
+        report[model] = evaluate_model(tester, corpus, args.parallel, structured=not args.no_structured)
+        print_summary(model, report[model])
+
+    results = {
+        "config": dict(vars(args), corpus_version=corpus_file.get("version")),
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "models": report,
+    }
+    exit_code = 0
+    if args.min_accuracy is not None:
+        best = recommend(report, args.min_accuracy)
+        results["recommended"] = best
+        if best:
+            print(f"\n准确率不低于 {args.min_accuracy:.1%} 的最快模型: {best}")
+        else:
+            print(f"\n没有模型达到 {args.min_accuracy:.1%} 的准确率")
+            exit_code = 1
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
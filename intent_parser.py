@@ -0,0 +1,134 @@
+import re
+import threading
+from typing import Optional
+
+from match_name import NameMatcher
+
+# 动词表，按长度优先匹配
+LEADING_VERBS = [
+    ("执行", "excute"),
+    ("启动", "excute"),
+    ("开启", "turn_on"),
+    ("打开", "turn_on"),
+    ("关闭", "turn_off"),
+    ("关掉", "turn_off"),
+    ("开", "turn_on"),
+    ("关", "turn_off"),
+]
+
+# “把客厅灯带打开” 这类句式的结尾动词
+TRAILING_VERBS = [
+    ("打开", "turn_on"),
+    ("开启", "turn_on"),
+    ("开了", "turn_on"),
+    ("关闭", "turn_off"),
+    ("关掉", "turn_off"),
+    ("关上", "turn_off"),
+    ("关了", "turn_off"),
+]
+
+POLITE_PREFIXES = ("请帮我", "麻烦", "帮我", "给我", "请")
+FILLER_SUFFIXES = ("一下", "吧")
+_PUNCTUATION = re.compile(r"[\s，。！？,.!?、~～]+")
+
+
+def strip_punctuation(text: str) -> str:
+    """去掉指令中的空白和标点"""
+    return _PUNCTUATION.sub("", text or "")
+
+# 依次尝试的 domain 分区，与 gateway.DOMAIN_FILTERS 一致
+_DOMAINS = ("scene", "light", "switch")
+
+
+class RuleIntentParser:
+    """
+    基于规则的意图解析：用已知的设备/情景名称和动作动词直接生成命令，
+    只有在名称与某个 domain 的节点完全一致时才返回结果，否则交给 LLM 处理
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, user_input: str, name_index) -> Optional[dict]:
+        """返回 {domain, name, action, location}，置信度不足时返回 None"""
+        command = self._parse(user_input or "", name_index)
+        with self._lock:
+            if command:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return command
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+    def _parse(self, user_input: str, name_index) -> Optional[dict]:
+        text = strip_punctuation(user_input)
+        text = self._strip_prefix(text, POLITE_PREFIXES)
+        text = self._strip_suffix(text, FILLER_SUFFIXES)
+
+        action, target = self._split_action(text)
+        if not action or not target:
+            return None
+
+        for candidate in (target, target.replace("的", "")):
+            command = self._match_target(candidate, action, name_index)
+            if command:
+                return command
+        return None
+
+    def _split_action(self, text: str):
+        if text.startswith("把"):
+            for verb, action in TRAILING_VERBS:
+                if text.endswith(verb):
+                    return action, text[1:-len(verb)]
+            return None, None
+
+        for verb, action in LEADING_VERBS:
+            if text.startswith(verb):
+                return action, text[len(verb):]
+        return None, None
+
+    def _match_target(self, target: str, action: str, name_index) -> Optional[dict]:
+        matched = [domain for domain in _DOMAINS if name_index.find_exact(target, domain)]
+        if len(matched) != 1:
+            return None  # 没有或存在多个同名节点，置信度不足
+        domain = matched[0]
+
+        if domain == "scene":
+            if action == "turn_off":
+                return None  # “关闭观影模式” 语义不明确
+            return {"domain": "scene", "name": target, "action": "excute", "location": "null"}
+
+        if action == "excute":
+            return None
+        return {"domain": domain, "name": target, "action": action, "location": self._location(target, name_index)}
+
+    @staticmethod
+    def _location(target: str, name_index) -> str:
+        normalized = NameMatcher.normalize_name(target)
+        rooms = [NameMatcher.normalize_name(room.name or "") for room in name_index.partition("room")]
+        matches = [room for room in rooms if room and normalized.startswith(room)]
+        return max(matches, key=len) if matches else "all"
+
+    @staticmethod
+    def _strip_prefix(text: str, prefixes) -> str:
+        for prefix in prefixes:
+            if text.startswith(prefix):
+                return text[len(prefix):]
+        return text
+
+    @staticmethod
+    def _strip_suffix(text: str, suffixes) -> str:
+        for suffix in suffixes:
+            if text.endswith(suffix):
+                return text[:-len(suffix)]
+        return text
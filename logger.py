@@ -1,39 +1,138 @@
 from flask_socketio import SocketIO
 from datetime import datetime  # Import datetime module
+from collections import deque
+import os
+import threading
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+
+class LogPipeline:
+    """
+    异步日志管道
+    日志先写入有界环形缓冲区，由后台任务定期批量推送到 WebSocket；
+    缓冲区满时丢弃最旧的日志并计数，调用方不会被阻塞
+    """
+
+    def __init__(self, socketio: SocketIO, capacity: int = 1000, flush_interval: float = 0.1):
+        self.socketio = socketio
+        self.flush_interval = flush_interval
+        self._buffer = deque()
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._started = False
+        self.dropped = 0  # 因缓冲区满而丢弃的日志条数
+        self._reported_dropped = 0
+
+    def start(self):
+        """启动推送任务；须在主线程（启动时）调用，其他线程中不能创建协程"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.socketio.start_background_task(self._drain_loop)
+
+    def put(self, message: str):
+        # 推送任务未启动前日志留在缓冲区中
+        with self._lock:
+            if len(self._buffer) >= self._capacity:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(message)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'buffered': len(self._buffer), 'dropped': self.dropped}
+
+    def _drain_loop(self):
+        while True:
+            self.socketio.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """将缓冲区中的日志合并为一次推送"""
+        with self._lock:
+            messages = list(self._buffer)
+            self._buffer.clear()
+            dropped = self.dropped - self._reported_dropped
+            self._reported_dropped = self.dropped
+        if dropped:
+            messages.insert(0, f"[WARNING] 日志过多，已丢弃 {dropped} 条 \n")
+        if messages:
+            try:
+                self.socketio.emit('log_update', {'message': ''.join(messages)}, namespace='/')  # Emit log message to WebSocket clients
+            except Exception as e:
+                print(f"日志输出失败: {str(e)}", flush=True)  # 打印错误信息
+
+
+# 每个 socketio 实例共用一个日志管道
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+def _get_pipeline(socketio: SocketIO) -> LogPipeline:
+    with _pipelines_lock:
+        pipeline = _pipelines.get(id(socketio))
+        if pipeline is None:
+            pipeline = LogPipeline(
+                socketio,
+                capacity=int(os.getenv('LOG_BUFFER_SIZE', '1000')),
+                flush_interval=float(os.getenv('LOG_FLUSH_INTERVAL', '0.1'))
+            )
+            _pipelines[id(socketio)] = pipeline
+        return pipeline
+
 
 class Logger:
     def __init__(self, socketio: SocketIO):
         self.socketio = socketio
+        self.min_level = LEVELS.get(os.getenv('LOG_LEVEL', 'INFO').upper(), LEVELS["INFO"])
+        self.max_length = int(os.getenv('LOG_MAX_LENGTH', '2000'))
 
     def log_message(self, message: str, level: str = "INFO"):
         """Log formatted messages and emit to WebSocket."""
-        log_entry = f"[{level}] [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message} \n"
+        if LEVELS.get(level, LEVELS["INFO"]) < self.min_level:
+            return
+        log_entry = f"[{level}] [{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {self._truncate(str(message))} \n"
         print(log_entry)  # Print to console
         if self.socketio:
-            self.socketio.emit('log_update', {'message': log_entry})  # Emit log message to WebSocket clients
-            self.socketio.sleep(0.05)  # 确保事件循环继续执行
+            _get_pipeline(self.socketio).put(log_entry)  # 由后台任务批量推送
+            self._yield()
 
     def log_message_stream(self, message: str):
         """Log formatted messages and emit to WebSocket."""
         try:
             print(message, end='', flush=True)  # 实时输出
             if self.socketio:
-                self.socketio.emit('log_update', {'message': message}, namespace='/')  # 实时发送到客户端
-                self.socketio.sleep(0.05)  # 确保事件循环继续执行
+                _get_pipeline(self.socketio).put(message)  # 由后台任务批量推送
+                self._yield()
         except Exception as e:
             print(f"日志输出失败: {str(e)}", flush=True)  # 打印错误信息
-        
-1
+
+    def stats(self) -> dict:
+        """日志管道的缓冲和丢弃计数"""
+        return _get_pipeline(self.socketio).stats() if self.socketio else {'buffered': 0, 'dropped': 0}
+
+    def _yield(self):
+        # 让出事件循环，不再固定等待；网关读线程等其他线程中不能切换协程
+        if threading.current_thread() is threading.main_thread():
+            self.socketio.sleep(0)
+
+    def _truncate(self, message: str) -> str:
+        if self.max_length and len(message) > self.max_length:
+            return f"{message[:self.max_length]}...（已截断 {len(message) - self.max_length} 字符）"
+        return message
+
 # 全局 logger 实例
 logger = None
 
 def init_logger(socketio: SocketIO):
-    """初始化全局 logger 实例"""
+    """初始化全局 logger 实例，并在当前（主）线程中启动日志推送任务"""
     global logger
     logger = Logger(socketio)
+    _get_pipeline(socketio).start()
 
 def get_logger() -> Logger:
     """获取全局 logger 实例"""
     if logger is None:
         raise Exception("Logger has not been initialized. Call init_logger first.")
-    return logger 
\ No newline at end of file
+    return logger
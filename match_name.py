@@ -1,4 +1,9 @@
 import re
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+# 中文数字转换表，只需构建一次
+_CHINESE_TO_ARABIC = str.maketrans('零一二三四五六七八九', '0123456789')
 
 class NameMatcher:
     @staticmethod
@@ -8,8 +13,7 @@ class NameMatcher:
         # 将全角字符转换为半角字符
         name = ''.join(chr(ord(char) - 0xFEE0) if 0xFF01 <= ord(char) <= 0xFF5E else char for char in name)
         # 将中文数字转换为阿拉伯数字
-        chinese_to_arabic = str.maketrans('零一二三四五六七八九', '0123456789')
-        name = name.translate(chinese_to_arabic)
+        name = name.translate(_CHINESE_TO_ARABIC)
         return name
 
     @staticmethod
@@ -17,24 +21,91 @@ class NameMatcher:
         # 规范化名称
         dev_name = NameMatcher.normalize_name(dev_name)
         target_name = NameMatcher.normalize_name(target_name)
-        
+
         # 完全匹配
         if dev_name == target_name:
             return True
         # 前缀匹配
         if dev_name.startswith(target_name):
             return True
-        # 模糊匹配
-        if re.search(target_name, dev_name):
+        # 模糊匹配（用户输入按普通字符串处理）
+        if re.search(re.escape(target_name), dev_name):
             return True
         return False
 
     @staticmethod
     def find_devices_by_name(nodes, name):
-        # 遍历 NodeInfo 实例
-        for dev in nodes:
-            # 打印设备的名称和类型描述
-            print(f"设备名称: {dev.name}, 类型描述: {dev.type_description}")
-        
         # 返回匹配的设备
-        return [dev for dev in nodes if NameMatcher.match_device_name(dev.name, name)] 
\ No newline at end of file
+        return [dev for dev in nodes if NameMatcher.match_device_name(dev.name, name)]
+
+
+class NameIndex:
+    """
+    设备名称索引，拓扑保存时构建一次
+    包含规范化名称的精确索引、字符 n-gram 倒排索引，以及按 domain 划分的分区
+    """
+
+    NGRAM_SIZES = (1, 2)
+
+    def __init__(self, nodes, partitions: Optional[Dict[str, Callable]] = None):
+        self.nodes = list(nodes)
+        self.names = [NameMatcher.normalize_name(node.name or "") for node in self.nodes]
+        self._exact = defaultdict(list)
+        self._ngrams = defaultdict(set)
+        self._partitions = {
+            key: frozenset(i for i, node in enumerate(self.nodes) if predicate(node))
+            for key, predicate in (partitions or {}).items()
+        }
+
+        for i, name in enumerate(self.names):
+            self._exact[name].append(i)
+            for size in self.NGRAM_SIZES:
+                for gram in self._grams(name, size):
+                    self._ngrams[gram].add(i)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def partition(self, domain: Optional[str]) -> List:
+        """返回某个 domain 分区内的全部节点"""
+        return [self.nodes[i] for i in sorted(self._candidates(domain))]
+
+    def find_exact(self, name: str, domain: Optional[str] = None) -> List:
+        ids = set(self._exact.get(NameMatcher.normalize_name(name), ()))
+        return self._collect(ids, domain)
+
+    def find(self, name: str, domain: Optional[str] = None) -> List:
+        """
+        与 NameMatcher.match_device_name 语义一致：完全匹配、前缀匹配或包含子串
+        （前缀和完全匹配都是子串的特例，统一按子串查找）
+        结果保持节点原有顺序；名称为空时不匹配任何节点，避免命令缺少 name 时控制整个分区
+        """
+        target = NameMatcher.normalize_name(name or "")
+        if not target:
+            return []
+
+        size = min(len(target), max(self.NGRAM_SIZES))
+        ids = None
+        for gram in self._grams(target, size):
+            postings = self._ngrams.get(gram)
+            if not postings:
+                return []
+            ids = set(postings) if ids is None else ids & postings
+            if not ids:
+                return []
+
+        return self._collect({i for i in ids if target in self.names[i]}, domain)
+
+    def _candidates(self, domain: Optional[str]):
+        if domain is None:
+            return range(len(self.nodes))
+        return self._partitions.get(domain, frozenset())
+
+    def _collect(self, ids, domain: Optional[str]) -> List:
+        if domain is not None:
+            ids = set(ids) & self._candidates(domain)
+        return [self.nodes[i] for i in sorted(ids)]
+
+    @staticmethod
+    def _grams(text: str, size: int):
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
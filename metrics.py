@@ -0,0 +1,202 @@
+"""
+Prometheus 文本格式的指标
+METRICS_ENABLED=0 时所有记录操作直接返回，几乎没有开销；/metrics 只输出已注册的指标定义
+"""
+import abc
+import bisect
+import os
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+import tracing
+
+ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+
+# 默认分桶（秒），覆盖从名称匹配（微秒级）到 LLM 生成（秒级）的范围
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_key(labels: dict) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: Tuple, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(items, escaped)) + "}"
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        """指标的样本行，由各类型实现"""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(key)} {value}" for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def track_inprogress(self, **labels):
+        """with gauge.track_inprogress(endpoint=...): 进入时加一，退出时减一"""
+        return _InProgress(self, labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(key)} {value}" for key, value in self._values.items()]
+
+
+class _InProgress:
+    def __init__(self, gauge: Gauge, labels: dict):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self):
+        self.gauge.inc(**self.labels)
+
+    def __exit__(self, *exc):
+        self.gauge.dec(**self.labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, list] = {}  # 标签 -> [各分桶计数..., 总和, 总数]
+
+    def observe(self, value: float, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = [(key, list(data)) for key, data in self._values.items()]
+        for key, data in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, data):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', repr(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {data[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {data[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {data[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# 处理流程
+STAGE_SECONDS = registry.register(Histogram('yeelight_stage_duration_seconds', '处理流程各阶段耗时'))
+REQUEST_SECONDS = registry.register(Histogram('yeelight_request_duration_seconds', '请求总耗时'))
+REQUESTS_IN_FLIGHT = registry.register(Gauge('yeelight_requests_in_flight', '正在处理的请求数'))
+JSON_PARSE_FAILURES = registry.register(Counter('yeelight_json_parse_failures_total', 'JSON 解析失败次数'))
+NAME_MATCH_MISSES = registry.register(Counter('yeelight_name_match_misses_total', '按名称未找到节点的次数'))
+CACHE_REQUESTS = registry.register(Counter('yeelight_cache_requests_total', '缓存查询次数（result 为 hit / miss）'))
+
+# 网关
+GATEWAY_REQUESTS = registry.register(Counter('yeelight_gateway_requests_total', '网关请求次数（result 为 ok / error / timeout）'))
+GATEWAY_RECONNECTS = registry.register(Counter('yeelight_gateway_reconnects_total', '网关重连尝试次数（result 为 ok / error）'))
+GATEWAY_PUSHES = registry.register(Counter('yeelight_gateway_pushes_total', '收到的网关推送消息数'))
+GATEWAY_CONNECTED = registry.register(Gauge('yeelight_gateways_connected', '已连接的网关数'))
+
+# 数据库
+TOPOLOGY_NODES = registry.register(Gauge('yeelight_topology_nodes', '拓扑中的节点数'))
+TOPOLOGY_GENERATION = registry.register(Gauge('yeelight_topology_generation', '拓扑版本号'))
+DB_WRITE_SECONDS = registry.register(Histogram('yeelight_db_write_duration_seconds', '节点表批量写入耗时'))
+DB_ROWS_WRITTEN = registry.register(Counter('yeelight_db_rows_written_total', '节点表实际写入（新增或变化）的行数'))
+
+
+# 请求的各阶段耗时同时写入直方图
+if ENABLED:
+    tracing.add_stage_observer(lambda trace, stage, seconds: STAGE_SECONDS.observe(seconds, stage=stage))
+    tracing.add_finish_observer(lambda trace, seconds: REQUEST_SECONDS.observe(seconds, endpoint=trace.name))
+
+
+def render() -> str:
+    return registry.render()
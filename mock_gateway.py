@@ -0,0 +1,342 @@
+"""
+模拟 Yeelight Pro 网关，用于在没有真实硬件时测试和压测 gateway.py
+
+    python mock_gateway.py --devices 2000 --latency-ms 20 --jitter-ms 10 --drop-rate 0.01
+
+- UDP 1982：响应发现广播（客户端可设置 GATEWAY_BROADCAST_ADDR=127.0.0.1）
+- TCP 65443：按 \\r\\n 分帧的 JSON 协议，支持 gateway_get.topology、gateway_get.room、
+  gateway_set.prop，并主动推送 gateway_post.prop
+- 可配置响应延迟、抖动和丢包率，拓扑按参数合成，可生成上千个节点
+"""
+import argparse
+import heapq
+import itertools
+import json
+import random
+import socket
+import threading
+import time
+from typing import Dict, List, Optional
+
+DISCOVERY_MESSAGE = b"YEELIGHT_GATEWAY_CONTROL_DISCOVER"
+
+ROOM_NAMES = ["客厅", "主卧", "次卧", "儿童房", "书房", "厨房", "餐厅", "卫生间", "阳台", "玄关", "衣帽间", "影音室"]
+# (名称, 设备类型)，设备类型与 gateway.DeviceType 一致
+DEVICE_KINDS = [("吊灯", 2), ("筒灯", 3), ("射灯", 3), ("灯带", 4), ("台灯", 1), ("窗帘", 6), ("开关", 7), ("面板", 13)]
+SCENE_NAMES = ["回家模式", "离家模式", "观影模式", "睡眠模式", "阅读模式", "会客模式", "起夜模式", "用餐模式"]
+
+
+class SyntheticTopology:
+    """按参数合成的家庭拓扑：房间、设备、每个房间的灯组、情景和整屋"""
+
+    def __init__(self, devices: int = 50, rooms: int = 6, scenes: int = 8, seed: int = 0):
+        rng = random.Random(seed)
+        ids = itertools.count(1)
+        self.nodes: List[dict] = []  # gateway_get.topology 返回的节点
+        self.rooms: List[dict] = []  # gateway_get.room 返回的房间
+        self.members: Dict[int, List[int]] = {}  # 组节点 -> 成员
+
+        room_names = [ROOM_NAMES[i % len(ROOM_NAMES)] + (str(i // len(ROOM_NAMES) + 1) if i >= len(ROOM_NAMES) else "")
+                      for i in range(rooms)]
+        room_devices = {name: [] for name in room_names}
+        counters = {}
+        for _ in range(devices):
+            room = rng.choice(room_names)
+            kind, device_type = rng.choice(DEVICE_KINDS)
+            counters[(room, kind)] = counters.get((room, kind), 0) + 1
+            suffix = counters[(room, kind)]
+            node = {"id": next(ids), "nt": 2, "n": f"{room}{kind}{suffix if suffix > 1 else ''}", "type": device_type}
+            self.nodes.append(node)
+            room_devices[room].append(node)
+
+        for room in room_names:
+            lights = [node["id"] for node in room_devices[room] if node["type"] in (1, 2, 3, 4)]
+            if len(lights) >= 2:
+                group_id = next(ids)
+                self.nodes.append({"id": group_id, "nt": 4, "n": f"{room}灯组", "type": 2, "members": lights})
+                self.members[group_id] = lights
+
+            room_id = next(ids)
+            member_ids = [node["id"] for node in room_devices[room]]
+            self.rooms.append({"id": room_id, "n": room, "nt": 1, "nodes": member_ids})
+            self.members[room_id] = member_ids
+
+        for i in range(scenes):
+            name = SCENE_NAMES[i % len(SCENE_NAMES)] + (str(i // len(SCENE_NAMES) + 1) if i >= len(SCENE_NAMES) else "")
+            self.nodes.append({"id": next(ids), "nt": 6, "n": name})
+
+        house_id = next(ids)
+        self.nodes.append({"id": house_id, "nt": 5, "n": "全屋"})
+        self.members[house_id] = [node["id"] for node in self.nodes if node["nt"] == 2]
+
+    def device_ids(self) -> List[int]:
+        return [node["id"] for node in self.nodes if node["nt"] == 2]
+
+    def expand(self, node_id: int) -> List[int]:
+        """组节点展开为成员，设备节点返回自身"""
+        return self.members.get(node_id, [node_id])
+
+
+class _ClientConnection:
+    """一个客户端连接：读线程处理请求，写线程按到期时间发送（模拟延迟）"""
+
+    def __init__(self, server: "MockGateway", sock: socket.socket):
+        self.server = server
+        self.sock = sock
+        self._queue = []  # (发送时间, 序号, 数据)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def start(self):
+        threading.Thread(target=self._read_loop, name="mock-gateway-reader", daemon=True).start()
+        threading.Thread(target=self._write_loop, name="mock-gateway-writer", daemon=True).start()
+
+    def send(self, message: dict, delay: float = 0.0):
+        payload = (json.dumps(message, ensure_ascii=False) + "\r\n").encode()
+        with self._cond:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._seq), payload))
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def _read_loop(self):
+        buffer = bytearray()
+        decoder = json.JSONDecoder()
+        try:
+            while True:
+                chunk = self.sock.recv(65536)
+                if not chunk:
+                    break
+                buffer.extend(chunk)
+                while True:
+                    end = buffer.find(b"\r\n")
+                    if end == -1:
+                        break
+                    frame = bytes(buffer[:end]).decode("utf-8", errors="replace").strip()
+                    del buffer[:end + 2]
+                    if frame:
+                        try:
+                            request, _ = decoder.raw_decode(frame)
+                        except json.JSONDecodeError:
+                            continue
+                        self.server.handle(self, request)
+        except OSError:
+            pass
+        finally:
+            self.server.disconnect(self)
+            self.close()
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._queue or self._queue[0][0] > time.monotonic()):
+                    timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._cond.wait(timeout)
+                if self._closed:
+                    return
+                _, _, payload = heapq.heappop(self._queue)
+            try:
+                self.sock.sendall(payload)
+            except OSError:
+                return
+
+
+class MockGateway:
+    """
+    模拟网关，可在进程内启动（供压测脚本使用），也可作为独立脚本运行
+    latency / jitter 单位为秒，每个响应的延迟在 latency ± jitter 内均匀分布；
+    drop_rate 为不响应请求的概率；push_interval > 0 时定期随机推送设备状态变化
+    """
+
+    def __init__(self, host: str = "127.0.0.1", tcp_port: int = 65443, udp_port: int = 1982,
+                 topology: Optional[SyntheticTopology] = None, gateway_id: str = "mock-gateway-1",
+                 latency: float = 0.0, jitter: float = 0.0, drop_rate: float = 0.0,
+                 push_interval: float = 0.0, seed: Optional[int] = None):
+        self.host = host
+        self.tcp_port = tcp_port
+        self.udp_port = udp_port
+        self.topology = topology or SyntheticTopology()
+        self.gateway_id = gateway_id
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.push_interval = push_interval
+        self._rng = random.Random(seed)
+        self._states: Dict[int, dict] = {}
+        self._clients: List[_ClientConnection] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sockets = []
+        self._threads: List[threading.Thread] = []
+        self.stats = {"requests": 0, "dropped": 0, "set_nodes": 0, "pushes": 0}
+
+    def start(self):
+        self._stop.clear()
+        tcp_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        tcp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        tcp_sock.bind((self.host, self.tcp_port))
+        tcp_sock.listen(64)
+        self.tcp_port = tcp_sock.getsockname()[1]  # 端口为 0 时使用系统分配的端口
+        self._sockets.append(tcp_sock)
+        self._start_thread(self._accept_loop, tcp_sock, name="mock-gateway-accept")
+
+        if self.udp_port is not None:
+            udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            udp_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            udp_sock.bind(("", self.udp_port))
+            self.udp_port = udp_sock.getsockname()[1]
+            self._sockets.append(udp_sock)
+            self._start_thread(self._discovery_loop, udp_sock, name="mock-gateway-discovery")
+
+        if self.push_interval > 0:
+            self._start_thread(self._push_loop, name="mock-gateway-push")
+        return self
+
+    def stop(self, timeout: float = 2.0):
+        """停止服务并等待后台线程退出，返回后端口可以立即重新绑定"""
+        self._stop.set()
+        for sock in self._sockets:
+            # 只 close 不会唤醒阻塞在 accept / recvfrom 中的线程，先 shutdown
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        self._sockets = []
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+        self._threads = []
+
+    def _start_thread(self, target, *args, name: str):
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    @property
+    def info(self) -> dict:
+        """与网关发现结果格式一致，可直接传给 gateway.connect_to_gateway"""
+        return {"id": self.gateway_id, "ip": self.host, "port": str(self.tcp_port), "model": "mock"}
+
+    def handle(self, client: _ClientConnection, request: dict):
+        with self._lock:
+            self.stats["requests"] += 1
+            if self._rng.random() < self.drop_rate:
+                self.stats["dropped"] += 1
+                return
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+
+        method = request.get("method")
+        request_id = request.get("id")
+        if method == "gateway_get.topology":
+            client.send({"id": request_id, "method": "gateway_post.topology", "nodes": self.topology.nodes}, delay)
+        elif method == "gateway_get.room":
+            client.send({"id": request_id, "rooms": self.topology.rooms}, delay)
+        elif method == "gateway_set.prop":
+            changes = self._apply_set(request)
+            client.send({"id": request_id, "result": "ok"}, delay)
+            if changes:
+                self._broadcast(changes, delay)
+        else:
+            client.send({"id": request_id, "error": {"code": -1, "message": f"unsupported method: {method}"}}, delay)
+
+    def disconnect(self, client: _ClientConnection):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def _apply_set(self, request: dict) -> Dict[int, dict]:
+        changes = {}
+        for node in request.get("nodes", []):
+            for node_id in self.topology.expand(node.get("id")):
+                changes[node_id] = dict(node.get("set", {}))
+        with self._lock:
+            self.stats["set_nodes"] += len(changes)
+            for node_id, props in changes.items():
+                self._states.setdefault(node_id, {}).update(props)
+        return changes
+
+    def _broadcast(self, changes: Dict[int, dict], delay: float = 0.0):
+        message = {
+            "method": "gateway_post.prop",
+            "nodes": [{"id": node_id, "params": props} for node_id, props in changes.items()]
+        }
+        with self._lock:
+            clients = list(self._clients)
+            self.stats["pushes"] += 1
+        for client in clients:
+            client.send(message, delay)
+
+    def _accept_loop(self, tcp_sock: socket.socket):
+        while not self._stop.is_set():
+            try:
+                sock, _ = tcp_sock.accept()
+            except OSError:
+                return
+            client = _ClientConnection(self, sock)
+            with self._lock:
+                self._clients.append(client)
+            client.start()
+
+    def _discovery_loop(self, udp_sock: socket.socket):
+        response = f"id:{self.gateway_id}\nip:{self.host}\nmodel:mock\n".encode()
+        while not self._stop.is_set():
+            try:
+                data, addr = udp_sock.recvfrom(1024)
+            except OSError:
+                return
+            if data.strip() == DISCOVERY_MESSAGE:
+                udp_sock.sendto(response, addr)
+
+    def _push_loop(self):
+        device_ids = self.topology.device_ids()
+        while device_ids and not self._stop.wait(self.push_interval):
+            node_id = self._rng.choice(device_ids)
+            self._broadcast({node_id: {"p": self._rng.random() < 0.5}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟 Yeelight Pro 网关")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP 监听地址，也是发现响应中的 ip")
+    parser.add_argument("--tcp-port", type=int, default=65443)
+    parser.add_argument("--udp-port", type=int, default=1982)
+    parser.add_argument("--devices", type=int, default=50, help="合成拓扑中的设备数")
+    parser.add_argument("--rooms", type=int, default=6)
+    parser.add_argument("--scenes", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="不响应请求的概率")
+    parser.add_argument("--push-interval", type=float, default=0.0, help="随机推送状态变化的间隔（秒），0 为不推送")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    topology = SyntheticTopology(devices=args.devices, rooms=args.rooms, scenes=args.scenes, seed=args.seed)
+    gateway = MockGateway(
+        host=args.host, tcp_port=args.tcp_port, udp_port=args.udp_port, topology=topology,
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, drop_rate=args.drop_rate,
+        push_interval=args.push_interval, seed=args.seed
+    ).start()
+    print(f"模拟网关已启动: {args.host}:{gateway.tcp_port}，节点 {len(topology.nodes)} 个，房间 {len(topology.rooms)} 个")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"统计: {gateway.stats}")
+    except KeyboardInterrupt:
+        gateway.stop()
+
+
+if __name__ == '__main__':
+    main()
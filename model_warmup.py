@@ -0,0 +1,112 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+class ComponentNotReady(Exception):
+    """依赖的模型加载失败或等待超时"""
+
+
+class _Component:
+    def __init__(self, name: str, loader: Callable):
+        self.name = name
+        self.loader = loader
+        self.status = "pending"  # pending -> loading -> ready / failed，failed 后退避重试回到 loading
+        self.value = None
+        self.error = None
+        self.attempts = 0
+        self.started_at = None
+        self.elapsed = None
+
+
+class ModelWarmup:
+    """
+    后台并行加载各个模型
+    每个组件在独立线程中执行 loader，Web 服务无需等待即可启动；
+    请求通过 wait() 等待自己依赖的组件就绪，/ready 通过 readiness() 查看各组件状态；
+    加载失败的组件按 retry_delay 起指数退避（不超过 max_retry_delay）重试，直到加载成功
+    """
+
+    def __init__(self, retry_delay: float = 1.0, max_retry_delay: float = 60.0,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.sleep = sleep
+        self._components: Dict[str, _Component] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable):
+        """loader 的返回值会作为 wait() 的结果"""
+        with self._lock:
+            self._components[name] = _Component(name, loader)
+        return self
+
+    def start(self):
+        for component in self._components.values():
+            threading.Thread(target=self._load, args=(component,), name=f"warmup-{component.name}", daemon=True).start()
+        return self
+
+    def ready(self, name: Optional[str] = None) -> bool:
+        components = [self._components[name]] if name else self._components.values()
+        return all(component.status == "ready" for component in components)
+
+    def wait(self, name: str, timeout: Optional[float] = None, sleep: Callable[[float], None] = time.sleep):
+        """
+        等待组件就绪并返回 loader 的结果；组件最近一次加载失败时立即抛出，等待重试成功后再请求
+        sleep 用于轮询等待，传入 socketio.sleep 可避免阻塞事件循环
+        """
+        component = self._components[name]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = component.status
+            if status == "ready":
+                return component.value
+            if status == "failed":
+                raise ComponentNotReady(f"{name} 加载失败: {component.error}")
+            if deadline is not None and time.monotonic() > deadline:
+                raise ComponentNotReady(f"{name} 尚未加载完成")
+            sleep(0.05)
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        result = {}
+        for name, component in self._components.items():
+            elapsed = component.elapsed
+            if elapsed is None and component.started_at is not None:
+                elapsed = now - component.started_at
+            result[name] = {
+                'status': component.status,
+                'elapsed': round(elapsed, 2) if elapsed is not None else None,
+                'error': component.error,
+                'attempts': component.attempts
+            }
+        return result
+
+    def readiness(self) -> dict:
+        """/ready 的响应内容，全部组件就绪时 status 为 ready，否则为 warming_up"""
+        return {
+            'status': 'ready' if self.ready() else 'warming_up',
+            'components': self.status()
+        }
+
+    def _load(self, component: _Component):
+        component.started_at = time.monotonic()
+        delay = self.retry_delay
+        while True:
+            component.status = "loading"
+            component.elapsed = None
+            component.attempts += 1
+            try:
+                component.value = component.loader()
+            except Exception as e:
+                component.error = str(e)
+                component.elapsed = time.monotonic() - component.started_at
+                component.status = "failed"
+                print(f"[ERROR] 加载 {component.name} 失败（第 {component.attempts} 次），{delay:g} 秒后重试: {str(e)}")
+                self.sleep(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            component.error = None
+            component.elapsed = time.monotonic() - component.started_at
+            component.status = "ready"
+            return
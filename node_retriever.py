@@ -0,0 +1,79 @@
+from typing import Callable, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from match_name import NameMatcher
+
+
+def char_ngrams(text: str, sizes: Sequence[int] = (1, 2)) -> List[str]:
+    """字符 n-gram，中文名称不需要分词"""
+    grams = []
+    for n in sizes:
+        grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+class NodeRetriever:
+    """
+    按用户指令检索相关节点
+    节点名称（及类型描述）以字符 n-gram 的 TF-IDF 向量存放在 NumPy 矩阵中，
+    查询时计算余弦相似度取前 k 个，名称完整出现在指令中的节点总会被选中
+    """
+
+    def __init__(self, nodes: Iterable, sizes: Sequence[int] = (1, 2), type_weight: float = 0.3,
+                 pinned: Optional[Callable] = None):
+        self.nodes = tuple(nodes)
+        self.sizes = sizes
+        self._names = [NameMatcher.normalize_name(node.name or "") for node in self.nodes]
+        # 始终保留的节点（例如房间，用于推断 location）
+        self._pinned = [i for i, node in enumerate(self.nodes) if pinned and pinned(node)]
+
+        documents = []
+        for node, name in zip(self.nodes, self._names):
+            weights = {}
+            for gram in char_ngrams(name, sizes):
+                weights[gram] = weights.get(gram, 0.0) + 1.0
+            for gram in char_ngrams(node.type_description or "", sizes):
+                weights[gram] = weights.get(gram, 0.0) + type_weight
+            documents.append(weights)
+
+        self._vocab = {}
+        for weights in documents:
+            for gram in weights:
+                self._vocab.setdefault(gram, len(self._vocab))
+
+        document_frequency = np.zeros(len(self._vocab), dtype=np.float32)
+        matrix = np.zeros((len(self.nodes), len(self._vocab)), dtype=np.float32)
+        for row, weights in enumerate(documents):
+            for gram, weight in weights.items():
+                column = self._vocab[gram]
+                matrix[row, column] = weight
+                document_frequency[column] += 1
+
+        self._idf = np.log((1 + len(self.nodes)) / (1 + document_frequency)) + 1
+        matrix *= self._idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self._matrix = matrix / norms
+
+    def top_k(self, utterance: str, k: int) -> List:
+        """返回与指令最相关的 k 个节点（另加固定保留的节点），保持原有顺序"""
+        if len(self.nodes) <= k:
+            return list(self.nodes)
+
+        text = NameMatcher.normalize_name(utterance or "")
+        query = np.zeros(len(self._vocab), dtype=np.float32)
+        for gram in char_ngrams(text, self.sizes):
+            column = self._vocab.get(gram)
+            if column is not None:
+                query[column] += 1
+        query *= self._idf
+        norm = np.linalg.norm(query)
+        scores = self._matrix @ (query / norm) if norm else np.zeros(len(self.nodes), dtype=np.float32)
+
+        # 名称完整出现在指令中时优先
+        scores += np.array([1.0 if name and name in text else 0.0 for name in self._names], dtype=np.float32)
+
+        selected = set(np.argsort(-scores, kind='stable')[:k].tolist())
+        selected.update(self._pinned)
+        return [self.nodes[i] for i in sorted(selected)]
@@ -59,17 +59,21 @@ def initialize_llm():
         
         
         # 传递模型名称字符串和 IP 地址
-        return Ollama(
-            model=selected_model,
-            base_url=os.getenv('OLLAMA_IP_PORT'),
-            temperature=0.7,  # 增加随机性
-            cache=False,  # 禁用LangChain缓存
-            headers={
-                'Cache-Control': 'no-store',  # 禁用HTTP缓存
-                'Pragma': 'no-cache'
-            }
-        )
+        return create_llm(selected_model)
     except Exception as e:
         log_message(f"获取模型列表失败: {str(e)}", level="ERROR")
         return None
-    
\ No newline at end of file
+
+def create_llm(model_name: str, temperature: float = 0.7) -> Ollama:
+    """按模型名称创建 Ollama LLM，不检查模型是否存在"""
+    return Ollama(
+        model=model_name,
+        base_url=os.getenv('OLLAMA_IP_PORT'),
+        temperature=temperature,  # 增加随机性
+        keep_alive=os.getenv('OLLAMA_KEEP_ALIVE', '30m'),  # 模型常驻内存，复用相同前缀的 KV 缓存
+        cache=False,  # 禁用LangChain缓存
+        headers={
+            'Cache-Control': 'no-store',  # 禁用HTTP缓存
+            'Pragma': 'no-cache'
+        }
+    )
@@ -34,6 +34,6 @@ template = r"""你是一个智能家居控制助手，负责根据用户对话
 输出： {{ "domain": "light", "name": "客厅灯", "action": "turn_on", "location": "客厅" }}
 
 6. 请遵循上述JSON格式输出，不得附加其他文字或解释说明。
-用户输入指令如下：{user_input}
 用户家庭中的具体智能家居设备元数据列表如下：{node_info}
+用户输入指令如下：{user_input}
 """
@@ -0,0 +1,121 @@
+"""
+SQLite 连接管理：同一数据库文件在进程内共享一个写连接和一个小的读连接池
+使用 WAL 日志模式，读操作不会被拓扑刷新等写事务阻塞；表结构按组件分别做版本迁移
+"""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Sequence, Union
+
+POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', '4'))  # 读连接数
+BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_KB', '8192'))  # 每个连接的页缓存
+MMAP_SIZE_MB = int(os.getenv('SQLITE_MMAP_MB', '64'))
+
+# 迁移可以是 SQL 脚本，也可以是接收连接的函数（如需要在 Python 中回填数据）
+Migration = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+class SQLiteStore:
+    """
+    一个数据库文件的连接：写操作串行使用同一个连接并显式开启 IMMEDIATE 事务，
+    读操作从连接池借用连接，WAL 模式下读到的是最近一次提交的数据
+    """
+
+    def __init__(self, db_name: str, pool_size: int = POOL_SIZE):
+        self.db_name = db_name
+        self._write_lock = threading.RLock()
+        self._writer = self._connect()
+        self._writer.execute('PRAGMA journal_mode=WAL')  # 持久化在数据库文件中，只需设置一次
+        self._readers = queue.Queue()
+        for _ in range(max(pool_size, 1)):
+            self._readers.put(self._connect())
+        self._initialize_migrations()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None：由 write() 显式管理事务，读操作不会持有隐式事务
+        conn = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA synchronous=NORMAL')  # WAL 下只在检查点时 fsync，断电最多丢失最近的事务
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={MMAP_SIZE_MB * 1024 * 1024}')
+        return conn
+
+    @contextmanager
+    def read(self):
+        """借用一个读连接"""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def write(self):
+        """在一个写事务中执行，正常退出时提交，出错时回滚；可以嵌套（内层并入外层事务）"""
+        with self._write_lock:
+            if self._writer.in_transaction:
+                yield self._writer
+                return
+            self._writer.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.rollback()
+                raise
+            self._writer.commit()
+
+    def _initialize_migrations(self):
+        with self.write() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    component TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            ''')
+
+    def migrate(self, component: str, migrations: Sequence[Migration]) -> int:
+        """
+        按顺序执行组件尚未执行过的迁移，返回当前版本
+        迁移只能追加，不能修改已发布的迁移；同一数据库中的不同组件各自记录版本
+        """
+        with self.write() as conn:
+            row = conn.execute('SELECT version FROM schema_migrations WHERE component = ?', (component,)).fetchone()
+            version = row[0] if row else 0
+            for migration in migrations[version:]:
+                if callable(migration):
+                    migration(conn)
+                else:
+                    # executescript 会先提交当前事务，逐条执行以保持在同一事务中
+                    for statement in migration.split(';'):
+                        if statement.strip():
+                            conn.execute(statement)
+            if len(migrations) > version:
+                version = len(migrations)
+                conn.execute('INSERT OR REPLACE INTO schema_migrations (component, version) VALUES (?, ?)',
+                             (component, version))
+        return version
+
+    def close(self):
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+
+_stores: Dict[str, SQLiteStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(db_name: str) -> SQLiteStore:
+    """返回数据库文件对应的共享连接，同一文件的各组件共用写连接，避免写事务互相等待"""
+    key = os.path.abspath(db_name)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SQLiteStore(db_name)
+        return store
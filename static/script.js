@@ -9,6 +9,7 @@ document.getElementById('startButton').onclick = async () => {
 
     const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
     mediaRecorder = new MediaRecorder(stream);
+    startStreaming(stream);  // 边录音边将 PCM 推送到服务端识别
 
     mediaRecorder.ondataavailable = event => {
         audioChunks.push(event.data);
@@ -30,24 +31,7 @@ document.getElementById('startButton').onclick = async () => {
         resultDiv.appendChild(document.createElement('br')); // Append a line break
         resultDiv.appendChild(audioPlayer); // Append the audio player to the body
 
-        const formData = new FormData();
-        formData.append('audio', audioBlob, 'recording.webm');
-        const startTime = Date.now(); // Record the start time
-        const timerInterval = setInterval(() => {
-            const elapsedTime = Math.floor((Date.now() - startTime) / 1000); // Calculate elapsed time in seconds
-            document.getElementById('transcription').innerText = `Processing with the Whisper local model... (${elapsedTime} seconds)`;
-        }, 1000); // Update every second
-
-        const response = await fetch('/transcribe', {
-            method: 'POST',
-            body: formData
-        });
-        clearInterval(timerInterval); // Clear the timer
-        const data = await response.json();
-        transcriptionText = data.text; // Save transcription text
-        document.getElementById('transcription').innerText = "";
-        document.getElementById('transcription').innerText = transcriptionText;
-        document.getElementById('submitDiv').classList.remove('hidden'); // Show submit button
+        // 识别结果由 Socket.IO 流式返回（见 transcription_* 事件）
         audioChunks = [];  // Reset for the next recording
         document.getElementById('submitDiv').classList.remove('hidden'); // Show submit butt
         document.getElementById('startButton').classList.remove('hidden'); // Show start button
@@ -62,60 +46,58 @@ document.getElementById('startButton').onclick = async () => {
 };
 
 
-document.getElementById('submitButton').onclick = async () => {
+let submitCounter = 0;
+
+document.getElementById('submitButton').onclick = () => {
     // 添加 loading 效果
     const submitButton = document.getElementById('submitButton');
     submitButton.disabled = true; // 禁用按钮以防止重复提交
     submitButton.innerText = '提交中...'; // 更新按钮文本
 
-    const response = await fetch('/submit', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json'
-        },
-        body: JSON.stringify({ user_input: transcriptionText }) // Send transcription text
+    // 通过 Socket.IO 提交，各阶段结果由 submit_stage 事件推送
+    socket.emit('submit_utterance', {
+        request_id: `submit-${Date.now()}-${submitCounter++}`,
+        user_input: transcriptionText // Send transcription text
     });
+};
 
+function resetSubmitButton() {
     // 恢复按钮状态
+    const submitButton = document.getElementById('submitButton');
     submitButton.disabled = false; // 启用按钮
     submitButton.innerText = '提交'; // 恢复按钮文本
+}
 
-    const data = await response.json();
-    
-    if (data.status === 'success') {
-        const audioPath = data.audio_path; // 获取音频路径
-        console.log('Audio Path:', audioPath); // 调试信息，检查音频路径
-        const audioElement = document.createElement('audio'); // 创建音频元素
-        const logList = document.getElementById('logList');
-        if (logList) {
-            audioElement.src = audioPath; // 确保路径正确
-            audioElement.controls = true; // 启用音频控件
-            audioElement.autoplay = false; // 自动播放音频
-            logList.appendChild(audioElement); // 将音频播放器添加到 logList 中
-            logList.appendChild(document.createElement('br')); // Append a line break
-        } else {
-            console.error('Error: logList element not found');
-        }
+function showSubmitResult(audioPath, resultMessage) {
+    console.log('Audio Path:', audioPath); // 调试信息，检查音频路径
+    const audioElement = document.createElement('audio'); // 创建音频元素
+    const logList = document.getElementById('logList');
+    if (logList) {
+        audioElement.src = audioPath; // 确保路径正确
+        audioElement.controls = true; // 启用音频控件
+        audioElement.autoplay = false; // 自动播放音频
+        logList.appendChild(audioElement); // 将音频播放器添加到 logList 中
+        logList.appendChild(document.createElement('br')); // Append a line break
+    } else {
+        console.error('Error: logList element not found');
+    }
 
-        const resultVedioDiv = document.getElementById("resultVedioDiv");
-        if (resultVedioDiv) {
-            const resultMessage = data.result_message; 
-            resultVedioDiv.innerHTML = ''; // Clear existing audio components
-            const audioElementClone = audioElement.cloneNode(true); // 克隆音频元素
-            resultVedioDiv.appendChild(audioElementClone); // Append the audio player to the body
-            resultVedioDiv.appendChild(document.createElement('br')); // Append a line break
-            resultVedioDiv.append(resultMessage); // Append a line break
-        } else {
-            console.error('Error: resultVedioDiv element not found');
-        }
+    const resultVedioDiv = document.getElementById("resultVedioDiv");
+    if (resultVedioDiv) {
+        resultVedioDiv.innerHTML = ''; // Clear existing audio components
+        const audioElementClone = audioElement.cloneNode(true); // 克隆音频元素
+        resultVedioDiv.appendChild(audioElementClone); // Append the audio player to the body
+        resultVedioDiv.appendChild(document.createElement('br')); // Append a line break
+        resultVedioDiv.append(resultMessage); // Append a line break
     } else {
-        console.error('Error:', data.message);
+        console.error('Error: resultVedioDiv element not found');
     }
-}; 
+}
 
 
 
 document.getElementById('stopButton').onclick = () => {
+    stopStreaming();
     if (mediaRecorder) {
         mediaRecorder.stop();  // Stop recording
         mediaRecorder = null;  // Reset mediaRecorder
@@ -137,6 +119,101 @@ socket.on('log_update', function(data) {
     logList.scrollTop = logList.scrollHeight;  // Scroll to the bottom
 });
 
+// 指令处理的各阶段结果
+let pendingResultMessage = '';
+socket.on('submit_stage', function(data) {
+    switch (data.stage) {
+        case 'intent_parsed':
+            console.log('Intent:', data.data);
+            break;
+        case 'result':
+            // 控制结果先于语音合成返回，立即显示
+            pendingResultMessage = data.data;
+            document.getElementById('resultVedioDiv').innerText = pendingResultMessage;
+            break;
+        case 'audio_ready':
+            showSubmitResult(data.data, pendingResultMessage);
+            break;
+        case 'done':
+            resetSubmitButton();
+            break;
+        case 'error':
+            resetSubmitButton();
+            console.error('Error:', data.data);
+            break;
+    }
+});
+
+// 流式语音识别：采集 PCM，降采样到 16kHz 16 位后通过 Socket.IO 分块发送
+const STREAM_SAMPLE_RATE = 16000;
+let audioContext = null;
+let audioSource = null;
+let audioProcessor = null;
+let streamedText = '';
+
+function downsampleToInt16(buffer, inputRate) {
+    const ratio = inputRate / STREAM_SAMPLE_RATE;
+    const length = Math.floor(buffer.length / ratio);
+    const result = new Int16Array(length);
+    for (let i = 0; i < length; i++) {
+        const sample = Math.max(-1, Math.min(1, buffer[Math.floor(i * ratio)]));
+        result[i] = sample < 0 ? sample * 0x8000 : sample * 0x7FFF;
+    }
+    return result;
+}
+
+function startStreaming(stream) {
+    streamedText = '';
+    audioContext = new AudioContext();
+    audioSource = audioContext.createMediaStreamSource(stream);
+    audioProcessor = audioContext.createScriptProcessor(4096, 1, 1);
+    audioProcessor.onaudioprocess = event => {
+        const pcm = downsampleToInt16(event.inputBuffer.getChannelData(0), audioContext.sampleRate);
+        socket.emit('audio_chunk', pcm.buffer);
+    };
+    audioSource.connect(audioProcessor);
+    audioProcessor.connect(audioContext.destination);
+    socket.emit('audio_start');
+}
+
+function stopStreaming() {
+    if (!audioContext) {
+        return;
+    }
+    audioProcessor.disconnect();
+    audioSource.disconnect();
+    audioContext.close();
+    audioContext = null;
+    socket.emit('audio_end');
+}
+
+socket.on('transcription_partial', function(data) {
+    document.getElementById('transcription').innerText = streamedText + data.text;
+});
+
+socket.on('transcription_final', function(data) {
+    streamedText += data.text;
+    document.getElementById('transcription').innerText = streamedText;
+});
+
+socket.on('transcription_error', function(data) {
+    console.error('Transcription error:', data.message);
+});
+
+socket.on('transcription_done', function() {
+    transcriptionText = streamedText; // Save transcription text
+    document.getElementById('transcription').innerText = transcriptionText;
+    document.getElementById('submitDiv').classList.remove('hidden'); // Show submit button
+});
+
+// 设备实时状态（按节点 id 存储），由服务端 device_state 事件增量更新
+const deviceStates = {};
+socket.on('device_state', function(data) {
+    Object.entries(data.nodes).forEach(([nodeId, props]) => {
+        deviceStates[nodeId] = Object.assign(deviceStates[nodeId] || {}, props);
+    });
+});
+
 document.addEventListener('DOMContentLoaded', function() {
     fetch('/scan_and_connect')
         .then(response => response.json())
@@ -0,0 +1,172 @@
+import threading
+from collections import deque
+
+import numpy as np
+from typing import Callable, List, Tuple
+
+from audio_decoder import SAMPLE_RATE
+
+
+class StreamingTranscriber:
+    """
+    流式语音识别会话
+    累积客户端发送的 PCM 数据，用基于能量的语音活动检测（VAD）切分语句，
+    说话过程中按滑动窗口输出中间结果，检测到语句结束后输出最终结果
+    """
+
+    FRAME_SECONDS = 0.03  # VAD 帧长
+
+    def __init__(self, transcribe: Callable[[np.ndarray], str], sample_rate: int = SAMPLE_RATE,
+                 window_seconds: float = 10.0, step_seconds: float = 1.0,
+                 silence_seconds: float = 0.8, energy_threshold: float = 0.01,
+                 max_utterance_seconds: float = 30.0):
+        self.transcribe = transcribe
+        self.sample_rate = sample_rate
+        self.window_samples = int(window_seconds * sample_rate)
+        self.step_samples = int(step_seconds * sample_rate)
+        self.silence_samples = int(silence_seconds * sample_rate)
+        self.max_utterance_samples = int(max_utterance_seconds * sample_rate)
+        self.energy_threshold = energy_threshold
+        self.frame_samples = int(self.FRAME_SECONDS * sample_rate)
+
+        self._utterance: List[np.ndarray] = []
+        self._utterance_samples = 0
+        self._pending = np.zeros(0, dtype=np.float32)  # 不足一帧的尾部数据
+        self._in_speech = False
+        self._silence_run = 0
+        self._since_partial = 0
+        self._last_partial = ""
+
+    def feed(self, pcm: np.ndarray) -> List[Tuple[str, str]]:
+        """
+        输入一段 float32 PCM，返回产生的事件列表 [("partial" | "final", 文本)]
+        """
+        events = []
+        samples = np.concatenate([self._pending, pcm.astype(np.float32, copy=False)])
+        usable = len(samples) - len(samples) % self.frame_samples
+        self._pending = samples[usable:]
+
+        for start in range(0, usable, self.frame_samples):
+            frame = samples[start:start + self.frame_samples]
+            voiced = float(np.sqrt(np.mean(frame * frame))) >= self.energy_threshold
+
+            if not self._in_speech:
+                if not voiced:
+                    continue
+                self._in_speech = True
+                self._silence_run = 0
+
+            self._utterance.append(frame)
+            self._utterance_samples += len(frame)
+            self._since_partial += len(frame)
+            self._silence_run = 0 if voiced else self._silence_run + len(frame)
+
+            if self._silence_run >= self.silence_samples or self._utterance_samples >= self.max_utterance_samples:
+                events.extend(self._finalize())
+            elif self._since_partial >= self.step_samples:
+                events.extend(self._partial())
+        return events
+
+    def finish(self) -> List[Tuple[str, str]]:
+        """客户端停止录音时调用，输出剩余语音的最终结果"""
+        if self._in_speech and len(self._pending):
+            self._utterance.append(self._pending)
+            self._utterance_samples += len(self._pending)
+        self._pending = np.zeros(0, dtype=np.float32)
+        return self._finalize()
+
+    def _partial(self) -> List[Tuple[str, str]]:
+        self._since_partial = 0
+        audio = np.concatenate(self._utterance)[-self.window_samples:]
+        text = self.transcribe(audio).strip()
+        if not text or text == self._last_partial:
+            return []
+        self._last_partial = text
+        return [("partial", text)]
+
+    def _finalize(self) -> List[Tuple[str, str]]:
+        if not self._utterance:
+            self._reset()
+            return []
+        # 去掉尾部静音后识别整句
+        audio = np.concatenate(self._utterance)
+        if self._silence_run:
+            audio = audio[:len(audio) - self._silence_run]
+        self._reset()
+        text = self.transcribe(audio).strip() if len(audio) else ""
+        return [("final", text)] if text else []
+
+    def _reset(self):
+        self._utterance = []
+        self._utterance_samples = 0
+        self._in_speech = False
+        self._silence_run = 0
+        self._since_partial = 0
+        self._last_partial = ""
+
+
+class StreamingSession:
+    """
+    一个客户端连接的流式识别会话
+    音频块和结束标记按到达顺序放入队列，同一时刻最多只有一个后台任务依次处理；
+    Socket.IO 的事件处理是并发执行的，转录等待期间到达的音频块不会与正在处理的音频块交错，
+    结束标记也会在之前的音频块都处理完后才执行
+    """
+
+    _END = object()
+
+    def __init__(self, transcriber: StreamingTranscriber, start_task: Callable,
+                 on_events: Callable[[List[Tuple[str, str]]], None],
+                 on_error: Callable[[Exception], None], on_done: Callable[[], None]):
+        self.transcriber = transcriber
+        self._start_task = start_task  # 如 socketio.start_background_task
+        self._on_events = on_events
+        self._on_error = on_error
+        self._on_done = on_done
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._draining = False
+        self._closed = False
+
+    def feed(self, pcm: np.ndarray):
+        self._put(pcm)
+
+    def end(self):
+        """客户端停止录音：处理完已收到的音频后输出最终结果并结束会话"""
+        self._put(self._END)
+
+    def close(self):
+        """连接断开：丢弃尚未处理的音频，不再产生事件"""
+        with self._lock:
+            self._closed = True
+            self._queue.clear()
+
+    def _put(self, item):
+        with self._lock:
+            if self._closed:
+                return
+            self._queue.append(item)
+            if self._draining:
+                return
+            self._draining = True
+        self._start_task(self._drain)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._draining = False
+                    return
+                item = self._queue.popleft()
+                if item is self._END:
+                    self._closed = True  # 结束标记之后到达的音频块直接丢弃
+                    self._queue.clear()
+
+            try:
+                events = self.transcriber.finish() if item is self._END else self.transcriber.feed(item)
+                if events:
+                    self._on_events(events)
+            except Exception as e:
+                self._on_error(e)
+            if item is self._END:
+                self._on_done()
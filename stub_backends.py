@@ -0,0 +1,81 @@
+"""
+离线运行用的桩后端：LLM / Whisper / Piper
+不依赖模型文件和 Ollama 服务，按可配置的延迟返回预设结果，供压测和评测脚本使用
+"""
+import json
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+# 用户指令所在行的前缀（prompts.template 和 prompts_test.template 相同）
+USER_INPUT_MARKER = "用户输入指令如下："
+
+
+class StubLLM(LLM):
+    """
+    按用户指令查表返回命令的桩 LLM，流式输出时模拟首 token 延迟和逐 token 生成
+    think 非空时先输出 <think>…</think>，trailing 为命令之后多余的输出
+    """
+
+    responses: Dict[str, dict] = {}
+    default_command: dict = {"domain": "light", "name": "未知设备", "action": "turn_on", "location": "all"}
+    prefill_delay: float = 0.05
+    token_delay: float = 0.01
+    token_size: int = 4
+    think: str = ""
+    trailing: str = "\n以上为解析结果。"
+    base_url: str = "stub"
+    model: str = "stub"
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        return "".join(self._tokens(prompt))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        time.sleep(self.prefill_delay)
+        for token in self._tokens(prompt):
+            time.sleep(self.token_delay)
+            yield GenerationChunk(text=token)
+
+    def _tokens(self, prompt: str) -> List[str]:
+        # prompts_test.template 中指令之后还有设备列表，只取指令所在行
+        user_input = prompt.rsplit(USER_INPUT_MARKER, 1)[-1].strip().split("\n", 1)[0].strip()
+        command = self.responses.get(user_input, self.default_command)
+        text = json.dumps(command, ensure_ascii=False) + self.trailing
+        if self.think:
+            text = f"<think>{self.think}</think>\n" + text
+        return [text[i:i + self.token_size] for i in range(0, len(text), self.token_size)]
+
+
+class StubWhisper:
+    """桩 Whisper 模型，接口与 whisper 模型的 transcribe 一致"""
+
+    def __init__(self, text: str = "打開客廳燈組", delay: float = 0.2):
+        self.text = text
+        self.delay = delay
+
+    def transcribe(self, audio, language: str = "zh", **kwargs) -> dict:
+        time.sleep(self.delay)
+        return {"text": self.text}
+
+
+class StubVoice:
+    """桩 Piper 语音，按文本长度写入静音 WAV"""
+
+    def __init__(self, delay: float = 0.05, sample_rate: int = 22050, seconds_per_char: float = 0.05):
+        self.delay = delay
+        self.sample_rate = sample_rate
+        self.seconds_per_char = seconds_per_char
+
+    def synthesize(self, text: str, wav_file):
+        time.sleep(self.delay)
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(self.sample_rate)
+        wav_file.writeframes(b"\x00\x00" * int(self.sample_rate * self.seconds_per_char * len(text)))
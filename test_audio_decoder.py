@@ -0,0 +1,65 @@
+import io
+import os
+import shutil
+import unittest
+import wave
+from unittest import mock
+
+try:
+    import numpy as np
+    from audio_decoder import decode_audio
+except ImportError:  # 未安装 numpy
+    np = None
+
+HAS_FFMPEG = shutil.which("ffmpeg") is not None
+
+
+def make_wav(samples, rate=16000) -> bytes:
+    """将 [-1, 1] 范围的 float 数组编码为 16 位单声道 WAV"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.asarray(samples) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def tone(seconds, rate=16000, frequency=440.0):
+    t = np.arange(round(seconds * rate)) / rate
+    return 0.5 * np.sin(2 * np.pi * frequency * t)
+
+
+@unittest.skipUnless(np, "需要 numpy")
+class DecodeAudioTest(unittest.TestCase):
+    def test_empty_input_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_audio(b"")
+
+    def test_missing_ffmpeg_raises_runtime_error(self):
+        with mock.patch.dict(os.environ, {"PATH": ""}):
+            with self.assertRaises(RuntimeError):
+                decode_audio(b"RIFF")
+
+    @unittest.skipUnless(HAS_FFMPEG, "需要 ffmpeg")
+    def test_wav_round_trip(self):
+        samples = tone(0.5)
+        audio = decode_audio(make_wav(samples))
+        self.assertEqual(audio.dtype, np.float32)
+        self.assertEqual(len(audio), len(samples))
+        np.testing.assert_allclose(audio, samples, atol=1e-3)
+
+    @unittest.skipUnless(HAS_FFMPEG, "需要 ffmpeg")
+    def test_resamples_to_target_rate(self):
+        audio = decode_audio(make_wav(tone(0.5, rate=8000), rate=8000))
+        self.assertAlmostEqual(len(audio), 8000, delta=160)
+
+    @unittest.skipUnless(HAS_FFMPEG, "需要 ffmpeg")
+    def test_garbage_input_is_rejected(self):
+        with self.assertRaises(ValueError) as context:
+            decode_audio(b"not an audio file" * 64)
+        self.assertIn("音频解码失败", str(context.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from command_coalescer import (DEFAULT_GROUP_NT, CommandCoalescer, chunk_command, collapse_to_groups,
+                               expand_groups)
+
+ON = {"p": True}
+OFF = {"p": False}
+
+
+def node(node_id, setting, nt=2):
+    return {"id": node_id, "nt": nt, "set": setting}
+
+
+class CollapseToGroupsTest(unittest.TestCase):
+    def test_whole_group_is_collapsed(self):
+        nodes = [node(1, ON), node(2, ON), node(3, ON)]
+        result = collapse_to_groups(nodes, {100: {1, 2}}, {100: 4})
+        self.assertEqual(result, [{"id": 100, "nt": 4, "set": ON}, node(3, ON)])
+
+    def test_partial_group_or_different_settings_are_kept(self):
+        nodes = [node(1, ON), node(2, OFF)]
+        self.assertEqual(collapse_to_groups(nodes, {100: {1, 2}}, {100: 4}), nodes)
+        self.assertEqual(collapse_to_groups([node(1, ON)], {100: {1, 2}}, {100: 4}), [node(1, ON)])
+
+    def test_larger_group_wins(self):
+        nodes = [node(i, ON) for i in (1, 2, 3, 4)]
+        result = collapse_to_groups(nodes, {100: {1, 2}, 200: {1, 2, 3, 4}}, {100: 4, 200: 1})
+        self.assertEqual(result, [{"id": 200, "nt": 1, "set": ON}])
+
+    def test_unknown_group_nt_uses_default(self):
+        result = collapse_to_groups([node(1, ON), node(2, ON)], {100: {1, 2}}, {})
+        self.assertEqual(result, [{"id": 100, "nt": DEFAULT_GROUP_NT, "set": ON}])
+
+    def test_expand_groups(self):
+        expanded = expand_groups([{"id": 100, "nt": 4, "set": ON}], {100: {1, 2}})
+        self.assertEqual(expanded[0]["id"], 100)
+        self.assertEqual(sorted(item["id"] for item in expanded[1:]), [1, 2])
+        self.assertTrue(all(item["set"] == ON for item in expanded))
+
+
+class ChunkCommandTest(unittest.TestCase):
+    def test_small_command_is_unchanged(self):
+        command = {"id": 1, "method": "gateway_set.prop", "nodes": [node(1, ON)], "scenes": []}
+        self.assertEqual(chunk_command(command, 2), [command])
+
+    def test_large_command_is_split(self):
+        command = {"id": 1, "method": "gateway_set.prop",
+                   "nodes": [node(i, ON) for i in range(5)], "scenes": [{"id": 1001}]}
+        frames = chunk_command(command, 2)
+        self.assertEqual([len(frame["nodes"]) + len(frame["scenes"]) for frame in frames], [2, 2, 2])
+        self.assertEqual(frames[-1]["scenes"], [{"id": 1001}])
+        self.assertTrue(all(frame["method"] == "gateway_set.prop" and "id" not in frame for frame in frames))
+
+
+class CommandCoalescerTest(unittest.TestCase):
+    gateway = SimpleNamespace(key="gw")
+
+    def test_sends_immediately_when_idle(self):
+        sleeps = []
+        coalescer = CommandCoalescer(window=0.05, sleep=sleeps.append)
+        sent = []
+        response = coalescer.submit(self.gateway, {"method": "gateway_set.prop", "nodes": [node(1, ON)]},
+                                    lambda gateway, frame: sent.append(frame) or {"result": "ok"})
+        self.assertEqual(response, {"result": "ok"})
+        self.assertEqual(sleeps, [])
+        self.assertEqual(len(sent), 1)
+
+    def test_commands_arriving_during_a_send_are_merged(self):
+        coalescer = CommandCoalescer(window=0.05)
+        first_sending = threading.Event()
+        release = threading.Event()
+        sent = []
+
+        def send(gateway, frame):
+            sent.append(frame)
+            if len(sent) == 1:
+                first_sending.set()
+                release.wait(1)
+            return {"result": "ok"}
+
+        def submit(node_id):
+            return coalescer.submit(self.gateway, {"method": "gateway_set.prop", "nodes": [node(node_id, ON)]}, send)
+
+        first = threading.Thread(target=submit, args=(1,))
+        first.start()
+        first_sending.wait(1)
+        others = [threading.Thread(target=submit, args=(node_id,)) for node_id in (2, 3)]
+        for thread in others:
+            thread.start()
+        time.sleep(0.01)
+        release.set()
+        for thread in [first] + others:
+            thread.join(1)
+
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(sorted(item["id"] for item in sent[1]["nodes"]), [2, 3])
+
+    def test_follower_joining_during_send_waits_with_injected_sleep(self):
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(threading.current_thread().name)
+            time.sleep(seconds)
+
+        coalescer = CommandCoalescer(window=0.1, sleep=sleep)
+        first_sending = threading.Event()
+        release = threading.Event()
+        sent, results = [], {}
+
+        def send(gateway, frame):
+            sent.append(frame)
+            if len(sent) == 1:
+                first_sending.set()
+                release.wait(1)
+            return {"result": "ok", "frame": len(sent)}
+
+        def submit(node_id):
+            results[node_id] = coalescer.submit(
+                self.gateway, {"method": "gateway_set.prop", "nodes": [node(node_id, ON)]}, send)
+
+        threads = {node_id: threading.Thread(target=submit, args=(node_id,), name=f"submit-{node_id}")
+                   for node_id in (1, 2, 3)}
+        threads[1].start()
+        first_sending.wait(1)
+        threads[2].start()  # 第一条命令仍在发送，成为下一批的负责方并等待合并窗口
+        time.sleep(0.02)
+        threads[3].start()  # 加入第二批，等待第二批发送完成
+        time.sleep(0.02)
+        release.set()
+        for thread in threads.values():
+            thread.join(2)
+
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(sorted(item["id"] for item in sent[1]["nodes"]), [2, 3])
+        self.assertEqual(results[2], results[3])
+        self.assertEqual(results[3]["frame"], 2)
+        self.assertIn("submit-2", sleeps)
+        self.assertIn("submit-3", sleeps)  # 等待方也只通过注入的 sleep 让出
+
+    def test_follower_times_out_through_injected_sleep(self):
+        coalescer = CommandCoalescer(window=0.2, timeout=0.05)
+        release = threading.Event()
+        coalescer._in_flight[self.gateway.key] = 1  # 模拟已有命令在发送，负责方会等待合并窗口
+
+        def send(gateway, frame):
+            release.wait(1)
+            return {"result": "ok"}
+
+        leader = threading.Thread(target=coalescer.submit, args=(self.gateway, {"nodes": [node(1, ON)]}, send))
+        leader.start()
+        time.sleep(0.01)
+        with self.assertRaises(TimeoutError):
+            coalescer.submit(self.gateway, {"nodes": [node(2, ON)]}, send)
+        release.set()
+        leader.join(1)
+
+    def test_send_error_is_raised_to_every_caller(self):
+        coalescer = CommandCoalescer(window=0)
+
+        def send(gateway, frame):
+            raise ConnectionError("网关断开")
+
+        with self.assertRaises(ConnectionError):
+            coalescer.submit(self.gateway, {"nodes": [node(1, ON)]}, send)
+
+
+if __name__ == '__main__':
+    unittest.main()
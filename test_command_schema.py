@@ -0,0 +1,31 @@
+import unittest
+
+from command_schema import build_command_schema, validate_command
+
+
+class CommandSchemaTest(unittest.TestCase):
+    def setUp(self):
+        self.schema = build_command_schema(locations=["客厅", "主卧"])
+
+    def test_generic_names_are_allowed(self):
+        for name in ("灯", "所有灯", "客厅灯带"):
+            command = {"domain": "light", "name": name, "action": "turn_on", "location": "all"}
+            self.assertTrue(validate_command(command, self.schema), name)
+
+    def test_enumerated_fields_are_checked(self):
+        base = {"domain": "light", "name": "灯", "action": "turn_on", "location": "客厅"}
+        self.assertTrue(validate_command(base, self.schema))
+        self.assertFalse(validate_command(dict(base, domain="tv"), self.schema))
+        self.assertFalse(validate_command(dict(base, action="toggle"), self.schema))
+        self.assertFalse(validate_command(dict(base, location="阁楼"), self.schema))
+        self.assertTrue(validate_command(dict(base, domain="scene", action="excute", location="null"), self.schema))
+
+    def test_missing_or_non_string_fields(self):
+        self.assertFalse(validate_command({"domain": "light", "action": "turn_on", "location": "all"}, self.schema))
+        self.assertFalse(validate_command({"domain": "light", "name": None, "action": "turn_on", "location": "all"},
+                                          self.schema))
+        self.assertFalse(validate_command(["light"], self.schema))
+
+
+if __name__ == '__main__':
+    unittest.main()
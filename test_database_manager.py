@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from database_manager import NODE_INFO_MIGRATIONS, DatabaseManager, NodeInfo
+
+# 引入迁移之前的 node_info 表结构
+BASELINE_SCHEMA = '''
+    CREATE TABLE node_info (
+        id INTEGER PRIMARY KEY,
+        type INTEGER,
+        type_description TEXT,
+        name TEXT,
+        device_type TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def node(node_id, name, node_type=2, device_type="DIMMABLE_LIGHT"):
+    return NodeInfo(id=node_id, type=node_type, type_description="Mesh子设备", name=name, device_type=device_type)
+
+
+class DatabaseManagerTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db_name = os.path.join(tmp.name, "local.db")
+
+    def open(self) -> DatabaseManager:
+        manager = DatabaseManager(self.db_name)
+        self.addCleanup(manager.store.close)
+        return manager
+
+    def test_migrates_baseline_database(self):
+        conn = sqlite3.connect(self.db_name)
+        conn.execute(BASELINE_SCHEMA)
+        conn.executemany('INSERT INTO node_info (id, type, type_description, name, device_type) VALUES (?, ?, ?, ?, ?)',
+                         [(1, 2, "Mesh子设备", "客厅 射灯一", "DIMMABLE_LIGHT"), (2, 6, "情景", "ＡＢ模式", "")])
+        conn.commit()
+        conn.close()
+
+        manager = self.open()
+        with manager.store.read() as conn:
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(node_info)')]
+            normalized = dict(conn.execute('SELECT id, normalized_name FROM node_info'))
+            indexes = {row[1] for row in conn.execute('PRAGMA index_list(node_info)')}
+            version = conn.execute("SELECT version FROM schema_migrations WHERE component = 'node_info'").fetchone()[0]
+            journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+
+        self.assertIn("normalized_name", columns)
+        self.assertEqual(normalized, {1: "客厅射灯1", 2: "AB模式"})
+        self.assertTrue({"idx_node_info_type", "idx_node_info_device_type", "idx_node_info_normalized_name",
+                         "idx_node_info_timestamp"} <= indexes)
+        self.assertEqual(version, len(NODE_INFO_MIGRATIONS))
+        self.assertEqual(journal_mode, "wal")
+        self.assertEqual({node.id for node in manager.snapshot().nodes}, {1, 2})
+
+    def test_migrations_run_once(self):
+        manager = self.open()
+        manager.save_node_info_bulk([node(1, "灯带")])
+        # 同一数据库再次执行迁移时不会重复添加列或回填
+        self.assertEqual(manager.store.migrate('node_info', NODE_INFO_MIGRATIONS), len(NODE_INFO_MIGRATIONS))
+        self.assertEqual([n.name for n in manager.snapshot().nodes], ["灯带"])
+
+    def test_unchanged_rows_are_not_rewritten(self):
+        manager = self.open()
+        notifications = []
+        manager.add_change_listener(lambda: notifications.append(manager.generation))
+
+        manager.save_node_info_bulk([node(1, "灯带"), node(2, "射灯")])
+        self.assertEqual(manager.generation, 1)
+        self.assertEqual(notifications, [1])
+        fingerprint = manager.snapshot().fingerprint
+
+        writer = manager.store._writer
+        before = writer.total_changes
+        manager.save_node_info_bulk([node(2, "射灯"), node(1, "灯带")])
+        self.assertEqual(writer.total_changes, before)
+        self.assertEqual(manager.generation, 1)
+        self.assertEqual(notifications, [1])
+        self.assertEqual(manager.snapshot().fingerprint, fingerprint)
+
+        manager.save_node_info_bulk([node(1, "灯带"), node(2, "射灯2")])
+        self.assertEqual(writer.total_changes, before + 1)  # 只改写变化的一行
+        self.assertEqual(manager.generation, 2)
+        self.assertEqual(notifications, [1, 2])
+        self.assertNotEqual(manager.snapshot().fingerprint, fingerprint)
+        with manager.store.read() as conn:
+            self.assertEqual(conn.execute('SELECT normalized_name FROM node_info WHERE id = 2').fetchone()[0], "射灯2")
+
+    def test_accepts_topology_dicts(self):
+        manager = self.open()
+        manager.save_node_info_bulk([{"id": 5, "type": 1, "type_description": "房间", "name": "客厅",
+                                      "device_type": None}])
+        snapshot = manager.snapshot()
+        self.assertEqual(snapshot.by_id[5].device_type, "")
+        self.assertEqual(manager.query_nodes(), list(snapshot.nodes))
+
+    def test_snapshot_survives_reopen(self):
+        first = self.open()
+        first.save_node_info_bulk([node(1, "灯带")])
+        fingerprint = first.snapshot().fingerprint
+        first.store.close()
+
+        from sqlite_store import _stores
+        _stores.pop(os.path.abspath(self.db_name), None)  # 模拟进程重启
+        self.assertEqual(self.open().snapshot().fingerprint, fingerprint)
+
+
+if __name__ == '__main__':
+    unittest.main()
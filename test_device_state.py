@@ -0,0 +1,85 @@
+import unittest
+
+from device_state import DeviceStateStore, StateChangeBuffer
+
+
+class DeviceStateStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.store = DeviceStateStore()
+        self.store.apply_push({
+            "method": "gateway_post.prop",
+            "nodes": [{"id": 1, "params": {"p": True, "l": 80}}, {"id": "2", "prop": {"p": False}}]
+        })
+
+    def test_apply_push_stores_props(self):
+        self.assertEqual(self.store.get(1), {"p": True, "l": 80})
+        self.assertEqual(self.store.get(2), {"p": False})
+        self.assertEqual(self.store.get(3), {})
+
+    def test_other_methods_are_ignored(self):
+        self.store.apply_push({"method": "gateway_post.topology", "nodes": [{"id": 3, "params": {"p": True}}]})
+        self.assertEqual(self.store.get(3), {})
+
+    def test_is_noop(self):
+        self.assertTrue(self.store.is_noop(1, {"p": True}))
+        self.assertTrue(self.store.is_noop("1", {"p": True, "l": 80}))
+        self.assertFalse(self.store.is_noop(1, {"p": False}))
+        self.assertFalse(self.store.is_noop(1, {"ct": 4000}))  # 状态中没有该属性
+        self.assertFalse(self.store.is_noop(3, {"p": True}))  # 状态未知
+        self.assertFalse(self.store.is_noop(1, {}))  # 没有设置任何属性
+
+    def test_apply_set_updates_state_but_not_noop(self):
+        self.store.apply_set({"method": "gateway_set.prop", "nodes": [{"id": 2, "nt": 2, "set": {"p": True}}]})
+        self.assertEqual(self.store.get(2), {"p": True})
+        # 网关确认不代表设备已变化，收到推送前同一命令仍要发送
+        self.assertFalse(self.store.is_noop(2, {"p": True}))
+        self.assertFalse(self.store.is_noop(2, {"p": False}))
+        self.store.apply_push({"method": "gateway_post.prop", "nodes": [{"id": 2, "params": {"p": True}}]})
+        self.assertTrue(self.store.is_noop(2, {"p": True}))
+
+    def test_retry_after_ack_without_effect(self):
+        # 设备处于关闭状态，开灯命令得到确认但 Mesh 丢包，设备没有推送变化
+        self.store.apply_set({"nodes": [{"id": 1, "set": {"p": False}}]})
+        self.store.apply_push({"method": "gateway_post.prop", "nodes": [{"id": 1, "params": {"p": False}}]})
+        self.store.apply_set({"nodes": [{"id": 1, "set": {"p": True}}]})
+        self.assertTrue(self.store.get(1)["p"])
+        for _ in range(2):  # 用户重复同一命令时不会被跳过
+            self.assertFalse(self.store.is_noop(1, {"p": True}))
+            self.store.apply_set({"nodes": [{"id": 1, "set": {"p": True}}]})
+        # 其他未被写入的属性仍以推送为准
+        self.assertTrue(self.store.is_noop(1, {"l": 80}))
+
+    def test_forget_after_disconnect(self):
+        self.store.forget([1, "2"])
+        self.assertEqual(self.store.get(1), {})
+        self.assertFalse(self.store.is_noop(1, {"p": True}))
+        self.assertFalse(self.store.is_noop(2, {"p": False}))
+        self.store.apply_push({"method": "gateway_post.prop", "nodes": [{"id": 1, "params": {"p": True}}]})
+        self.assertTrue(self.store.is_noop(1, {"p": True}))
+
+    def test_listeners_receive_only_changes(self):
+        changes = []
+        self.store.add_listener(changes.append)
+        self.store.apply_set({"nodes": [{"id": 1, "set": {"p": True, "l": 50}}]})
+        self.store.apply_set({"nodes": [{"id": 1, "set": {"p": True, "l": 50}}]})
+        self.assertEqual(changes, [{1: {"l": 50}}])
+
+
+class StateChangeBufferTest(unittest.TestCase):
+    def test_changes_are_merged_until_drained(self):
+        buffer = StateChangeBuffer()
+        buffer.put({1: {"p": True}, 2: {"p": False}})
+        buffer.put({1: {"p": False, "l": 30}})
+        self.assertEqual(buffer.drain(), {1: {"p": False, "l": 30}, 2: {"p": False}})
+        self.assertEqual(buffer.drain(), {})
+
+    def test_store_listener_feeds_buffer(self):
+        store, buffer = DeviceStateStore(), StateChangeBuffer()
+        store.add_listener(buffer.put)
+        store.apply_push({"method": "gateway_post.prop", "nodes": [{"id": 5, "params": {"p": True}}]})
+        store.apply_set({"nodes": [{"id": 5, "set": {"l": 10}}]})
+        self.assertEqual(buffer.drain(), {5: {"p": True, "l": 10}})
+
+
+if __name__ == '__main__':
+    unittest.main()
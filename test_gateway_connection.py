@@ -0,0 +1,158 @@
+import threading
+import time
+import unittest
+
+from gateway_connection import GatewayConnection, _PendingRequest, next_request_id
+from mock_gateway import MockGateway
+
+
+class DelayedEchoGateway(MockGateway):
+    """按请求中的 delay 延迟回显 n，用于制造乱序响应"""
+
+    def handle(self, client, request):
+        params = request.get("params", {})
+        client.send({"id": request["id"], "result": params.get("n")}, params.get("delay", 0))
+
+
+class NoIdGateway(MockGateway):
+    """与部分真实网关一样，拓扑和房间响应不带 id"""
+
+    def handle(self, client, request):
+        if request.get("method") == "gateway_get.topology":
+            client.send({"method": "gateway_post.topology", "nodes": self.topology.nodes})
+        elif request.get("method") == "gateway_get.room":
+            client.send({"rooms": self.topology.rooms})
+        else:
+            super().handle(client, request)
+
+
+class GatewayConnectionTest(unittest.TestCase):
+    def start(self, gateway_class=MockGateway, **kwargs):
+        mock = gateway_class(tcp_port=0, udp_port=None, **kwargs).start()
+        self.addCleanup(mock.stop)
+        return mock
+
+    def connect(self, mock):
+        conn = GatewayConnection(mock.host, mock.tcp_port, timeout=2).connect()
+        self.addCleanup(conn.close)
+        return conn
+
+    def test_out_of_order_responses_are_matched_by_id(self):
+        conn = self.connect(self.start(DelayedEchoGateway))
+        results, finished = {}, []
+
+        def request(n):
+            # 先发送的请求响应最晚
+            response = conn.request({"method": "echo", "params": {"n": n, "delay": 0.2 - n * 0.04}})
+            results[n] = response["result"]
+            finished.append(n)
+
+        threads = [threading.Thread(target=request, args=(n,)) for n in range(5)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.005)
+        for thread in threads:
+            thread.join(2)
+        self.assertEqual(results, {n: n for n in range(5)})
+        self.assertEqual(finished, [4, 3, 2, 1, 0])
+        self.assertEqual(conn._pending, {})
+
+    def test_pipelines_many_concurrent_requests_over_one_socket(self):
+        mock = self.start(latency=0.02, jitter=0.02, seed=1)
+        conn = self.connect(mock)
+        responses = [None] * 50
+
+        def request(i):
+            responses[i] = conn.request({"method": "gateway_get.room", "params": {"id": 0}})
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=request, args=(i,)) for i in range(50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertTrue(all(response and "rooms" in response for response in responses))
+        self.assertLess(time.monotonic() - started, 1.0)  # 50 个请求不是逐个往返
+        self.assertEqual(len(mock._clients), 1)
+
+    def test_pushes_are_diverted_to_subscribers(self):
+        mock = self.start()
+        sender, listener = self.connect(mock), self.connect(mock)
+        pushes, received = [], threading.Event()
+
+        def on_push(message):
+            pushes.append(message)
+            received.set()
+
+        listener.subscribe(on_push)
+        node_id = mock.topology.device_ids()[0]
+        response = sender.request({"method": "gateway_set.prop", "nodes": [{"id": node_id, "set": {"p": True}}]})
+        self.assertEqual(response["result"], "ok")
+        self.assertTrue(received.wait(2))
+        self.assertEqual(pushes[0]["method"], "gateway_post.prop")
+        self.assertEqual(pushes[0]["nodes"], [{"id": node_id, "params": {"p": True}}])
+
+        listener.unsubscribe(on_push)
+        # 推送不会被当作其他请求的响应
+        self.assertIn("rooms", listener.request({"method": "gateway_get.room", "params": {"id": 0}}))
+
+    def test_responses_without_id_fall_back_to_method(self):
+        mock = self.start(NoIdGateway)
+        conn = self.connect(mock)
+        self.assertEqual(conn.request({"method": "gateway_get.topology"})["nodes"], mock.topology.nodes)
+        self.assertEqual(conn.request({"method": "gateway_get.room", "params": {"id": 0}})["rooms"], mock.topology.rooms)
+
+    def test_take_pending_matching_rules(self):
+        conn = GatewayConnection("127.0.0.1")
+        topology, room = _PendingRequest("gateway_get.topology"), _PendingRequest("gateway_get.room")
+        conn._pending = {1: topology, 2: room}
+        self.assertIs(conn._take_pending({"rooms": []}), room)
+        self.assertEqual(list(conn._pending), [1])
+        self.assertIsNone(conn._take_pending({"id": 99, "result": "ok"}))  # 未知 id 且无法按方法匹配
+        self.assertIsNone(conn._take_pending({"method": "gateway_post.prop", "nodes": []}))
+        self.assertIs(conn._take_pending({"method": "gateway_post.topology"}), topology)
+        self.assertEqual(conn._pending, {})
+
+    def test_timeout(self):
+        conn = self.connect(self.start(drop_rate=1.0))
+        with self.assertRaises(TimeoutError):
+            conn.request({"method": "gateway_get.room", "params": {"id": 0}}, timeout=0.1)
+        self.assertEqual(conn._pending, {})
+        self.assertTrue(conn.connected)
+
+    def test_pending_requests_fail_when_socket_closes(self):
+        mock = self.start(drop_rate=1.0)
+        conn = self.connect(mock)
+        errors = []
+
+        def request():
+            try:
+                conn.request({"method": "gateway_get.room", "params": {"id": 0}}, timeout=5)
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=request)
+        started = time.monotonic()
+        thread.start()
+        time.sleep(0.05)
+        mock.stop()
+        thread.join(2)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertIsInstance(errors[0], ConnectionError)
+        self.assertFalse(conn.connected)
+        with self.assertRaises(ConnectionError):
+            conn.request({"method": "gateway_get.room"})
+
+    def test_request_ids_are_unique_across_threads(self):
+        ids = []
+        threads = [threading.Thread(target=lambda: ids.extend(next_request_id() for _ in range(200)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(ids)), 800)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import socket
+import time
+import unittest
+from unittest import mock
+
+try:
+    import gateway
+    from gateway_pool import GatewayPool
+    from mock_gateway import MockGateway
+except ImportError:  # 未安装 flask_socketio 等依赖
+    gateway = None
+
+
+def free_port() -> int:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class FakeScan:
+    """替代 scan_gateways，按顺序返回预设的扫描结果并记录扫描次数"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self, logger, **kwargs):
+        self.calls += 1
+        return self.results.pop(0) if len(self.results) > 1 else self.results[0]
+
+
+@unittest.skipUnless(gateway, "需要 flask_socketio")
+class DiscoveryCacheTest(unittest.TestCase):
+    def setUp(self):
+        gateway.invalidate_discovery_cache()
+        self.addCleanup(gateway.invalidate_discovery_cache)
+        self.pool = GatewayPool(min_backoff=0.05, max_backoff=0.2, check_interval=0.02)
+        self.addCleanup(self.pool.close)
+        self.patch(mock.patch.object(gateway, "gateway_pool", self.pool))
+        self.patch(mock.patch.dict(os.environ, {"GATEWAY_DISCOVERY_TTL": "300"}))
+
+    def patch(self, patcher):
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_scan(self, *results):
+        scan = FakeScan(*results)
+        self.patch(mock.patch.object(gateway, "scan_gateways", scan))
+        return scan
+
+    def start_mock(self, gateway_id="gw-1"):
+        mock_gateway = MockGateway(tcp_port=0, udp_port=None, gateway_id=gateway_id).start()
+        self.addCleanup(mock_gateway.stop)
+        return mock_gateway
+
+    def test_reuses_cache_while_fresh(self):
+        found = [{"id": "gw-1", "ip": "127.0.0.1"}]
+        scan = self.fake_scan(found)
+        self.assertEqual(gateway.discover_gateway(None, scan_only=True), found)
+        self.assertEqual(gateway.discover_gateway(None, scan_only=True), found)
+        self.assertEqual(scan.calls, 1)
+
+    def test_refresh_forces_scan(self):
+        scan = self.fake_scan([{"id": "gw-1", "ip": "127.0.0.1"}])
+        gateway.discover_gateway(None, scan_only=True)
+        gateway.discover_gateway(None, scan_only=True, refresh=True)
+        self.assertEqual(scan.calls, 2)
+
+    def test_rescans_after_ttl(self):
+        os.environ["GATEWAY_DISCOVERY_TTL"] = "0.05"
+        scan = self.fake_scan([{"id": "gw-1", "ip": "127.0.0.1"}], [{"id": "gw-2", "ip": "127.0.0.2"}])
+        gateway.discover_gateway(None, scan_only=True)
+        time.sleep(0.1)
+        self.assertEqual(gateway.discover_gateway(None, scan_only=True)[0]["id"], "gw-2")
+        self.assertEqual(scan.calls, 2)
+
+    def test_empty_scan_is_not_cached(self):
+        scan = self.fake_scan([], [{"id": "gw-1", "ip": "127.0.0.1"}])
+        with self.assertRaises(Exception):
+            gateway.discover_gateway(None, scan_only=True)
+        self.assertEqual(gateway.discover_gateway(None, scan_only=True)[0]["id"], "gw-1")
+        self.assertEqual(scan.calls, 2)
+
+    def test_unreachable_cached_gateway_falls_back_to_scan(self):
+        mock_gateway = self.start_mock()
+        stale = {"id": "gw-1", "ip": "127.0.0.1", "port": str(free_port())}
+        scan = self.fake_scan([stale], [mock_gateway.info])
+
+        with self.assertRaises(OSError):
+            gateway.discover_gateway(None)
+        # 缓存的地址连接失败后被丢弃，下次发现时重新扫描并连接到网关的新地址
+        conn, ip = gateway.discover_gateway(None)
+        self.assertEqual(scan.calls, 2)
+        self.assertEqual(ip, "127.0.0.1")
+        [managed] = self.pool.gateways()
+        self.assertEqual(managed.port, mock_gateway.tcp_port)
+        self.assertIs(conn, managed.conn)
+
+    def test_failed_connect_invalidates_cache(self):
+        stale = {"id": "gw-1", "ip": "127.0.0.1", "port": str(free_port())}
+        scan = self.fake_scan([stale])
+        gateways = gateway.discover_gateway(None, scan_only=True)
+        with self.assertRaises(OSError):
+            gateway.connect_to_gateway(gateways[0], None)
+        gateway.discover_gateway(None, scan_only=True)
+        self.assertEqual(scan.calls, 2)
+
+
+@unittest.skipUnless(gateway, "需要 flask_socketio")
+class ScanGatewaysTest(unittest.TestCase):
+    def test_collects_response_and_returns_after_quiet(self):
+        mock_gateway = MockGateway(tcp_port=0, udp_port=0, gateway_id="gw-1").start()
+        self.addCleanup(mock_gateway.stop)
+        with mock.patch.object(gateway, "DISCOVERY_PORT", mock_gateway.udp_port):
+            start = time.monotonic()
+            found = gateway.scan_gateways(gateway.Logger(None), window=3.0, broadcast_addr="127.0.0.1", quiet=0.1)
+        self.assertLess(time.monotonic() - start, 1.0)  # 收到响应后静默 quiet 秒即返回
+        self.assertEqual(found, [{"id": "gw-1", "ip": "127.0.0.1", "model": "mock"}])
+
+    def test_returns_empty_after_window_without_response(self):
+        with mock.patch.object(gateway, "DISCOVERY_PORT", free_port()):
+            found = gateway.scan_gateways(gateway.Logger(None), window=0.2, broadcast_addr="127.0.0.1")
+        self.assertEqual(found, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
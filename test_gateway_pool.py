@@ -0,0 +1,144 @@
+import socket
+import time
+import unittest
+
+from gateway_pool import GatewayPool, ManagedGateway
+from mock_gateway import MockGateway
+
+
+def wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def free_port() -> int:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class GatewayPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = GatewayPool(min_backoff=0.05, max_backoff=0.2, check_interval=0.02)
+        self.addCleanup(self.pool.close)
+
+    def start_mock(self, gateway_id, tcp_port=0, **kwargs):
+        mock = MockGateway(tcp_port=tcp_port, udp_port=None, gateway_id=gateway_id, **kwargs).start()
+        self.addCleanup(mock.stop)
+        return mock
+
+    def test_has_connection(self):
+        self.assertFalse(self.pool.has_connection())
+        self.assertIsNone(self.pool.default_gateway())
+        mock = self.start_mock("gw-1")
+        gateway = self.pool.add(mock.info)
+        self.assertTrue(self.pool.has_connection())
+        self.assertIs(self.pool.default_gateway(), gateway)
+        self.assertIs(self.pool.add(mock.info), gateway)  # 已连接的网关直接复用
+        self.assertEqual(len(mock._clients), 1)
+
+    def test_split_by_owner_routes_nodes_to_their_gateway(self):
+        first = self.pool.add(self.start_mock("gw-1").info)
+        second = self.pool.add(self.start_mock("gw-2").info)
+        self.pool.assign_nodes(first, [1, 2])
+        self.pool.assign_nodes(second, ["3", 4])
+
+        command = {"id": 9, "method": "gateway_set.prop",
+                   "nodes": [{"id": 1, "set": {"p": True}}, {"id": 3, "set": {"p": True}}, {"id": 99, "set": {}}],
+                   "scenes": [{"id": 4}]}
+        parts = {gateway.key: part for gateway, part in self.pool.split_by_owner(command)}
+        self.assertEqual(set(parts), {"gw-1", "gw-2"})
+        self.assertEqual([node["id"] for node in parts["gw-1"]["nodes"]], [1, 99])  # 归属未知的节点发往默认网关
+        self.assertEqual([node["id"] for node in parts["gw-2"]["nodes"]], [3])
+        self.assertEqual(parts["gw-2"]["scenes"], [{"id": 4}])
+        self.assertEqual(parts["gw-1"]["scenes"], [])
+        for part in parts.values():
+            self.assertEqual(part["method"], "gateway_set.prop")
+            self.assertNotIn("id", part)  # 每个部分发送时重新分配 id
+
+    def test_split_without_connection_raises(self):
+        with self.assertRaises(ConnectionError):
+            self.pool.split_by_owner({"nodes": [{"id": 1, "set": {}}], "scenes": []})
+
+    def test_reassigning_nodes_moves_ownership(self):
+        first = self.pool.add(self.start_mock("gw-1").info)
+        second = self.pool.add(self.start_mock("gw-2").info)
+        self.pool.assign_nodes(first, [1, 2])
+        self.pool.assign_nodes(second, [2])
+        self.pool.assign_nodes(first, [1])
+        self.assertIs(self.pool.owner_of(1), first)
+        self.assertIs(self.pool.owner_of("2"), second)
+        self.pool.assign_nodes(second, [])
+        self.assertIsNone(self.pool.owner_of(2))
+
+    def test_routed_requests_reach_the_owning_gateway(self):
+        mocks = [self.start_mock("gw-1"), self.start_mock("gw-2")]
+        gateways = [self.pool.add(mock.info) for mock in mocks]
+        self.pool.assign_nodes(gateways[1], [5])
+        command = {"method": "gateway_set.prop", "nodes": [{"id": 5, "set": {"p": True}}], "scenes": []}
+        for gateway, part in self.pool.split_by_owner(command):
+            self.assertEqual(self.pool.request(gateway, part)["result"], "ok")
+        self.assertEqual(mocks[0].stats["requests"], 0)
+        self.assertEqual(mocks[1].stats["requests"], 1)
+
+    def test_backoff_doubles_up_to_max(self):
+        gateway = ManagedGateway("gw", {"ip": "127.0.0.1"})
+        delays = []
+        for _ in range(5):
+            self.pool._schedule_reconnect(gateway)
+            delays.append(gateway.backoff)
+        self.assertEqual(delays, [0.05, 0.1, 0.2, 0.2, 0.2])
+        self.assertGreater(gateway.next_attempt, time.monotonic())
+
+    def test_failed_add_retries_in_background_and_resets_backoff(self):
+        port = free_port()
+        disconnected = []
+        self.pool.on_disconnect = lambda gateway: disconnected.append(gateway.key)
+        info = {"id": "gw-1", "ip": "127.0.0.1", "port": str(port)}
+        with self.assertRaises(OSError):
+            self.pool.add(info)
+        self.assertFalse(self.pool.has_connection())
+        self.assertTrue(disconnected)
+        self.assertTrue(wait_until(lambda: self.pool.gateways()[0].backoff >= 0.1))  # 后台重连失败后退避加倍
+
+        self.start_mock("gw-1", tcp_port=port)
+        self.assertTrue(wait_until(self.pool.has_connection))
+        self.assertEqual(self.pool.gateways()[0].backoff, 0.0)
+
+    def test_rediscovered_address_is_used_immediately(self):
+        info = {"id": "gw-1", "ip": "127.0.0.1", "port": str(free_port())}
+        with self.assertRaises(OSError):
+            self.pool.add(info)
+        gateway = self.pool.gateways()[0]
+        gateway.next_attempt = time.monotonic() + 60  # 后台线程短时间内不会重连
+        mock = self.start_mock("gw-1")
+        self.assertIs(self.pool.add(mock.info), gateway)
+        self.assertTrue(gateway.connected)
+        self.assertEqual(gateway.port, mock.tcp_port)
+
+    def test_drop_is_detected_and_reported(self):
+        disconnected = []
+        self.pool.on_disconnect = lambda gateway: disconnected.append(gateway.key)
+        mock = self.start_mock("gw-1")
+        self.pool.add(mock.info)
+        mock.stop()
+        self.assertTrue(wait_until(lambda: disconnected))
+        self.assertEqual(disconnected[0], "gw-1")
+        self.assertFalse(self.pool.has_connection())
+
+    def test_idle_connection_is_probed(self):
+        self.pool.heartbeat_interval = 0.05
+        mock = self.start_mock("gw-1")
+        self.pool.add(mock.info)
+        self.assertTrue(wait_until(lambda: mock.stats["requests"] >= 2))
+        self.assertTrue(self.pool.has_connection())
+
+
+if __name__ == '__main__':
+    unittest.main()
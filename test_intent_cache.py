@@ -0,0 +1,80 @@
+import os
+import tempfile
+import unittest
+from collections import namedtuple
+
+from command_schema import build_command_schema, validate_command
+from intent_cache import IntentCache, normalize_utterance
+from match_name import NameIndex
+
+Node = namedtuple('Node', ['id', 'type', 'name'])
+
+NODES = [Node(1, 2, "客厅灯带"), Node(2, 6, "观影模式")]
+INDEX = NameIndex(NODES, {"light": lambda d: d.type == 2, "scene": lambda d: d.type == 6})
+SCHEMA = build_command_schema(locations=["客厅"])
+
+
+def is_cacheable(command) -> bool:
+    # 与 app.is_cacheable_command 相同：符合 Schema 且能匹配到节点
+    return validate_command(command, SCHEMA) and bool(INDEX.find(command.get("name"), command.get("domain")))
+
+
+VALID = {"domain": "light", "name": "灯带", "action": "turn_on", "location": "客厅"}
+
+
+class IntentCacheTest(unittest.TestCase):
+    def test_normalize_ignores_punctuation_and_case(self):
+        self.assertEqual(normalize_utterance(" 打开 客厅灯带！"), normalize_utterance("打开客厅灯带"))
+        self.assertEqual(normalize_utterance("Turn On."), "turnon")
+
+    def test_put_and_get(self):
+        cache = IntentCache(validate=is_cacheable)
+        self.assertTrue(cache.put("打开灯带", "v1", VALID))
+        self.assertEqual(cache.get("打开灯带。", "v1"), VALID)
+        self.assertIsNone(cache.get("打开灯带", "v2"))
+
+    def test_invalid_parse_is_not_cached(self):
+        cache = IntentCache(validate=is_cacheable)
+        invalid = [
+            dict(VALID, action="toggle"),  # 不符合 Schema
+            dict(VALID, location="阁楼"),
+            {"domain": "light", "name": "灯带"},  # 缺少字段
+            dict(VALID, name="电视"),  # 匹配不到节点
+            dict(VALID, domain="scene"),  # domain 下没有同名节点
+        ]
+        for command in invalid:
+            self.assertFalse(cache.put("打开灯带", "v1", command), command)
+            self.assertIsNone(cache.get("打开灯带", "v1"), command)
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_invalid_parse_is_not_persisted(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_name = os.path.join(tmp, "cache.db")
+            IntentCache(db_name=db_name, validate=is_cacheable).put("打开灯带", "v1", dict(VALID, name="电视"))
+            self.assertIsNone(IntentCache(db_name=db_name).get("打开灯带", "v1"))
+
+    def test_persisted_table_is_capped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_name = os.path.join(tmp, "cache.db")
+            cache = IntentCache(max_items=3, db_name=db_name)
+            for i in range(5):
+                cache.put(f"打开灯带{i}", "v1", VALID)
+            cache.put("打开灯带2", "v1", dict(VALID, action="turn_off"))  # 重新写入的条目变为最新
+            cache.put("打开灯带5", "v1", VALID)
+            with cache._store.read() as conn:
+                rows = [row[0] for row in conn.execute('SELECT utterance FROM intent_cache ORDER BY rowid')]
+            self.assertEqual(rows, ["打开灯带4", "打开灯带2", "打开灯带5"])
+            self.assertEqual(IntentCache(max_items=3, db_name=db_name).get("打开灯带2", "v1")["action"], "turn_off")
+            self.assertIsNone(IntentCache(max_items=3, db_name=db_name).get("打开灯带3", "v1"))
+
+    def test_invalidate_keeps_current_topology(self):
+        cache = IntentCache()
+        cache.put("打开灯带", "v1", VALID)
+        cache.put("关闭灯带", "v2", dict(VALID, action="turn_off"))
+        cache.invalidate("v2")
+        self.assertIsNone(cache.get("打开灯带", "v1"))
+        self.assertIsNotNone(cache.get("关闭灯带", "v2"))
+
+
+if __name__ == '__main__':
+    unittest.main()
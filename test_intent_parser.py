@@ -0,0 +1,68 @@
+import unittest
+from collections import namedtuple
+
+from intent_parser import RuleIntentParser
+from match_name import NameIndex
+
+Node = namedtuple('Node', ['id', 'type', 'name', 'device_type'])
+
+NODES = [
+    Node(2000, 1, "客厅", ""),
+    Node(2001, 1, "主卧", ""),
+    Node(1, 2, "客厅灯带", "LIGHT"),
+    Node(2, 2, "主卧吸顶灯", "LIGHT"),
+    Node(3, 2, "玄关开关", "SWITCH"),
+    Node(1001, 6, "观影模式", ""),
+    Node(4, 2, "观影模式", "LIGHT"),  # 与情景同名的灯
+    Node(1002, 6, "阅读模式", ""),
+]
+PARTITIONS = {
+    "room": lambda d: d.type == 1,
+    "light": lambda d: d.type == 2 and d.device_type == "LIGHT",
+    "switch": lambda d: d.device_type == "SWITCH",
+    "scene": lambda d: d.type == 6,
+}
+
+
+class RuleIntentParserTest(unittest.TestCase):
+    def setUp(self):
+        self.parser = RuleIntentParser()
+        self.index = NameIndex(NODES, PARTITIONS)
+
+    def parse(self, text):
+        return self.parser.parse(text, self.index)
+
+    def test_leading_verb(self):
+        self.assertEqual(self.parse("请打开客厅灯带。"),
+                         {"domain": "light", "name": "客厅灯带", "action": "turn_on", "location": "客厅"})
+        self.assertEqual(self.parse("关闭主卧吸顶灯"),
+                         {"domain": "light", "name": "主卧吸顶灯", "action": "turn_off", "location": "主卧"})
+
+    def test_trailing_verb_and_fillers(self):
+        self.assertEqual(self.parse("帮我把客厅的灯带关掉吧"),
+                         {"domain": "light", "name": "客厅灯带", "action": "turn_off", "location": "客厅"})
+
+    def test_switch_without_room(self):
+        self.assertEqual(self.parse("打开玄关开关"),
+                         {"domain": "switch", "name": "玄关开关", "action": "turn_on", "location": "all"})
+
+    def test_scene(self):
+        self.assertEqual(self.parse("执行阅读模式"),
+                         {"domain": "scene", "name": "阅读模式", "action": "excute", "location": "null"})
+        self.assertIsNone(self.parse("关闭阅读模式"))
+
+    def test_falls_back_to_llm_when_unsure(self):
+        self.assertIsNone(self.parse("打开观影模式"))  # 情景和灯同名
+        self.assertIsNone(self.parse("打开客厅灯"))  # 不是完整的节点名称
+        self.assertIsNone(self.parse("我要看电影了"))  # 没有动作动词
+        self.assertIsNone(self.parse("执行客厅灯带"))
+        self.assertIsNone(self.parse(""))
+
+    def test_stats(self):
+        self.parse("打开客厅灯带")
+        self.parse("我要看电影了")
+        self.assertEqual(self.parser.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import threading
+import time
+import unittest
+
+try:
+    from logger import Logger, LogPipeline
+except ImportError:  # 未安装 flask_socketio
+    LogPipeline = None
+
+
+class FakeSocketIO:
+    """记录 emit 调用；后台任务在真实线程中运行，emit 可被阻塞以模拟推送跟不上"""
+
+    def __init__(self):
+        self.emitted = []
+        self.tasks = 0
+        self.blocked = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def emit(self, event, data, namespace=None):
+        self.blocked.set()
+        self.release.wait(5)
+        self.emitted.append((event, data['message']))
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def start_background_task(self, target, *args):
+        self.tasks += 1
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+
+class FailingSocketIO(FakeSocketIO):
+    def emit(self, event, data, namespace=None):
+        raise RuntimeError("连接已断开")
+
+
+def wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+@unittest.skipUnless(LogPipeline, "需要 flask_socketio")
+class LogPipelineTest(unittest.TestCase):
+    def test_flush_merges_buffered_messages(self):
+        socketio = FakeSocketIO()
+        pipeline = LogPipeline(socketio, capacity=10)
+        pipeline.put("a\n")
+        pipeline.put("b\n")
+        pipeline.flush()
+        self.assertEqual(socketio.emitted, [('log_update', "a\nb\n")])
+        self.assertEqual(pipeline.stats(), {'buffered': 0, 'dropped': 0})
+
+    def test_flush_without_messages_does_not_emit(self):
+        socketio = FakeSocketIO()
+        LogPipeline(socketio).flush()
+        self.assertEqual(socketio.emitted, [])
+
+    def test_full_buffer_drops_oldest(self):
+        socketio = FakeSocketIO()
+        pipeline = LogPipeline(socketio, capacity=3)
+        for i in range(5):
+            pipeline.put(f"{i}\n")
+        self.assertEqual(pipeline.stats(), {'buffered': 3, 'dropped': 2})
+        pipeline.flush()
+        self.assertEqual(socketio.emitted, [('log_update', "[WARNING] 日志过多，已丢弃 2 条 \n2\n3\n4\n")])
+
+    def test_dropped_warning_reported_once(self):
+        socketio = FakeSocketIO()
+        pipeline = LogPipeline(socketio, capacity=1)
+        pipeline.put("a\n")
+        pipeline.put("b\n")
+        pipeline.flush()
+        pipeline.put("c\n")
+        pipeline.flush()
+        self.assertEqual(socketio.emitted[1], ('log_update', "c\n"))
+        self.assertEqual(pipeline.dropped, 1)  # 累计计数不因上报而清零
+
+    def test_emit_error_does_not_raise(self):
+        pipeline = LogPipeline(FailingSocketIO())
+        pipeline.put("a\n")
+        pipeline.flush()
+        self.assertEqual(pipeline.stats(), {'buffered': 0, 'dropped': 0})
+
+    def test_start_is_idempotent(self):
+        socketio = FakeSocketIO()
+        pipeline = LogPipeline(socketio, flush_interval=0.01)
+        pipeline.start()
+        pipeline.start()
+        self.assertEqual(socketio.tasks, 1)
+        pipeline.put("a\n")
+        self.assertTrue(wait_until(lambda: socketio.emitted == [('log_update', "a\n")]))
+
+    def test_slow_drain_does_not_block_producers(self):
+        socketio = FakeSocketIO()
+        socketio.release.clear()
+        pipeline = LogPipeline(socketio, capacity=5, flush_interval=0.01)
+        pipeline.start()
+        pipeline.put("first\n")
+        self.assertTrue(socketio.blocked.wait(2))  # 推送任务阻塞在 emit 中
+
+        start = time.monotonic()
+        for i in range(8):
+            pipeline.put(f"{i}\n")
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEqual(pipeline.stats(), {'buffered': 5, 'dropped': 3})
+
+        socketio.release.set()
+        self.assertTrue(wait_until(lambda: len(socketio.emitted) == 2))
+        self.assertEqual(socketio.emitted[0], ('log_update', "first\n"))
+        self.assertEqual(socketio.emitted[1], ('log_update', "[WARNING] 日志过多，已丢弃 3 条 \n3\n4\n5\n6\n7\n"))
+
+
+@unittest.skipUnless(LogPipeline, "需要 flask_socketio")
+class LoggerTest(unittest.TestCase):
+    def test_log_message_goes_through_pipeline(self):
+        socketio = FakeSocketIO()
+        logger = Logger(socketio)
+        logger.log_message("你好")
+        logger.log_message("调试信息", level="DEBUG")  # 低于默认级别 INFO，不输出
+        self.assertEqual(logger.stats(), {'buffered': 1, 'dropped': 0})
+
+    def test_long_message_is_truncated(self):
+        logger = Logger(None)
+        logger.max_length = 5
+        self.assertEqual(logger._truncate("0123456789"), "01234...（已截断 5 字符）")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from collections import namedtuple
+
+from match_name import NameIndex, NameMatcher
+
+Node = namedtuple('Node', ['id', 'type', 'name'])
+
+NODES = [
+    Node(1, 2, "客厅灯带"),
+    Node(2, 2, "餐厅射灯1"),
+    Node(3, 2, "餐厅射灯2"),
+    Node(4, 6, "观影模式"),
+    Node(5, 2, "主卧射灯一"),
+]
+PARTITIONS = {
+    "light": lambda d: d.type == 2,
+    "scene": lambda d: d.type == 6,
+}
+
+
+class NameIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = NameIndex(NODES, PARTITIONS)
+
+    def test_find_matches_substring_like_name_matcher(self):
+        for target in ("客厅灯带", "餐厅射灯", "射灯", "灯", "模式", "主卧射灯1", "不存在"):
+            expected = [node for node in NODES if NameMatcher.match_device_name(node.name, target)]
+            self.assertEqual(self.index.find(target), expected, target)
+
+    def test_find_restricted_to_partition(self):
+        self.assertEqual([node.id for node in self.index.find("射灯", "light")], [2, 3, 5])
+        self.assertEqual(self.index.find("射灯", "scene"), [])
+        self.assertEqual(self.index.find("射灯", "unknown"), [])
+
+    def test_empty_name_matches_nothing(self):
+        self.assertEqual(self.index.find("", "light"), [])
+        self.assertEqual(self.index.find(None, "light"), [])
+        self.assertEqual(self.index.find("  "), [])
+
+    def test_find_exact_and_partition(self):
+        self.assertEqual([node.id for node in self.index.find_exact("餐厅射灯1", "light")], [2])
+        self.assertEqual(self.index.find_exact("餐厅射灯", "light"), [])
+        self.assertEqual([node.id for node in self.index.partition("scene")], [4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import socket
+import threading
+import time
+import unittest
+
+from gateway_connection import GatewayConnection
+from gateway_pool import GatewayPool
+from mock_gateway import DISCOVERY_MESSAGE, MockGateway, SyntheticTopology
+
+
+def wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+class SyntheticTopologyTest(unittest.TestCase):
+    def test_topology_is_deterministic_and_groups_expand(self):
+        topology = SyntheticTopology(devices=40, rooms=4, seed=3)
+        self.assertEqual(topology.nodes, SyntheticTopology(devices=40, rooms=4, seed=3).nodes)
+        self.assertEqual(len(topology.device_ids()), 40)
+        self.assertEqual(len(topology.rooms), 4)
+        house = next(node for node in topology.nodes if node["nt"] == 5)
+        self.assertEqual(sorted(topology.expand(house["id"])), sorted(topology.device_ids()))
+        device = topology.device_ids()[0]
+        self.assertEqual(topology.expand(device), [device])
+
+
+class MockGatewayTest(unittest.TestCase):
+    def start(self, **kwargs):
+        kwargs.setdefault("udp_port", None)
+        mock = MockGateway(tcp_port=0, **kwargs).start()
+        self.addCleanup(mock.stop)
+        return mock
+
+    def test_answers_discovery(self):
+        mock = self.start(udp_port=0)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sock.close)
+        sock.settimeout(2)
+        sock.sendto(DISCOVERY_MESSAGE, ("127.0.0.1", mock.udp_port))
+        response = sock.recvfrom(1024)[0].decode()
+        self.assertIn(f"id:{mock.gateway_id}", response)
+        self.assertIn("ip:127.0.0.1", response)
+
+    def test_set_prop_updates_state_and_counts_group_members(self):
+        mock = self.start()
+        conn = GatewayConnection(mock.host, mock.tcp_port).connect()
+        self.addCleanup(conn.close)
+        room = mock.topology.rooms[0]
+        response = conn.request({"method": "gateway_set.prop", "nodes": [{"id": room["id"], "set": {"p": True}}]})
+        self.assertEqual(response["result"], "ok")
+        self.assertEqual(mock.stats["set_nodes"], len(room["nodes"]))
+        self.assertTrue(all(mock._states[node_id] == {"p": True} for node_id in room["nodes"]))
+
+    def test_unsupported_method_returns_error(self):
+        mock = self.start()
+        conn = GatewayConnection(mock.host, mock.tcp_port).connect()
+        self.addCleanup(conn.close)
+        self.assertIn("error", conn.request({"method": "gateway_get.unknown"}))
+
+    def test_restart_on_same_port(self):
+        mock = self.start()
+        port = mock.tcp_port
+        for _ in range(3):
+            mock.stop()
+            mock = MockGateway(tcp_port=port, udp_port=None).start()
+            self.addCleanup(mock.stop)
+            conn = GatewayConnection(mock.host, port).connect()
+            self.assertIn("rooms", conn.request({"method": "gateway_get.room", "params": {"id": 0}}))
+            conn.close()
+
+
+class GatewayPoolWithMockTest(unittest.TestCase):
+    def setUp(self):
+        self.mock = MockGateway(tcp_port=0, udp_port=None).start()
+        self.addCleanup(lambda: self.mock.stop())
+        self.pool = GatewayPool(min_backoff=0.05, max_backoff=0.2, check_interval=0.02)
+        self.addCleanup(self.pool.close)
+
+    def test_reconnects_after_mock_restarts(self):
+        gateway = self.pool.add(self.mock.info)
+        port = self.mock.tcp_port
+        self.mock.stop()
+        self.assertTrue(wait_until(lambda: not self.pool.has_connection()))
+
+        self.mock = MockGateway(tcp_port=port, udp_port=None).start()
+        self.assertTrue(wait_until(self.pool.has_connection))
+        response = self.pool.request(gateway, {"method": "gateway_get.room", "params": {"id": 0}})
+        self.assertEqual(response["rooms"], self.mock.topology.rooms)
+
+    def test_pipelines_concurrent_requests_over_one_socket(self):
+        self.mock.latency = 0.05
+        gateway = self.pool.add(self.mock.info)
+        responses = []
+
+        def request():
+            responses.append(self.pool.request(gateway, {"method": "gateway_get.room", "params": {"id": 0}}))
+
+        started = time.monotonic()
+        threads = [threading.Thread(target=request) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(responses), 20)
+        self.assertLess(time.monotonic() - started, 0.5)  # 串行需要 20 * 50ms
+        self.assertEqual(len(self.mock._clients), 1)
+        self.assertEqual(self.mock.stats["requests"], 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
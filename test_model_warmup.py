@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+
+from model_warmup import ComponentNotReady, ModelWarmup
+
+
+def wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+class FlakyLoader:
+    """前 failures 次调用抛出异常，之后返回 value"""
+
+    def __init__(self, failures, value="model"):
+        self.failures = failures
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError(f"第 {self.calls} 次加载失败")
+        return self.value
+
+
+class ModelWarmupTest(unittest.TestCase):
+    def test_ready_after_all_components_load(self):
+        gate = threading.Event()
+        warmup = ModelWarmup() \
+            .register('fast', lambda: 1) \
+            .register('slow', lambda: gate.wait(5) and 2)
+        self.assertEqual(warmup.readiness()['status'], 'warming_up')
+        warmup.start()
+        self.assertEqual(warmup.wait('fast', timeout=2), 1)
+
+        readiness = warmup.readiness()
+        self.assertEqual(readiness['status'], 'warming_up')
+        self.assertEqual(readiness['components']['fast']['status'], 'ready')
+        self.assertEqual(readiness['components']['slow']['status'], 'loading')
+        self.assertFalse(warmup.ready())
+        self.assertTrue(warmup.ready('fast'))
+
+        gate.set()
+        self.assertEqual(warmup.wait('slow', timeout=2), 2)
+        readiness = warmup.readiness()
+        self.assertEqual(readiness['status'], 'ready')
+        self.assertIsNotNone(readiness['components']['slow']['elapsed'])
+
+    def test_wait_times_out_while_loading(self):
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        warmup = ModelWarmup().register('slow', lambda: gate.wait(5)).start()
+        with self.assertRaises(ComponentNotReady):
+            warmup.wait('slow', timeout=0.05, sleep=lambda seconds: time.sleep(0.01))
+
+    def test_failed_component_is_retried_until_ready(self):
+        loader = FlakyLoader(failures=2)
+        warmup = ModelWarmup(retry_delay=0.05, max_retry_delay=0.1).register('flaky', loader).start()
+
+        self.assertTrue(wait_until(lambda: warmup.status()['flaky']['status'] == 'failed'))
+        readiness = warmup.readiness()
+        self.assertEqual(readiness['status'], 'warming_up')
+        self.assertIn('加载失败', readiness['components']['flaky']['error'])
+        with self.assertRaises(ComponentNotReady):
+            warmup.wait('flaky')  # 失败期间立即返回错误，不阻塞请求
+
+        self.assertTrue(wait_until(lambda: warmup.ready('flaky')))
+        self.assertEqual(warmup.wait('flaky'), 'model')
+        status = warmup.status()['flaky']
+        self.assertEqual((status['attempts'], status['error']), (3, None))
+        self.assertEqual(warmup.readiness()['status'], 'ready')
+
+    def test_retry_delay_backs_off(self):
+        delays = []
+        loaded = threading.Event()
+
+        def loader():
+            if len(delays) < 4:
+                raise RuntimeError("未就绪")
+            loaded.set()
+
+        warmup = ModelWarmup(retry_delay=1, max_retry_delay=5, sleep=delays.append)
+        warmup.register('flaky', loader).start()
+        self.assertTrue(loaded.wait(2))
+        self.assertEqual(delays, [1, 2, 4, 5])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from collections import namedtuple
+
+try:
+    from node_retriever import NodeRetriever, char_ngrams
+except ImportError:  # 未安装 numpy
+    NodeRetriever = None
+
+Node = namedtuple('Node', ['id', 'type', 'name', 'type_description'])
+
+NODES = [
+    Node(1, 1, "客厅", "房间"),
+    Node(2, 1, "主卧", "房间"),
+    Node(3, 2, "客厅灯带", "调光灯"),
+    Node(4, 2, "餐厅射灯", "调光灯"),
+    Node(5, 2, "主卧吸顶灯", "色温灯"),
+    Node(6, 2, "客厅窗帘", "窗帘电机"),
+    Node(7, 6, "观影模式", "情景"),
+]
+
+
+@unittest.skipUnless(NodeRetriever, "需要 numpy")
+class NodeRetrieverTest(unittest.TestCase):
+    def setUp(self):
+        self.retriever = NodeRetriever(NODES, pinned=lambda node: node.type == 1)
+
+    def ids(self, utterance, k):
+        return [node.id for node in self.retriever.top_k(utterance, k)]
+
+    def test_char_ngrams(self):
+        self.assertEqual(char_ngrams("灯带", (1, 2)), ["灯", "带", "灯带"])
+        self.assertEqual(char_ngrams("灯", (2,)), [])
+
+    def test_returns_all_nodes_when_k_is_large(self):
+        self.assertEqual(self.ids("随便", len(NODES)), [node.id for node in NODES])
+
+    def test_exact_name_ranks_first_and_rooms_are_pinned(self):
+        self.assertEqual(self.ids("打开客厅灯带", 1), [1, 2, 3])
+        self.assertEqual(self.ids("开启观影模式", 1), [1, 2, 7])
+
+    def test_partial_name_matches_by_ngrams(self):
+        self.assertIn(5, self.ids("把吸顶灯关了", 2))
+        self.assertIn(6, self.ids("拉上窗帘", 2))
+
+    def test_result_keeps_topology_order(self):
+        ids = self.ids("餐厅射灯和客厅灯带", 2)
+        self.assertEqual(ids, sorted(ids))
+        self.assertTrue({3, 4} <= set(ids))
+
+    def test_unknown_words_keep_pinned_rooms(self):
+        for utterance in ("你好", ""):
+            ids = self.ids(utterance, 3)
+            self.assertTrue({1, 2} <= set(ids), utterance)
+            self.assertLessEqual(len(ids), 3 + 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import threading
+import time
+import unittest
+
+try:
+    import numpy as np
+    from streaming_asr import StreamingSession, StreamingTranscriber
+except ImportError:  # 未安装 numpy
+    np = None
+
+RATE = 1000  # 测试使用低采样率，帧长 30 个采样
+
+
+def signal():
+    # 1.5 秒语音、0.99 秒静音、0.6 秒语音，各段都对齐到 VAD 帧
+    speech = lambda seconds: np.full(round(seconds * RATE), 0.5, dtype=np.float32)
+    silence = lambda seconds: np.zeros(round(seconds * RATE), dtype=np.float32)
+    return np.concatenate([speech(1.5), silence(0.99), speech(0.6)])
+
+
+def split(audio, sizes):
+    chunks, start, i = [], 0, 0
+    while start < len(audio):
+        size = sizes[i % len(sizes)]
+        chunks.append(audio[start:start + size])
+        start += size
+        i += 1
+    return chunks
+
+
+class FakeWhisper:
+    """按音频长度返回文本，并记录是否被并发调用"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, audio):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return f"{len(audio)} 个采样"
+
+
+def new_transcriber(whisper):
+    return StreamingTranscriber(whisper, sample_rate=RATE, step_seconds=0.5, silence_seconds=0.5)
+
+
+def reference_events(chunks):
+    transcriber = new_transcriber(FakeWhisper())
+    events = []
+    for chunk in chunks:
+        events.extend(transcriber.feed(chunk))
+    return events + transcriber.finish()
+
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+        self.errors = []
+        self.done = threading.Event()
+        self.events_after_done = 0
+
+    def on_events(self, events):
+        if self.done.is_set():
+            self.events_after_done += 1
+        self.events.extend(events)
+
+    def on_error(self, error):
+        self.errors.append(error)
+
+    def on_done(self):
+        self.done.set()
+
+
+def thread_task(target):
+    threading.Thread(target=target, daemon=True).start()
+
+
+@unittest.skipUnless(np, "需要 numpy")
+class StreamingTranscriberTest(unittest.TestCase):
+    def test_partial_and_final_results(self):
+        events = reference_events(split(signal(), [100]))
+        kinds = [kind for kind, _ in events]
+        self.assertIn("partial", kinds)
+        self.assertEqual(kinds.count("final"), 2)
+        self.assertEqual(events[-1], ("final", "600 个采样"))
+
+    def test_final_text_does_not_depend_on_chunk_sizes(self):
+        finals = lambda chunks: [text for kind, text in reference_events(chunks) if kind == "final"]
+        expected = finals(split(signal(), [100]))
+        for sizes in ([1], [7, 13], [512], [29, 301, 5]):
+            self.assertEqual(finals(split(signal(), sizes)), expected, sizes)
+
+
+@unittest.skipUnless(np, "需要 numpy")
+class StreamingSessionTest(unittest.TestCase):
+    def run_session(self, chunks, start_task, whisper):
+        recorder = Recorder()
+        session = StreamingSession(new_transcriber(whisper), start_task,
+                                   recorder.on_events, recorder.on_error, recorder.on_done)
+        return session, recorder
+
+    def test_chunks_arriving_during_transcription_are_processed_in_order(self):
+        for sizes in ([100], [7, 13], [29, 301, 5]):
+            chunks = split(signal(), sizes)
+            whisper = FakeWhisper(delay=0.005)
+            session, recorder = self.run_session(chunks, thread_task, whisper)
+            for chunk in chunks:
+                session.feed(chunk)
+            session.end()  # 在音频块仍在处理时结束
+            self.assertTrue(recorder.done.wait(10))
+            self.assertEqual(recorder.events, reference_events(chunks), sizes)
+            self.assertEqual(whisper.max_active, 1)
+            self.assertEqual(recorder.events_after_done, 0)
+
+    def test_concurrent_handlers_never_interleave(self):
+        chunks = split(signal(), [50])
+        whisper = FakeWhisper(delay=0.002)
+        session, recorder = self.run_session(chunks, thread_task, whisper)
+        lock = threading.Lock()  # 按顺序入队，入队本身在多个线程中并发进行
+        position = iter(chunks)
+
+        def handler():
+            with lock:
+                session.feed(next(position))
+
+        threads = [threading.Thread(target=handler) for _ in chunks]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        session.end()
+        self.assertTrue(recorder.done.wait(10))
+        self.assertEqual(whisper.max_active, 1)
+        self.assertEqual(recorder.events, reference_events(chunks))
+
+    def test_deferred_task_drains_everything_once(self):
+        tasks = []
+        chunks = split(signal(), [100])
+        session, recorder = self.run_session(chunks, tasks.append, FakeWhisper())
+        for chunk in chunks:
+            session.feed(chunk)
+        session.end()
+        session.feed(chunks[0])  # 结束后到达的音频块被丢弃
+        self.assertEqual(len(tasks), 1)
+        tasks[0]()
+        self.assertTrue(recorder.done.is_set())
+        self.assertEqual(recorder.events, reference_events(chunks))
+
+    def test_close_discards_pending_audio(self):
+        tasks = []
+        session, recorder = self.run_session([], tasks.append, FakeWhisper())
+        session.feed(signal())
+        session.close()
+        session.end()
+        tasks[0]()
+        self.assertEqual(recorder.events, [])
+        self.assertFalse(recorder.done.is_set())
+
+    def test_errors_are_reported_and_session_still_ends(self):
+        def failing(audio):
+            raise RuntimeError("busy")
+
+        tasks = []
+        session, recorder = self.run_session([], tasks.append, failing)
+        session.feed(signal())
+        session.end()
+        tasks[0]()
+        self.assertTrue(recorder.errors)
+        self.assertTrue(recorder.done.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import threading
+import time
+import unittest
+
+from transcription_worker import TranscriptionBusy, TranscriptionWorker
+
+
+class StubModel:
+    """替代 Whisper 模型；gate 未打开时 transcribe 阻塞，用于占住工作线程"""
+
+    def __init__(self, gate=None):
+        self.gate = gate
+        self.started = threading.Event()
+        self.calls = []
+
+    def transcribe(self, audio, language=None):
+        self.calls.append(audio)
+        self.started.set()
+        if self.gate:
+            self.gate.wait(5)
+        if audio == "bad":
+            raise RuntimeError("解码失败")
+        return {'text': f"繁體{audio}"}
+
+
+class StubConverter:
+    def convert(self, text):
+        return text.replace("繁體", "繁体")
+
+
+class StubTrace:
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, name, seconds):
+        self.stages[name] = seconds
+
+
+class TranscriptionWorkerTest(unittest.TestCase):
+    def make_worker(self, model, workers=1, max_queue=8):
+        worker = TranscriptionWorker(lambda: model, StubConverter(), workers=workers, max_queue=max_queue)
+        worker.start()
+        self.assertTrue(worker.wait_ready(2))
+        return worker
+
+    def test_transcribe_returns_original_and_simplified(self):
+        worker = self.make_worker(StubModel())
+        trace = StubTrace()
+        self.assertEqual(worker.transcribe("一", trace=trace), ("繁體一", "繁体一"))
+        self.assertEqual(set(trace.stages), {'whisper', 'opencc'})
+
+    def test_model_error_is_raised_to_caller(self):
+        worker = self.make_worker(StubModel())
+        with self.assertRaises(RuntimeError):
+            worker.transcribe("bad")
+        self.assertEqual(worker.transcribe("二")[1], "繁体二")  # 工作线程继续处理后续任务
+
+    def test_full_queue_raises_busy(self):
+        gate = threading.Event()
+        model = StubModel(gate)
+        worker = self.make_worker(model, max_queue=2)
+        running = worker.submit("0")
+        self.assertTrue(model.started.wait(2))  # 第一个任务已被工作线程取走
+        queued = [worker.submit("1"), worker.submit("2")]
+        with self.assertRaises(TranscriptionBusy):
+            worker.submit("3")
+        with self.assertRaises(TranscriptionBusy):
+            worker.transcribe("3")
+
+        gate.set()
+        self.assertEqual([f.result(2)[1] for f in [running] + queued], ["繁体0", "繁体1", "繁体2"])
+        self.assertEqual(worker.transcribe("4")[1], "繁体4")  # 队列腾空后恢复接收
+
+    def test_timeout_cancels_queued_task(self):
+        gate = threading.Event()
+        model = StubModel(gate)
+        worker = self.make_worker(model)
+        running = worker.submit("0")
+        self.assertTrue(model.started.wait(2))
+        with self.assertRaises(TimeoutError):
+            worker.transcribe("1", timeout=0.05)
+        gate.set()
+        running.result(2)
+        self.assertEqual(worker.transcribe("2")[1], "繁体2")
+        self.assertEqual(model.calls, ["0", "2"])  # 已超时取消的任务不再转录
+
+    def test_transcribe_polls_with_given_sleep(self):
+        gate = threading.Event()
+        model = StubModel(gate)
+        worker = self.make_worker(model)
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            gate.set()
+            time.sleep(seconds)
+
+        self.assertEqual(worker.transcribe("一", sleep=sleep)[1], "繁体一")
+        self.assertTrue(sleeps)
+
+    def test_wait_ready_raises_when_all_loads_fail(self):
+        def loader():
+            raise OSError("模型文件不存在")
+
+        worker = TranscriptionWorker(loader, StubConverter(), workers=2)
+        worker.start()
+        with self.assertRaises(OSError):
+            worker.wait_ready(2)
+        self.assertFalse(worker.ready)
+
+    def test_start_again_after_all_loads_fail(self):
+        models = [OSError("模型文件不存在"), StubModel()]
+
+        def loader():
+            model = models.pop(0)
+            if isinstance(model, Exception):
+                raise model
+            return model
+
+        worker = TranscriptionWorker(loader, StubConverter(), workers=1)
+        with self.assertRaises(OSError):
+            worker.start().wait_ready(2)
+        self.assertTrue(worker.start().wait_ready(2))  # 模型预热重试时重新启动工作线程
+        worker.start()  # 已就绪时不再启动新线程
+        self.assertEqual(len(worker._threads), 1)
+        self.assertEqual(worker.transcribe("一")[1], "繁体一")
+
+    def test_ready_when_any_worker_loads(self):
+        models = [OSError("显存不足"), StubModel()]
+        lock = threading.Lock()
+
+        def loader():
+            with lock:
+                model = models.pop(0)
+            if isinstance(model, Exception):
+                raise model
+            return model
+
+        worker = TranscriptionWorker(loader, StubConverter(), workers=2)
+        worker.start()
+        self.assertTrue(worker.wait_ready(2))
+        self.assertEqual(worker.transcribe("一")[1], "繁体一")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from tts_cache import SpeechCache
+
+
+class FakeVoice:
+    """按文本长度写入静音 WAV，并记录合成次数"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def synthesize(self, text, wav_file):
+        self.calls += 1
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(16000)
+        wav_file.writeframes(b"\x00\x00" * 100 * len(text))
+
+
+class SpeechCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.voice = FakeVoice()
+        self.loads = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def make_cache(self, **kwargs):
+        def loader():
+            self.loads += 1
+            return self.voice
+        return SpeechCache(loader, model_id="test", cache_dir=self.cache_dir, **kwargs)
+
+    def test_repeated_text_is_synthesized_once(self):
+        cache = self.make_cache()
+        key = cache.synthesize("已打开客厅灯")
+        self.assertEqual(cache.synthesize("已打开客厅灯"), key)
+        self.assertEqual(self.voice.calls, 1)
+        self.assertEqual(self.loads, 1)
+        self.assertTrue(cache.get(key).startswith(b"RIFF"))
+
+    def test_memory_eviction_falls_back_to_disk(self):
+        cache = self.make_cache(max_memory_items=2)
+        keys = [cache.synthesize(text) for text in ("一", "二", "三")]
+        self.assertEqual(list(cache._memory), keys[1:])  # 最久未使用的条目被淘汰
+        self.assertIsNotNone(cache.get(keys[0]))  # 仍可从磁盘读取
+        self.assertEqual(list(cache._memory), [keys[2], keys[0]])
+        self.assertEqual(self.voice.calls, 3)
+
+    def test_disk_eviction_removes_oldest_files(self):
+        cache = self.make_cache()
+        first = cache.synthesize("第一条语音")
+        size = os.path.getsize(cache._path_for(first))
+        cache.max_disk_bytes = size * 2
+        now = time.time()
+        os.utime(cache._path_for(first), (now - 100, now - 100))
+        second = cache.synthesize("第二条语音")
+        os.utime(cache._path_for(second), (now - 50, now - 50))
+        third = cache.synthesize("第三条语音")
+
+        self.assertFalse(os.path.exists(cache._path_for(first)))
+        self.assertTrue(os.path.exists(cache._path_for(second)))
+        self.assertTrue(os.path.exists(cache._path_for(third)))
+
+    def test_invalid_keys_are_rejected(self):
+        cache = self.make_cache()
+        self.assertIsNone(cache.get("../../etc/passwd"))
+        self.assertIsNone(cache.get("0" * 64))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+
+from utils import StreamingJSONExtractor, extract_json, is_command
+
+COMMAND = '{"domain": "light", "name": "客厅灯带", "action": "turn_on", "location": "客厅"}'
+
+
+def feed_all(extractor, chunks):
+    for chunk in chunks:
+        result = extractor.feed(chunk)
+        if result is not None:
+            return result
+    return None
+
+
+class StreamingJSONExtractorTest(unittest.TestCase):
+    def test_returns_as_soon_as_command_is_complete(self):
+        extractor = StreamingJSONExtractor()
+        text = COMMAND + "\n以上为解析结果。"
+        chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+        for i, chunk in enumerate(chunks):
+            result = extractor.feed(chunk)
+            if result is not None:
+                break
+        self.assertEqual(result["name"], "客厅灯带")
+        self.assertLess(i, len(chunks) - 1)  # 之后的输出不需要再读取
+
+    def test_skips_think_block_split_across_chunks(self):
+        text = '<think>示例 {"domain": "scene", "name": "x", "action": "excute", "location": "null"}</think>' + COMMAND
+        for size in (1, 2, 5, 7):
+            extractor = StreamingJSONExtractor()
+            result = feed_all(extractor, [text[i:i + size] for i in range(0, len(text), size)])
+            self.assertEqual(result["domain"], "light", size)
+
+    def test_braces_inside_strings_are_ignored(self):
+        extractor = StreamingJSONExtractor()
+        text = '{"domain": "light", "name": "灯}{", "action": "turn_off", "location": "all"}'
+        self.assertEqual(feed_all(extractor, [text])["name"], "灯}{")
+
+    def test_incomplete_objects_are_skipped(self):
+        extractor = StreamingJSONExtractor()
+        result = feed_all(extractor, ['{"domain": "light"} 然后 ', COMMAND])
+        self.assertEqual(result["action"], "turn_on")
+
+    def test_single_quoted_output_is_accepted(self):
+        extractor = StreamingJSONExtractor()
+        result = feed_all(extractor, [COMMAND.replace('"', "'")])
+        self.assertTrue(is_command(result))
+
+    def test_custom_validator(self):
+        extractor = StreamingJSONExtractor(validate=lambda obj: obj.get("domain") == "scene")
+        self.assertIsNone(feed_all(extractor, [COMMAND]))
+
+    def test_finish_rejects_incomplete_fallback(self):
+        extractor = StreamingJSONExtractor()
+        feed_all(extractor, ['{"domain": "light", "name": "灯"}'])
+        with self.assertRaises(ValueError):
+            extractor.finish()
+
+        # 回退解析使用与流式提取相同的校验
+        extractor = StreamingJSONExtractor(validate=lambda obj: obj.get("location") in ("all", "null"))
+        feed_all(extractor, [COMMAND])
+        with self.assertRaises(ValueError):
+            extractor.finish()
+
+    def test_finish_returns_streamed_command(self):
+        extractor = StreamingJSONExtractor()
+        result = feed_all(extractor, [COMMAND])
+        self.assertIs(extractor.finish(), result)
+
+        extractor = StreamingJSONExtractor()
+        feed_all(extractor, ["没有命令"])
+        with self.assertRaises(ValueError):
+            extractor.finish()
+
+
+class ExtractJSONTest(unittest.TestCase):
+    def test_strips_think_block(self):
+        self.assertEqual(extract_json('<think>{"a": 1}</think>\n' + COMMAND)["location"], "客厅")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# 阶段耗时和请求完成的观察者（如 metrics 中的直方图）
+_stage_observers: List[Callable] = []
+_finish_observers: List[Callable] = []
+
+# 最近完成的请求，供 /traces 查看
+_recent = deque(maxlen=int(os.getenv('TRACE_HISTORY', '100')))
+_recent_lock = threading.Lock()
+
+
+def add_stage_observer(callback: Callable):
+    """callback(trace, 阶段, 秒)"""
+    _stage_observers.append(callback)
+
+
+def add_finish_observer(callback: Callable):
+    """callback(trace, 总秒数)"""
+    _finish_observers.append(callback)
+
+
+class Trace:
+    """
+    一次请求的各阶段耗时
+    同一阶段多次出现时累加；跨线程使用时把 Trace 对象传给工作线程，直接调用 trace.span()
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        for callback in _stage_observers:
+            callback(self, stage, seconds)
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def timings_ms(self) -> Dict[str, float]:
+        """各阶段耗时（毫秒），total 为从开始到现在的总耗时"""
+        with self._lock:
+            timings = {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()}
+        timings['total'] = round((time.perf_counter() - self.started_at) * 1000, 3)
+        return timings
+
+
+# 使用 contextvars 而不是 threading.local，在 eventlet/gevent 协程中同样按请求隔离
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar('current_trace', default=None)
+
+
+def start_trace(name: str) -> Trace:
+    trace = Trace(name)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def end_trace() -> Optional[Trace]:
+    trace = _current_trace.get()
+    _current_trace.set(None)
+    return trace
+
+
+def finish_trace(**attributes) -> Optional[Trace]:
+    """结束当前请求的 Trace，保存到最近请求列表并通知观察者"""
+    trace = end_trace()
+    if trace is None:
+        return None
+    seconds = time.perf_counter() - trace.started_at
+    with _recent_lock:
+        _recent.append(dict(attributes, name=trace.name, finished_at=time.time(), timings_ms=trace.timings_ms()))
+    for callback in _finish_observers:
+        callback(trace, seconds)
+    return trace
+
+
+def recent_traces() -> List[dict]:
+    with _recent_lock:
+        return list(_recent)
+
+
+@contextmanager
+def span(stage: str):
+    """记录当前请求中一个阶段的耗时，没有进行中的 Trace 时不做任何事"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(stage):
+        yield
@@ -0,0 +1,112 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Optional, Tuple
+
+
+class TranscriptionBusy(Exception):
+    """转录队列已满，调用方应稍后重试"""
+
+
+def default_worker_count() -> int:
+    # 每个 worker 持有独立模型，PyTorch 推理本身也会使用多核，按核数的四分之一分配
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+class TranscriptionWorker:
+    """
+    Whisper 转录工作线程池
+    每个线程持有一个独立的 Whisper 模型（transcribe 会在模型上挂载 kv-cache 钩子，不能并发共享），
+    所有线程共用一个 OpenCC 转换器；任务队列有上限，队列满时抛出 TranscriptionBusy
+    """
+
+    def __init__(self, model_loader: Callable, converter, workers: Optional[int] = None,
+                 max_queue: int = 8, language: str = "zh"):
+        self.model_loader = model_loader
+        self.converter = converter
+        self.workers = workers or default_worker_count()
+        self.language = language
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._ready = threading.Event()
+        self._settled = threading.Event()  # 模型已就绪，或所有线程都加载失败
+        self._load_errors = []
+
+    def start(self):
+        """启动工作线程，每个线程先加载自己的模型；所有线程都加载失败后可再次调用以重试"""
+        if self._threads and len(self._load_errors) < len(self._threads):
+            return self  # 仍在加载或已就绪
+        self._threads = []
+        self._load_errors = []
+        self._settled.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"whisper-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    @property
+    def ready(self) -> bool:
+        """至少有一个线程完成了模型加载"""
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待至少一个线程加载完模型；所有线程都加载失败时抛出第一个错误"""
+        self._settled.wait(timeout)
+        if self._ready.is_set():
+            return True
+        if self._load_errors:
+            raise self._load_errors[0]
+        return False
+
+    def submit(self, audio, trace=None) -> Future:
+        """trace: 可选的 tracing.Trace，记录 whisper 和 opencc 阶段耗时"""
+        future = Future()
+        try:
+            self._queue.put_nowait((audio, future, trace))
+        except queue.Full:
+            raise TranscriptionBusy("语音识别任务过多，请稍后重试")
+        return future
+
+    def transcribe(self, audio, sleep: Callable[[float], None] = time.sleep,
+                   timeout: Optional[float] = None, trace=None) -> Tuple[str, str]:
+        """
+        提交任务并等待结果，返回 (原始文本, 简体文本)
+        sleep 用于轮询等待，传入 socketio.sleep 可避免阻塞事件循环
+        """
+        future = self.submit(audio, trace)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not future.done():
+            if deadline is not None and time.monotonic() > deadline:
+                future.cancel()
+                raise TimeoutError("语音识别超时")
+            sleep(0.01)
+        return future.result()
+
+    def _run(self):
+        try:
+            model = self.model_loader()
+        except Exception as e:
+            self._load_errors.append(e)
+            if len(self._load_errors) == self.workers:
+                self._settled.set()
+            raise
+        self._ready.set()
+        self._settled.set()
+        while True:
+            audio, future, trace = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                start = time.perf_counter()
+                result = model.transcribe(audio, language=self.language)
+                converted_at = time.perf_counter()
+                simplified = self.converter.convert(result['text'])
+                if trace:
+                    trace.record('whisper', converted_at - start)
+                    trace.record('opencc', time.perf_counter() - converted_at)
+                future.set_result((result['text'], simplified))
+            except Exception as e:
+                future.set_exception(e)
@@ -0,0 +1,127 @@
+import hashlib
+import io
+import os
+import threading
+import wave
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import metrics
+
+
+class SpeechCache:
+    """
+    语音合成缓存
+    Piper 模型只加载一次；合成结果按内容（模型 + 文本）寻址，
+    同时缓存在内存 LRU 和磁盘目录中，超出容量时淘汰最久未使用的条目
+    """
+
+    def __init__(self, voice_loader: Callable, model_id: str, cache_dir: str = 'tts/cache',
+                 max_memory_items: int = 64, max_disk_bytes: int = 50 * 1024 * 1024):
+        self._voice_loader = voice_loader
+        self._voice = None
+        self.model_id = model_id
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._synthesize_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def voice(self):
+        """首次使用时加载 Piper 模型，之后复用同一个实例"""
+        if self._voice is None:
+            with self._synthesize_lock:
+                if self._voice is None:
+                    self._voice = self._voice_loader()
+        return self._voice
+
+    def key_for(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\n{text}".encode('utf-8')).hexdigest()
+
+    def synthesize(self, text: str) -> str:
+        """返回文本对应的缓存 key，未命中时合成并写入缓存"""
+        key = self.key_for(text)
+        if self.get(key) is not None:
+            metrics.CACHE_REQUESTS.inc(cache='tts', result='hit')
+            return key
+        metrics.CACHE_REQUESTS.inc(cache='tts', result='miss')
+
+        voice = self.voice
+        buffer = io.BytesIO()
+        with self._synthesize_lock:
+            with wave.open(buffer, 'wb') as wav_file:
+                voice.synthesize(text, wav_file)
+        data = buffer.getvalue()
+
+        self._remember(key, data)
+        self._write_to_disk(key, data)
+        return key
+
+    def get(self, key: str) -> Optional[bytes]:
+        """按 key 读取 WAV 数据，依次查找内存和磁盘"""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                return data
+
+        path = self._path_for(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # 更新访问时间，用于磁盘淘汰
+        except OSError:
+            return None
+        self._remember(key, data)
+        return data
+
+    def _path_for(self, key: str) -> Optional[str]:
+        # key 来自请求路径，只接受 sha256 十六进制串
+        if len(key) != 64 or any(c not in '0123456789abcdef' for c in key):
+            return None
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _remember(self, key: str, data: bytes):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _write_to_disk(self, key: str, data: bytes):
+        path = self._path_for(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+        except OSError as e:
+            print(f"写入语音缓存失败: {str(e)}")
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.wav'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -1,5 +1,7 @@
 import json
 
+import metrics
+
 def extract_json(response: str) -> dict:
     """从模型响应中提取 JSON 部分"""
     try:
@@ -22,8 +24,115 @@ def extract_json(response: str) -> dict:
         return json.loads(json_str)
         
     except json.JSONDecodeError as e:
+        metrics.JSON_PARSE_FAILURES.inc(source='llm')
         print(f"[DEBUG] 原始响应内容:\n{response}")  # 调试日志
         raise ValueError(f"JSON 语法错误：{e.msg}（位置：第 {e.lineno} 行，第 {e.colno} 列）")
     except Exception as e:
+        metrics.JSON_PARSE_FAILURES.inc(source='llm')
         raise ValueError(f"JSON 提取失败：{str(e)}")
 
+
+
+# 命令对象必须包含的字段
+COMMAND_FIELDS = ("domain", "name", "action", "location")
+
+
+def is_command(obj) -> bool:
+    """判断解析出的对象是否为完整的控制命令"""
+    return isinstance(obj, dict) and all(field in obj for field in COMMAND_FIELDS)
+
+
+class StreamingJSONExtractor:
+    """
+    从流式模型输出中增量提取 JSON 命令
+    跳过 <think>…</think> 部分，按字符跟踪括号深度（忽略字符串中的括号），
+    一旦得到完整且字段齐全的命令对象即返回，调用方可以立即停止生成
+    """
+
+    THINK_OPEN = '<think>'
+    THINK_CLOSE = '</think>'
+
+    def __init__(self, validate=is_command):
+        self.validate = validate
+        self.text = []  # 收到的全部输出，用于流结束后回退到 extract_json
+        self._pending = ''  # 可能是被拆开的标签，暂不处理
+        self._in_think = False
+        self._depth = 0
+        self._quote = None
+        self._escaped = False
+        self._candidate = []
+        self.result = None
+
+    def feed(self, chunk: str):
+        """输入一段输出，得到完整命令时返回该命令，否则返回 None"""
+        self.text.append(chunk)
+        if self.result is not None:
+            return self.result
+
+        data = self._pending + chunk
+        self._pending = ''
+        i = 0
+        while i < len(data):
+            if self._depth == 0:
+                tag = self.THINK_CLOSE if self._in_think else self.THINK_OPEN
+                if data.startswith(tag, i):
+                    self._in_think = not self._in_think
+                    i += len(tag)
+                    continue
+                if data[i] == '<' and tag.startswith(data[i:]):
+                    self._pending = data[i:]  # 标签被拆到下一段
+                    break
+                if not self._in_think and data[i] == '{':
+                    self._depth = 1
+                    self._candidate = ['{']
+                i += 1
+                continue
+
+            char = data[i]
+            self._candidate.append(char)
+            i += 1
+            if self._quote:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == self._quote:
+                    self._quote = None
+            elif char in '"\'':
+                self._quote = char
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0 and self._accept(''.join(self._candidate)):
+                    return self.result
+        return None
+
+    def finish(self) -> dict:
+        """
+        流结束时调用：已提取到命令则直接返回，否则按完整输出解析
+        解析结果同样要通过 validate，不完整的命令（如缺少 action）抛出 ValueError
+        """
+        if self.result is not None:
+            return self.result
+        obj = extract_json(''.join(self.text))
+        if not self.validate(obj):
+            metrics.JSON_PARSE_FAILURES.inc(source='llm_schema')
+            raise ValueError(f"模型输出不是有效的控制命令: {json.dumps(obj, ensure_ascii=False)}")
+        self.result = obj
+        return obj
+
+    def _accept(self, candidate: str) -> bool:
+        try:
+            obj = json.loads(candidate)
+        except json.JSONDecodeError:
+            try:
+                obj = json.loads(candidate.replace("'", "\"").replace("\\n", ""))  # 与 extract_json 相同的兜底清理
+            except json.JSONDecodeError:
+                metrics.JSON_PARSE_FAILURES.inc(source='llm_stream')
+                return False
+        if not self.validate(obj):
+            metrics.JSON_PARSE_FAILURES.inc(source='llm_schema')
+            return False
+        self.result = obj
+        return True